@@ -1,119 +1,124 @@
+import hashlib
 import time
+import weakref
 from pathlib import Path
 
 import cv2
 import numpy as np
 import streamlit as st
 
-from src.detection_agent import DetectionAgent
+from src.config import ConfigWatcher
+from src.detection_cache import DetectionCache, LRUCache, file_hash
 from src.label_agent import LabelAgent
 from src.logging_agent import LoggingAgent
 from src.model_manager_agent import ModelManagerAgent
-from src.tracking_agent import TrackingAgent
+from src.pipeline import FrameProcessor, VideoFilePipeline, WebcamPipeline
+from src.video_sink import VideoSink
 
 
 @st.cache_resource
 def load_model():
-    model_manager = ModelManagerAgent()
+    # The manager is shared by every session, so it gets its own logging agent
+    # from the start: the first load is logged, and model load and pool
+    # metrics never land in one session's metrics
+    model_manager = ModelManagerAgent(
+        logging_agent=LoggingAgent(log_to_file=False, log_to_console=True)
+    )
     with st.spinner("Loading YOLO model... (this only happens once)"):
         model_manager.load_model()
+    model_manager.start_prefetch()
     return model_manager
 
 
+@st.cache_resource
+def watch_config(_model_manager):
+    # One watcher for the manager all sessions share; each session registers
+    # its processor, so an edit to config.yaml reaches every open tab and a
+    # change that fails to apply in any of them rolls the reload back
+    processors = weakref.WeakSet()
+
+    def apply(changed):
+        for processor in list(processors):
+            processor.apply_config(_model_manager, changed)
+
+    watcher = ConfigWatcher(_model_manager, on_change=apply)
+    watcher.start()
+    return watcher, processors
+
+
 def initialize_agents():
     if "initialized" not in st.session_state:
         st.session_state.model_manager = load_model()
 
-        st.session_state.detection_agent = DetectionAgent(
-            model_path=st.session_state.model_manager.model_name,
-            confidence_threshold=st.session_state.model_manager.get_config_value(
-                "model.confidence_threshold", 0.5
-            ),
-        )
-        st.session_state.detection_agent.model = (
-            st.session_state.model_manager.get_model()
-        )
-
-        st.session_state.tracking_agent = TrackingAgent(
-            max_age=st.session_state.model_manager.get_config_value(
-                "tracking.max_age", 30
-            ),
-            min_hits=st.session_state.model_manager.get_config_value(
-                "tracking.min_hits", 3
-            ),
-            iou_threshold=st.session_state.model_manager.get_config_value(
-                "tracking.iou_threshold", 0.3
-            ),
+        processor = FrameProcessor.from_config(
+            st.session_state.model_manager, warm_up=True
         )
+        st.session_state.frame_processor = processor
+        watcher, processors = watch_config(st.session_state.model_manager)
+        processors.add(processor)
+        st.session_state.config_watcher = watcher
+        st.session_state.detection_agent = processor.detection_agent
+        st.session_state.tracking_agent = processor.tracking_agent
+        st.session_state.motion_agent = processor.motion_agent
 
         st.session_state.label_agent = LabelAgent(
             valid_classes=st.session_state.model_manager.get_class_names()
         )
 
+        # Per-session metrics only; model loads are logged by the manager's agent
         st.session_state.logging_agent = LoggingAgent(
             log_to_file=False, log_to_console=True
         )
 
-        st.session_state.initialized = True
-
-
-def draw_detections(frame, detections, tracks, show_confidence=True):
-    annotated_frame = frame.copy()
-
-    for track in tracks:
-        x1, y1, x2, y2 = [int(coord) for coord in track["bbox"]]
-
-        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-        label = f"ID:{track['track_id']} {track['class_name']}"
-        if show_confidence:
-            label += f" {track['confidence']:.2f}"
-
-        label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
-        cv2.rectangle(
-            annotated_frame,
-            (x1, y1 - label_size[1] - 10),
-            (x1 + label_size[0], y1),
-            (0, 255, 0),
-            -1,
-        )
-        cv2.putText(
-            annotated_frame,
-            label,
-            (x1, y1 - 5),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 0, 0),
-            2,
+        config = st.session_state.model_manager.get_config_value
+        st.session_state.detection_cache = DetectionCache(
+            config("cache.dir", "cache/detections"),
+            int(config("cache.max_disk_mb", 1024) * 1024 * 1024),
         )
 
-    return annotated_frame
-
-
-def process_frame(frame, class_filter=None, show_confidence=True, frame_skip=0):
-    frame_count = st.session_state.get("frame_count", 0)
-
-    # Skip detection on some frames to improve performance
-    if frame_skip > 0 and frame_count % (frame_skip + 1) != 0:
-        # Return last annotated frame if available
-        if "last_annotated_frame" in st.session_state:
-            return (
-                st.session_state.last_annotated_frame,
-                st.session_state.get("last_detections", []),
-                st.session_state.get("last_tracks", []),
-            )
-        return frame, [], []
+        image_memory_mb = st.session_state.model_manager.get_config_value(
+            "cache.image_memory_mb", 256
+        )
+        st.session_state.image_cache = LRUCache(image_memory_mb * 1024 * 1024)
 
-    detections = st.session_state.detection_agent.detect(frame, class_filter)
-    tracks = st.session_state.tracking_agent.update(detections)
-    annotated_frame = draw_detections(frame, detections, tracks, show_confidence)
+        st.session_state.initialized = True
 
-    # Cache for frame skip
-    st.session_state.last_annotated_frame = annotated_frame
-    st.session_state.last_detections = detections
-    st.session_state.last_tracks = tracks
 
-    return annotated_frame, detections, tracks
+def configure_processor():
+    # Sidebar settings live in session state; background threads only see the
+    # processor, so copy them over on every rerun
+    processor = st.session_state.frame_processor
+    processor.class_filter = st.session_state.get("class_filter", None)
+    processor.show_confidence = st.session_state.get("show_confidence", True)
+    processor.frame_skip = st.session_state.get("frame_skip", 0)
+    processor.motion_gating = st.session_state.get("motion_gating", False)
+    processor.roi_inference = st.session_state.get("roi_inference", False)
+    processor.tiled_inference = st.session_state.get("tiled_inference", False)
+    return processor
+
+
+def create_sink(name, **overrides):
+    if not st.session_state.get("record_output", False):
+        return None
+    prefix = f"{name}_{time.strftime('%Y%m%d_%H%M%S')}"
+    return VideoSink.from_config(
+        st.session_state.model_manager, prefix=prefix, **overrides
+    ).start()
+
+
+def stop_webcam():
+    st.session_state.webcam_running = False
+    if "webcam_pipeline" in st.session_state:
+        st.session_state.webcam_pipeline.stop()
+        del st.session_state.webcam_pipeline
+    if "webcam_sink" in st.session_state:
+        sink = st.session_state.webcam_sink
+        if sink is not None:
+            st.session_state.last_recording = sink.close()
+        del st.session_state.webcam_sink
+    if "webcam_cap" in st.session_state:
+        st.session_state.webcam_cap.release()
+        del st.session_state.webcam_cap
 
 
 @st.fragment(run_every=0.03)
@@ -122,58 +127,57 @@ def webcam_fragment(video_placeholder, stats_placeholder):
         video_placeholder.info("Click 'Start Webcam' to begin")
         return
 
-    if "webcam_cap" not in st.session_state:
+    if "webcam_pipeline" not in st.session_state:
         st.session_state.webcam_running = False
         video_placeholder.error("Webcam not initialized")
         return
 
-    frame_start = time.time()
-    ret, frame = st.session_state.webcam_cap.read()
+    pipeline = st.session_state.webcam_pipeline
 
-    if not ret:
-        st.session_state.webcam_running = False
-        if "webcam_cap" in st.session_state:
-            st.session_state.webcam_cap.release()
-            del st.session_state.webcam_cap
-        video_placeholder.error("Failed to read from webcam")
+    if pipeline.error:
+        error = pipeline.error
+        stop_webcam()
+        video_placeholder.error(error)
         return
 
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    class_filter = st.session_state.get("class_filter", None)
-    show_confidence = st.session_state.get("show_confidence", True)
-    frame_skip = st.session_state.get("frame_skip", 2)
-    st.session_state.frame_count = st.session_state.get("webcam_frame_count", 0)
-
-    inference_start = time.time()
-    annotated_frame, detections, tracks = process_frame(
-        frame_rgb, class_filter, show_confidence, frame_skip
-    )
-    inference_time = time.time() - inference_start
+    # Capture and inference run in the background; only render the newest
+    # finished frame, and skip the redraw if nothing new arrived
+    result = pipeline.latest()
+    if result is None:
+        video_placeholder.info("Waiting for the first frame...")
+        return
+    if result["frame_index"] == st.session_state.get("webcam_last_rendered"):
+        return
+    st.session_state.webcam_last_rendered = result["frame_index"]
 
-    video_placeholder.image(annotated_frame, channels="RGB", width="stretch")
+    video_placeholder.image(result["annotated_frame"], channels="BGR", width="stretch")
 
-    st.session_state.webcam_frame_count = (
-        st.session_state.get("webcam_frame_count", 0) + 1
-    )
     elapsed_time = time.time() - st.session_state.webcam_start_time
-    fps = st.session_state.webcam_frame_count / elapsed_time if elapsed_time > 0 else 0
-
-    frame_time = time.time() - frame_start
+    fps = pipeline.processed_frames / elapsed_time if elapsed_time > 0 else 0
 
     with stats_placeholder.container():
         col1, col2 = st.columns(2)
         with col1:
             st.metric("FPS", f"{fps:.2f}")
-            st.metric("Frame", st.session_state.webcam_frame_count)
+            st.metric("Frame", result["frame_index"])
         with col2:
-            st.metric("Detections", len(detections))
-            st.metric("Active Tracks", len(tracks))
+            st.metric("Detections", len(result["detections"]))
+            st.metric("Active Tracks", len(result["tracks"]))
 
         st.caption(
-            f"⚡ Inference: {inference_time * 1000:.0f}ms | Total: {frame_time * 1000:.0f}ms"
+            f"⚡ Inference: {result['inference_time'] * 1000:.0f}ms | "
+            f"Latency: {result['latency'] * 1000:.0f}ms | "
+            f"Dropped: {pipeline.dropped_frames}"
         )
 
+        sink = st.session_state.get("webcam_sink")
+        if sink is not None:
+            st.caption(
+                sink.error
+                or f"⏺ Recording: {sink.written_frames} frames, "
+                f"{sink.dropped_frames} dropped"
+            )
+
 
 def main():
     st.set_page_config(page_title="VisionTrack - YOLO Object Tracking", layout="wide")
@@ -200,6 +204,39 @@ def main():
 
         st.subheader("Detection Settings")
 
+        model_manager = st.session_state.model_manager
+        model_options = list(
+            dict.fromkeys(
+                [
+                    model_manager.get_config_value("model.name", "yolov8n.pt"),
+                    *model_manager.get_available_models(),
+                ]
+            )
+        )
+        model_name = st.selectbox(
+            "Model",
+            options=model_options,
+            help="Recently used models stay loaded, so switching back is instant",
+        )
+        detection_agent = st.session_state.detection_agent
+        if model_name != detection_agent.model_path.name:
+            detection_agent.set_model(model_manager.load_model(model_name), model_name)
+            if model_manager.get_config_value("model.warmup", False):
+                detection_agent.start_warm_up(
+                    runs=model_manager.get_config_value("model.warmup_runs", 2)
+                )
+
+        if detection_agent.warmup_error:
+            st.caption(f"⚠️ {detection_agent.warmup_error}")
+        elif not detection_agent.ready:
+            st.caption("⏳ Warming up model...")
+        elif detection_agent.warmup_time is not None:
+            st.caption(f"✅ Model ready (warm-up {detection_agent.warmup_time:.2f}s)")
+        if st.session_state.config_watcher.error:
+            st.caption(
+                f"⚠️ Config edit not applied: {st.session_state.config_watcher.error}"
+            )
+
         confidence_threshold = st.slider(
             "Confidence Threshold",
             min_value=0.1,
@@ -220,12 +257,36 @@ def main():
         )
         st.session_state.tracking_agent.iou_threshold = iou_threshold
 
+        st.session_state.motion_gating = st.checkbox(
+            "Motion-gated detection",
+            value=st.session_state.model_manager.get_config_value(
+                "motion.enabled", False
+            ),
+            help="Run detection only when the scene changes (replaces Frame Skip)",
+        )
+
+        st.session_state.roi_inference = st.checkbox(
+            "Region-of-interest inference",
+            value=st.session_state.model_manager.get_config_value("roi.enabled", False),
+            disabled=not st.session_state.motion_gating,
+            help="Detect only in crops around moving areas and existing tracks",
+        )
+
+        st.session_state.tiled_inference = st.checkbox(
+            "Tiled inference",
+            value=st.session_state.model_manager.get_config_value(
+                "tiling.enabled", False
+            ),
+            help="Split high-resolution frames into overlapping tiles to keep small objects",
+        )
+
         st.session_state.frame_skip = st.slider(
             "Frame Skip",
             min_value=0,
             max_value=5,
             value=2,
             step=1,
+            disabled=st.session_state.motion_gating,
             help="Skip frames to improve performance (0 = process every frame, 2 = process every 3rd frame - recommended)",
         )
 
@@ -233,21 +294,35 @@ def main():
             "Show confidence scores", value=True
         )
 
+        st.session_state.use_detection_cache = st.checkbox(
+            "Reuse cached detections",
+            value=st.session_state.model_manager.get_config_value(
+                "cache.enabled", False
+            ),
+            help="Re-run only tracking on videos already processed with the same "
+            "detection settings",
+        )
+
+        st.session_state.record_output = st.checkbox(
+            "Record annotated video",
+            value=False,
+            help="Save annotated frames to video.output_path, encoded in the background",
+        )
+
         st.divider()
 
         input_source = st.radio(
             "Input Source:", ["Webcam", "Video File", "Image"], index=0
         )
 
+    processor = configure_processor()
+
     # Cleanup webcam if input source changed
     if "previous_input_source" not in st.session_state:
         st.session_state.previous_input_source = input_source
 
     if st.session_state.previous_input_source != input_source:
-        if "webcam_cap" in st.session_state:
-            st.session_state.webcam_cap.release()
-            del st.session_state.webcam_cap
-        st.session_state.webcam_running = False
+        stop_webcam()
         st.session_state.previous_input_source = input_source
 
     if input_source == "Webcam":
@@ -270,12 +345,18 @@ def main():
                 if not cap.isOpened():
                     st.error("Cannot access webcam")
                 else:
+                    processor.reset()
+                    st.session_state.logging_agent.reset_metrics()
+                    # Only processed frames reach the sink; pace them by wall
+                    # clock so the clip plays in real time at any inference rate
+                    sink = create_sink("webcam", paced=True)
+                    pipeline = WebcamPipeline(cap, processor, writer=sink)
+                    pipeline.start()
                     st.session_state.webcam_cap = cap
+                    st.session_state.webcam_pipeline = pipeline
+                    st.session_state.webcam_sink = sink
                     st.session_state.webcam_running = True
-                    st.session_state.tracking_agent.reset()
-                    st.session_state.logging_agent.reset_metrics()
-                    st.session_state.frame_count = 0
-                    st.session_state.webcam_frame_count = 0
+                    st.session_state.webcam_last_rendered = None
                     st.session_state.webcam_start_time = time.time()
                     st.rerun()
 
@@ -286,12 +367,18 @@ def main():
                 disabled=not st.session_state.webcam_running,
                 key="stop_webcam_btn",
             ):
-                st.session_state.webcam_running = False
-                if "webcam_cap" in st.session_state:
-                    st.session_state.webcam_cap.release()
-                    del st.session_state.webcam_cap
+                stop_webcam()
                 st.rerun()
 
+        if (
+            st.session_state.get("last_recording")
+            and not st.session_state.webcam_running
+        ):
+            st.info(
+                "Saved recording: "
+                + ", ".join(str(path) for path in st.session_state.last_recording)
+            )
+
         col1, col2 = st.columns([2, 1])
 
         with col1:
@@ -329,9 +416,8 @@ def main():
                 st.error("Cannot open video file")
                 return
 
-            st.session_state.tracking_agent.reset()
+            processor.reset()
             st.session_state.logging_agent.reset_metrics()
-            st.session_state.frame_count = 0
 
             frame_count = 0
             start_time = time.time()
@@ -342,42 +428,76 @@ def main():
                 progress_bar = st.progress(0)
                 total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-                while cap.isOpened():
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                    st.session_state.frame_count = frame_count
-
-                    class_filter = st.session_state.get("class_filter", None)
-                    show_confidence = st.session_state.get("show_confidence", True)
-                    frame_skip = st.session_state.get("frame_skip", 0)
-
-                    annotated_frame, detections, tracks = process_frame(
-                        frame_rgb, class_filter, show_confidence, frame_skip
-                    )
-
-                    video_placeholder.image(
-                        annotated_frame, channels="RGB", width="stretch"
+                # The pipeline already encodes on its own thread, so let the
+                # sink apply backpressure instead of dropping frames; keep the
+                # source timing
+                sink = create_sink(
+                    Path(uploaded_file.name).stem,
+                    block=True,
+                    fps=cap.get(cv2.CAP_PROP_FPS)
+                    or st.session_state.model_manager.get_config_value("video.fps", 30),
+                )
+
+                # Detections depend only on the video and detection settings;
+                # when those match a previous run, only tracking is redone
+                cached, cache_writer = None, None
+                if st.session_state.get("use_detection_cache", False):
+                    cached, cache_writer = processor.open_cache(
+                        st.session_state.detection_cache, file_hash(tfile)
                     )
+                    if cached is not None:
+                        st.info("Replaying cached detections")
+
+                # Decoding, inference and annotation run on background
+                # threads; this loop only displays finished frames in order
+                pipeline = VideoFilePipeline(
+                    cap,
+                    processor,
+                    writer=sink,
+                    cached=cached,
+                    cache_writer=cache_writer,
+                )
+                pipeline.start()
+                try:
+                    for result in pipeline.results():
+                        video_placeholder.image(
+                            result["annotated_frame"], channels="BGR", width="stretch"
+                        )
 
-                    frame_count += 1
-                    elapsed_time = time.time() - start_time
-                    fps = frame_count / elapsed_time if elapsed_time > 0 else 0
+                        frame_count += 1
+                        elapsed_time = time.time() - start_time
+                        fps = frame_count / elapsed_time if elapsed_time > 0 else 0
 
-                    with stats_placeholder.container():
-                        st.metric("FPS", f"{fps:.2f}")
-                        st.metric("Frame", f"{frame_count}/{total_frames}")
-                        st.metric("Detections", len(detections))
-                        st.metric("Active Tracks", len(tracks))
+                        with stats_placeholder.container():
+                            st.metric("FPS", f"{fps:.2f}")
+                            st.metric("Frame", f"{frame_count}/{total_frames}")
+                            st.metric("Detections", len(result["detections"]))
+                            st.metric("Active Tracks", len(result["tracks"]))
 
-                    progress_bar.progress(min(frame_count / total_frames, 1.0))
+                        progress_bar.progress(min(frame_count / total_frames, 1.0))
+                finally:
+                    pipeline.stop()
+                    if sink is not None:
+                        sink.close()
 
                 cap.release()
                 tfile.unlink()
-                st.success("Video processing complete!")
+                if pipeline.error:
+                    st.error(pipeline.error)
+                elif sink is not None and sink.error:
+                    st.error(sink.error)
+                else:
+                    if (
+                        cache_writer is not None
+                        and len(cache_writer) == pipeline.decoded_frames
+                    ):
+                        cache_writer.commit()
+                    st.success("Video processing complete!")
+                    if sink is not None:
+                        st.info(
+                            "Saved recording: "
+                            + ", ".join(str(path) for path in sink.segments)
+                        )
 
     elif input_source == "Image":
         uploaded_image = st.file_uploader(
@@ -395,21 +515,28 @@ def main():
             stats_placeholder = st.empty()
 
         if uploaded_image is not None:
-            file_bytes = np.asarray(bytearray(uploaded_image.read()), dtype=np.uint8)
-            image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            # Every widget change reruns the script; the decoded image and its
+            # detections are memoized so only tracking and drawing are redone
+            image_bytes = uploaded_image.getvalue()
+            image_hash = hashlib.sha256(image_bytes).hexdigest()
+            image_cache = st.session_state.image_cache
+
+            image = image_cache.get(("image", image_hash))
+            if image is None:
+                file_bytes = np.frombuffer(image_bytes, dtype=np.uint8)
+                image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+                image.setflags(write=False)
+                image_cache.put(("image", image_hash), image)
 
-            st.session_state.tracking_agent.reset()
-            st.session_state.frame_count = 0
+            detections = processor.detect_cached(image, image_cache, image_hash)
 
-            class_filter = st.session_state.get("class_filter", None)
-            show_confidence = st.session_state.get("show_confidence", True)
+            processor.reset()
 
-            annotated_image, detections, tracks = process_frame(
-                image_rgb, class_filter, show_confidence, 0
+            annotated_image, detections, tracks = processor.process(
+                image, detections=detections, plan=(True, None)
             )
 
-            video_placeholder.image(annotated_image, channels="RGB", width="stretch")
+            video_placeholder.image(annotated_image, channels="BGR", width="stretch")
 
             with stats_placeholder.container():
                 st.metric("Detections", len(detections))
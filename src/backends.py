@@ -0,0 +1,113 @@
+import ast
+import platform
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+BACKENDS = ("torch", "onnxruntime")
+# Quantized variants always run on ONNX Runtime
+PRECISIONS = ("fp32", "int8-dynamic", "int8-static")
+
+
+# Runs the bare detection network on a preprocessed (N, 3, H, W) float32 batch
+# and returns its raw output: (N, 4 + nc, anchors) with xywh boxes and class
+# scores, or (N, max_det, 6) xyxy/score/class rows for end-to-end heads. Decoding
+# and NMS are left to DetectionAgent so every backend shares them.
+class InferenceBackend:
+    name = ""
+
+    def __init__(self, nc: int, end2end: bool = False, channels_last: bool = False):
+        self.nc = nc
+        self.end2end = end2end
+        # Whether the backend prefers NHWC-strided input
+        self.channels_last = channels_last
+
+    def __call__(self, inputs: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+# The fused PyTorch module of a loaded YOLO model, prepared once for a device.
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def __init__(self, model: Any, device: str = "cpu"):
+        import torch
+
+        network = model.model.fuse(verbose=False)
+        network = network.to(device).float().eval()
+        for parameter in network.parameters():
+            parameter.requires_grad = False
+
+        # Channels-last convolutions are markedly faster on x86 CPUs (oneDNN)
+        # and on CUDA; the preprocessor then writes NHWC input directly
+        self.device = torch.device(device)
+        channels_last = self.device.type == "cuda" or (
+            self.device.type == "cpu"
+            and platform.machine() in {"AMD64", "x86_64"}
+            and torch.backends.mkldnn.is_available()
+        )
+        network.to(
+            memory_format=(
+                torch.channels_last if channels_last else torch.contiguous_format
+            )
+        )
+        self.network = network
+
+        head = network.model[-1]
+        super().__init__(head.nc, bool(getattr(head, "end2end", False)), channels_last)
+
+    def __call__(self, inputs: np.ndarray) -> np.ndarray:
+        import torch
+
+        with torch.inference_mode():
+            output = self.network(torch.from_numpy(inputs).to(self.device))
+        if isinstance(output, (tuple, list)):
+            output = output[0]
+        return output.float().cpu().numpy()
+
+
+# An exported .onnx model in an ONNX Runtime session. Class names and head
+# layout come from the metadata Ultralytics writes on export.
+class OnnxRuntimeBackend(InferenceBackend):
+    name = "onnxruntime"
+
+    def __init__(self, path: str | Path, device: str = "cpu", threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(
+                "The onnxruntime backend needs the onnxruntime package"
+            ) from e
+
+        self.path = Path(path)
+        providers = ["CPUExecutionProvider"]
+        if device.startswith("cuda"):
+            providers.insert(0, "CUDAExecutionProvider")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(self.path), options, providers=providers
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names: dict[int, str] = ast.literal_eval(metadata.get("names", "{}"))
+        super().__init__(
+            len(self.names) or self.session.get_outputs()[0].shape[1] - 4,
+            metadata.get("end2end") == "True",
+        )
+
+    def __call__(self, inputs: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: inputs})[0]
+
+
+def create_backend(model: Any, device: str = "cpu") -> InferenceBackend:
+    # YOLO wraps either an nn.Module (.pt weights) or the path of an exported
+    # model that its own predictor would load
+    weights = model.model
+    if not isinstance(weights, (str, Path)):
+        return TorchBackend(model, device)
+    if Path(weights).suffix == ".onnx":
+        return OnnxRuntimeBackend(weights, device)
+    raise ValueError(f"No inference backend for {weights}")
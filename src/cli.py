@@ -0,0 +1,427 @@
+import argparse
+import glob
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import cv2
+
+from src.backends import BACKENDS
+from src.config import ConfigWatcher
+from src.detection_cache import DetectionCache, file_hash
+from src.model_manager_agent import PRECISIONS, ModelManagerAgent
+from src.parallel import process_video_parallel, processor_settings
+from src.pipeline import FrameProcessor, VideoFilePipeline
+from src.video_sink import VideoSink
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="Run detection and tracking on videos and images without the UI.",
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Video files, image files, directories or glob patterns",
+    )
+    parser.add_argument("--config", default="config.yaml", help="Configuration file")
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="Where to write results (default: video.output_path from the config)",
+    )
+    parser.add_argument("--model", help="Model weights (default: model.name)")
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        help="Inference backend (default: model.backend)",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        help="fp32 or a quantized INT8 variant (default: model.precision)",
+    )
+    parser.add_argument("--device", help="Inference device, e.g. cpu or cuda")
+    parser.add_argument("--confidence", type=float, help="Confidence threshold")
+    parser.add_argument(
+        "--classes", nargs="+", help="Only keep these class names (default: all)"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, help="Frames per batched forward pass"
+    )
+    parser.add_argument(
+        "--frame-skip", type=int, help="Detect every N+1th frame in videos"
+    )
+    parser.add_argument(
+        "--motion-gating",
+        action=argparse.BooleanOptionalAction,
+        help="Detect only when the scene changes (default: motion.enabled)",
+    )
+    parser.add_argument(
+        "--roi",
+        action=argparse.BooleanOptionalAction,
+        help="Detect only around motion and tracks (default: roi.enabled)",
+    )
+    parser.add_argument(
+        "--tiled",
+        action=argparse.BooleanOptionalAction,
+        help="Tile high-resolution frames (default: tiling.enabled)",
+    )
+    parser.add_argument(
+        "--benchmark-tiling",
+        nargs="+",
+        type=tile_config,
+        metavar="SIZE[:OVERLAP]",
+        help="Instead of processing, report tiled-inference throughput for each "
+        "tile configuration on the first frame of every input",
+    )
+    parser.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        help="Reuse per-frame video detections from earlier runs (default: "
+        "cache.enabled)",
+    )
+    parser.add_argument(
+        "--cache-dir", help="Detection cache directory (default: cache.dir)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Split each video into chunks processed by this many processes",
+    )
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=10,
+        help="Frames shared by neighbouring chunks to stitch tracks (with --workers)",
+    )
+    parser.add_argument(
+        "--watch-config",
+        action="store_true",
+        help="Apply edits to the configuration file while processing",
+    )
+    parser.add_argument(
+        "--save-annotated",
+        action="store_true",
+        help="Also write annotated videos and images",
+    )
+    return parser
+
+
+def tile_config(value: str) -> tuple[int, float | None]:
+    # "640" or "640:0.2"; a missing overlap falls back to tiling.overlap
+    size, _, overlap = value.partition(":")
+    try:
+        return int(size), float(overlap) if overlap else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected SIZE or SIZE:OVERLAP, got {value!r}"
+        ) from None
+
+
+def collect_inputs(patterns: list[str]) -> tuple[list[Path], list[Path]]:
+    # Expands directories and globs into sorted, de-duplicated media files
+    paths: list[Path] = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            paths.extend(p for p in sorted(path.iterdir()) if p.is_file())
+        elif path.is_file():
+            paths.append(path)
+        else:
+            paths.extend(Path(p) for p in sorted(glob.glob(pattern, recursive=True)))
+
+    videos, images = [], []
+    for path in dict.fromkeys(paths):
+        suffix = path.suffix.lower()
+        if suffix in VIDEO_EXTENSIONS:
+            videos.append(path)
+        elif suffix in IMAGE_EXTENSIONS:
+            images.append(path)
+    return videos, images
+
+
+def configure(processor: FrameProcessor, args: argparse.Namespace) -> None:
+    detection_agent = processor.detection_agent
+    if args.device is not None:
+        detection_agent.device = args.device
+    if args.confidence is not None:
+        detection_agent.confidence_threshold = args.confidence
+    if args.batch_size is not None:
+        detection_agent.max_batch_size = args.batch_size
+    if args.frame_skip is not None:
+        processor.frame_skip = args.frame_skip
+    if args.motion_gating is not None:
+        processor.motion_gating = args.motion_gating
+    if args.roi is not None:
+        processor.roi_inference = args.roi
+    if args.tiled is not None:
+        processor.tiled_inference = args.tiled
+    processor.class_filter = args.classes
+
+
+def process_video(
+    path: Path,
+    processor: FrameProcessor,
+    output_dir: Path,
+    sink: VideoSink | None = None,
+    cache: DetectionCache | None = None,
+) -> int:
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video file: {path}")
+
+    cached, cache_writer = None, None
+    if cache is not None:
+        cached, cache_writer = processor.open_cache(cache, file_hash(path))
+        if cached is not None:
+            print(f"{path}: replaying cached detections")
+
+    if sink is not None:
+        # Keep the source timing; segments open lazily on the first frame
+        sink.fps = cap.get(cv2.CAP_PROP_FPS) or sink.fps
+
+    processor.reset()
+    pipeline = VideoFilePipeline(
+        cap, processor, writer=sink, cached=cached, cache_writer=cache_writer
+    )
+    frames = 0
+    pipeline.start()
+    try:
+        with open(output_dir / f"{path.stem}.jsonl", "w") as f:
+            for result in pipeline.results():
+                record = {
+                    "frame": result["frame_index"],
+                    "detections": _to_dicts(result["detections"]),
+                    "tracks": result["tracks"],
+                }
+                f.write(json.dumps(record) + "\n")
+                frames += 1
+    finally:
+        pipeline.stop()
+        cap.release()
+        if sink is not None:
+            sink.close()
+
+    if pipeline.error:
+        raise RuntimeError(pipeline.error)
+    if sink is not None and sink.error:
+        raise RuntimeError(sink.error)
+    if cache_writer is not None and len(cache_writer) == pipeline.decoded_frames:
+        cache_writer.commit()
+    return frames
+
+
+def process_video_chunked(
+    path: Path,
+    processor: FrameProcessor,
+    output_dir: Path,
+    args: argparse.Namespace,
+) -> int:
+    records = process_video_parallel(
+        str(path),
+        config_path=args.config,
+        workers=args.workers,
+        overlap=args.overlap,
+        model_name=args.model,
+        backend=args.backend,
+        precision=args.precision,
+        settings=processor_settings(processor),
+        # Stitch with the tracker's own threshold (tracking.iou_threshold)
+        iou_threshold=processor.tracking_agent.iou_threshold,
+    )
+    with open(output_dir / f"{path.stem}.jsonl", "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+    return len(records)
+
+
+def process_images(
+    paths: list[Path],
+    processor: FrameProcessor,
+    output_dir: Path,
+    save_annotated: bool = False,
+) -> int:
+    # Images are independent, so detect them in batches and skip tracking
+    detection_agent = processor.detection_agent
+    batch_size = max(1, detection_agent.max_batch_size)
+    processed = 0
+
+    with open(output_dir / "images.jsonl", "w") as f:
+        for start in range(0, len(paths), batch_size):
+            batch_paths, frames = [], []
+            for path in paths[start : start + batch_size]:
+                image = cv2.imread(str(path))
+                if image is None:
+                    print(f"Skipping unreadable image: {path}", file=sys.stderr)
+                    continue
+                batch_paths.append(path)
+                frames.append(image)
+
+            batch_detections = processor.detect_frames(frames)
+
+            for path, frame, detections in zip(batch_paths, frames, batch_detections):
+                dicts = detections.to_dicts()
+                f.write(json.dumps({"image": str(path), "detections": dicts}) + "\n")
+
+                if save_annotated:
+                    # No tracking across images; number the boxes per image
+                    boxes = [{"track_id": i + 1, **d} for i, d in enumerate(dicts)]
+                    annotated = processor.annotate(frame, detections, boxes)
+                    cv2.imwrite(
+                        str(output_dir / f"{path.stem}_annotated{path.suffix}"),
+                        annotated,
+                    )
+            processed += len(frames)
+
+    return processed
+
+
+def benchmark_tiling(
+    paths: list[Path],
+    processor: FrameProcessor,
+    tile_configs: list[tuple[int, float | None]],
+) -> int:
+    detection_agent = processor.detection_agent
+    tile_configs = [
+        (size, detection_agent.tile_overlap if overlap is None else overlap)
+        for size, overlap in tile_configs
+    ]
+    failed = 0
+    for path in paths:
+        cap = cv2.VideoCapture(str(path))
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            print(f"{path}: cannot read a frame", file=sys.stderr)
+            failed += 1
+            continue
+
+        height, width = frame.shape[:2]
+        print(f"{path} ({width}x{height})")
+        report = detection_agent.benchmark_tiling(
+            frame, tile_configs, class_filter=processor.class_filter
+        )
+        for entry in report:
+            print(
+                f"  tile {entry['tile_size']} overlap {entry['tile_overlap']:.2f}: "
+                f"{entry['tiles']} tiles, {entry['ms_per_frame']:.1f} ms/frame, "
+                f"{entry['fps']:.2f} FPS, {entry['tiles_per_second']:.1f} tiles/s, "
+                f"{entry['detections']} detections"
+            )
+    return 1 if failed else 0
+
+
+def _to_dicts(detections: Any) -> list[dict[str, Any]]:
+    if isinstance(detections, list):
+        return detections
+    return detections.to_dicts()
+
+
+def _report(name: str, frames: int, elapsed: float) -> None:
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"{name}: {frames} frames in {elapsed:.2f}s ({fps:.2f} FPS)")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workers > 1:
+        # Chunk workers run their own processors from the config file
+        for flag, used in (
+            ("--save-annotated", args.save_annotated),
+            ("--watch-config", args.watch_config),
+            ("--cache", args.cache),
+        ):
+            if used:
+                parser.error(f"{flag} is not supported with --workers")
+
+    videos, images = collect_inputs(args.inputs)
+    if not videos and not images:
+        print("No videos or images found", file=sys.stderr)
+        return 1
+
+    model_manager = ModelManagerAgent(args.config)
+    model_manager.load_model(args.model, args.backend, precision=args.precision)
+    processor = FrameProcessor.from_config(model_manager)
+    configure(processor, args)
+    if args.benchmark_tiling:
+        return benchmark_tiling(videos + images, processor, args.benchmark_tiling)
+
+    watcher = None
+    if args.watch_config:
+        watcher = ConfigWatcher(
+            model_manager,
+            on_change=lambda changed: processor.apply_config(model_manager, changed),
+        )
+        watcher.start()
+
+    output_dir = Path(
+        args.output_dir or model_manager.get_config_value("video.output_path", ".")
+    )
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    cache = None
+    use_cache = args.cache
+    if use_cache is None:
+        use_cache = model_manager.get_config_value("cache.enabled", False)
+        if use_cache and args.workers > 1:
+            print("Detection cache is not used with --workers", file=sys.stderr)
+            use_cache = False
+    if use_cache:
+        cache = DetectionCache(
+            args.cache_dir
+            or model_manager.get_config_value("cache.dir", "cache/detections"),
+            int(
+                model_manager.get_config_value("cache.max_disk_mb", 1024) * 1024 * 1024
+            ),
+        )
+
+    failed = 0
+    total_frames = 0
+    total_start = time.perf_counter()
+
+    for path in videos:
+        start = time.perf_counter()
+        try:
+            if args.workers > 1:
+                frames = process_video_chunked(path, processor, output_dir, args)
+            else:
+                sink = None
+                if args.save_annotated:
+                    sink = VideoSink.from_config(
+                        model_manager,
+                        prefix=f"{path.stem}_annotated",
+                        output_dir=output_dir,
+                        block=True,
+                    )
+                frames = process_video(path, processor, output_dir, sink, cache)
+        except (RuntimeError, OSError) as e:
+            print(f"{path}: failed: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        total_frames += frames
+        _report(str(path), frames, time.perf_counter() - start)
+
+    if images:
+        start = time.perf_counter()
+        frames = process_images(images, processor, output_dir, args.save_annotated)
+        total_frames += frames
+        _report(f"{len(images)} images", frames, time.perf_counter() - start)
+
+    if watcher is not None:
+        watcher.stop()
+
+    _report("Total", total_frames, time.perf_counter() - total_start)
+    print(f"Results written to {output_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import os
+import threading
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any
+
+from src.backends import BACKENDS, PRECISIONS
+from src.tracking_agent import ASSIGNMENT_MODES, MOTION_MODELS
+
+if TYPE_CHECKING:
+    from src.model_manager_agent import ModelManagerAgent
+
+_MISSING = object()
+
+# Expected type, or tuple of allowed values, of the settings that are applied to
+# running agents or select the model. Values are coerced when a snapshot is
+# built, so a bad edit is rejected before it reaches a live pipeline.
+CONFIG_TYPES: dict[str, Any] = {
+    "model.name": str,
+    "model.device": str,
+    "model.backend": BACKENDS,
+    "model.precision": PRECISIONS,
+    "model.confidence_threshold": float,
+    "model.iou_threshold": float,
+    "model.batch_size": int,
+    "model.direct_inference": bool,
+    "roi.enabled": bool,
+    "roi.padding": int,
+    "roi.min_size": int,
+    "roi.max_coverage": float,
+    "tiling.enabled": bool,
+    "tiling.tile_size": int,
+    "tiling.overlap": float,
+    "tiling.merge_threshold": float,
+    "tracking.max_age": int,
+    "tracking.min_hits": int,
+    "tracking.iou_threshold": float,
+    "tracking.assignment": ASSIGNMENT_MODES,
+    "tracking.motion_model": MOTION_MODELS,
+    "tracking.grid_min_tracks": int,
+    "motion.enabled": bool,
+    "motion.downscale_width": int,
+    "motion.pixel_threshold": int,
+    "motion.min_changed_fraction": float,
+    "motion.max_gap": int,
+    "video.frame_skip": int,
+    "ui.show_confidence": bool,
+}
+
+
+def _invalid(key: str, expected: Any, value: Any) -> ValueError:
+    if isinstance(expected, tuple):
+        return ValueError(f"{key}: {value!r} is not one of {expected}")
+    return ValueError(f"{key}: expected {expected.__name__}, got {value!r}")
+
+
+def _coerce(key: str, value: Any, expected: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(expected, tuple):
+        if value not in expected:
+            raise _invalid(key, expected, value)
+        return value
+    if expected is bool:
+        if not isinstance(value, bool):
+            raise _invalid(key, expected, value)
+        return value
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise _invalid(key, expected, value)
+    if expected is str:
+        return str(value)
+    try:
+        number = float(value)
+    except ValueError:
+        raise _invalid(key, expected, value) from None
+    if expected is int:
+        if not number.is_integer():
+            raise _invalid(key, expected, value)
+        return int(number)
+    return number
+
+
+def _typed(data: Mapping[str, Any]) -> dict[str, Any]:
+    # Copy of the nested config with every CONFIG_TYPES value coerced
+    typed = {
+        name: _typed(value) if isinstance(value, Mapping) else value
+        for name, value in data.items()
+    }
+    for key, expected in CONFIG_TYPES.items():
+        *sections, name = key.split(".")
+        section = typed
+        for part in sections:
+            section = section.get(part)
+            if not isinstance(section, dict):
+                break
+        else:
+            if name in section:
+                section[name] = _coerce(key, section[name], expected)
+    return typed
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _flatten(data: Mapping[str, Any], prefix: str = "") -> dict[str, Any]:
+    # Every dotted path maps to its value, sections included, so a lookup is a
+    # single dict access instead of a walk per key
+    values: dict[str, Any] = {}
+    for name, value in data.items():
+        key = f"{prefix}{name}"
+        values[key] = _freeze(value)
+        if isinstance(value, Mapping):
+            values.update(_flatten(value, f"{key}."))
+    return values
+
+
+# Read-only, typed view of one version of config.yaml. The flattened key map is
+# built once, so per-frame lookups cost one dict access, and a reload publishes
+# a whole new snapshot instead of mutating the one readers hold.
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    values: Mapping[str, Any] = field(default_factory=dict)
+    version: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any], version: int = 0) -> "ConfigSnapshot":
+        # Raises ValueError if a CONFIG_TYPES value has the wrong type
+        return cls(MappingProxyType(_flatten(_typed(data))), version)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(key, default)
+
+    def changed_keys(self, other: "ConfigSnapshot") -> set[str]:
+        # Leaf keys added, removed or changed between the two snapshots
+        changed = set()
+        for key in self.values.keys() | other.values.keys():
+            old = other.values.get(key, _MISSING)
+            new = self.values.get(key, _MISSING)
+            if old == new or isinstance(old, Mapping) or isinstance(new, Mapping):
+                continue
+            changed.add(key)
+        return changed
+
+
+# Polls the config file and reloads it through the model manager when its
+# modification time or size changes. on_change receives the changed keys. A
+# file that fails to parse or validate, or whose changes fail to apply, leaves
+# the previous snapshot in place.
+class ConfigWatcher:
+    def __init__(
+        self,
+        model_manager: "ModelManagerAgent",
+        interval: float = 1.0,
+        on_change: Callable[[set[str]], Any] | None = None,
+    ):
+        self.model_manager = model_manager
+        self.interval = interval
+        self.on_change = on_change
+        self.reloads = 0
+        self.error: str | None = None
+        self._stamp = self._file_stamp()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _file_stamp(self) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(self.model_manager.config_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self) -> set[str]:
+        # Reloads once if the file changed since the last check
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return set()
+        self._stamp = stamp
+
+        try:
+            changed = self.model_manager.reload_config(self.on_change)
+        except Exception as e:  # noqa: BLE001 - a bad reload keeps the old config
+            self.error = str(e)
+            logging_agent = self.model_manager.logging_agent
+            if logging_agent is not None:
+                logging_agent.log_error(e, "reloading configuration")
+            return set()
+
+        self.error = None
+        self.reloads += 1
+        return changed
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.check()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
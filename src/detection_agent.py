@@ -1,81 +1,609 @@
+import hashlib
+import math
+import threading
+import time
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
+import cv2
 import numpy as np
-from ultralytics import YOLO
+
+from src.backends import InferenceBackend, create_backend
+from src.detection_cache import file_hash
+from src.detections import Detections, merge_crop_boxes, nms_indices
+from src.preprocessing import LetterboxInfo, LetterboxPreprocessor
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
 
 
 class DetectionAgent:
     def __init__(
-        self, model_path: str, confidence_threshold: float = 0.5, device: str = "cpu"
+        self,
+        model_path: str,
+        confidence_threshold: float = 0.5,
+        device: str = "cpu",
+        max_batch_size: int = 8,
+        nms_iou_threshold: float = 0.7,
+        imgsz: int = 640,
+        max_det: int = 50,
+        roi_padding: int = 32,
+        roi_min_size: int = 96,
+        roi_max_coverage: float = 0.6,
+        tile_size: int = 640,
+        tile_overlap: float = 0.2,
+        merge_threshold: float = 0.5,
+        channel_order: str = "BGR",
+        direct_inference: bool = False,
     ):
         self.model_path = Path(model_path)
         self.confidence_threshold = confidence_threshold
         self.device = device
+        self.max_batch_size = max(1, max_batch_size)
+        self.nms_iou_threshold = nms_iou_threshold
+        # Network input size and per-frame detection cap of full-frame passes
+        self.imgsz = imgsz
+        self.max_det = max_det
+        self.roi_padding = roi_padding
+        self.roi_min_size = roi_min_size
+        self.roi_max_coverage = roi_max_coverage
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.merge_threshold = merge_threshold
+        self.direct_inference = direct_inference
+        # Order of the frames handed to detect*(); pipelines keep frames BGR as
+        # decoded, so by default nothing is converted before inference
+        self.preprocessor = LetterboxPreprocessor(channel_order=channel_order)
         self.model: YOLO | None = None
+        self._model_hash: str | None = None
+        self._names: tuple[Any, dict[int, str]] | None = None
+        self._backend: tuple[Any, str, InferenceBackend] | None = None
+        self._inference_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._ready.set()
+        self.warmup_time: float | None = None
+        self.warmup_error: str | None = None
 
     def load_model(self) -> None:
+        # Deferred so importing the agent does not pull in ultralytics and torch
+        from ultralytics import YOLO
+
         if not self.model_path.exists():
             self.model = YOLO(self.model_path.name)
         else:
             self.model = YOLO(str(self.model_path))
 
+    @property
+    def ready(self) -> bool:
+        # False while a background warm-up is running
+        return self._ready.is_set()
+
+    def warm_up(self, runs: int = 2, imgsz: int = 640, batch_size: int = 1) -> float:
+        # Dummy inferences at the real input size pay for lazy setup (predictor
+        # or backend preparation, allocator growth) before the first frame does.
+        # Returns and records the total time.
+        frames = [np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)] * batch_size
+        start = time.perf_counter()
+        try:
+            for _ in range(max(1, runs)):
+                self.detect_batch(frames, columnar=True)
+        finally:
+            self.warmup_time = time.perf_counter() - start
+            self._ready.set()
+        return self.warmup_time
+
+    def start_warm_up(
+        self, runs: int = 2, imgsz: int = 640, batch_size: int = 1
+    ) -> threading.Thread:
+        self._ready.clear()
+        self.warmup_error = None
+
+        def run() -> None:
+            try:
+                self.warm_up(runs, imgsz, batch_size)
+            except Exception as e:  # noqa: BLE001 - reported via warmup_error
+                self.warmup_error = f"Warm-up failed: {e}"
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def set_model(self, model: "YOLO", model_path: str | None = None) -> None:
+        # Swaps in another loaded model, e.g. one taken from the model pool
+        self.model = model
+        if model_path is not None:
+            self.model_path = Path(model_path)
+        self._model_hash = None
+
+    @property
+    def names(self) -> dict[int, str]:
+        # YOLO.names builds a predictor, and with it a new runtime session, on
+        # every access for exported models; resolve it once per model
+        if self._names is None or self._names[0] is not self.model:
+            self._names = (self.model, self.model.names)
+        return self._names[1]
+
+    @property
+    def channel_order(self) -> str:
+        return self.preprocessor.channel_order
+
+    def preprocess(
+        self, frames: list[np.ndarray], imgsz: int = 640
+    ) -> tuple[np.ndarray, list[LetterboxInfo]]:
+        # Network input batch for frames in channel_order; the array is reused
+        # by the next call with the same batch geometry
+        return self.preprocessor(frames, imgsz)
+
     def detect(
-        self, frame: np.ndarray, class_filter: list[str] | None = None
+        self,
+        frame: np.ndarray,
+        class_filter: list[str] | None = None,
+        columnar: bool = False,
+    ) -> list[dict[str, Any]] | Detections:
+        if self.direct_inference:
+            detections = self._predict_direct([frame], class_filter)[0]
+            return detections if columnar else detections.to_dicts()
+
+        results = self._predict(frame, class_filter)
+
+        if columnar:
+            return self._parse_result_columnar(results[0])
+
+        detections = []
+        for result in results:
+            detections.extend(self._parse_result(result))
+
+        return detections
+
+    def detect_batch(
+        self,
+        frames: list[np.ndarray],
+        class_filter: list[str] | None = None,
+        columnar: bool = False,
+    ) -> list[list[dict[str, Any]]] | list[Detections]:
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+
+        parse = self._parse_result_columnar if columnar else self._parse_result
+        batch_detections = []
+        for start in range(0, len(frames), self.max_batch_size):
+            chunk = list(frames[start : start + self.max_batch_size])
+            if self.direct_inference:
+                detections = self._predict_direct(chunk, class_filter)
+                batch_detections.extend(
+                    d if columnar else d.to_dicts() for d in detections
+                )
+                continue
+            results = self._predict(chunk, class_filter)
+            batch_detections.extend(parse(result) for result in results)
+
+        return batch_detections
+
+    def detect_regions(
+        self,
+        frame: np.ndarray,
+        regions: np.ndarray,
+        class_filter: list[str] | None = None,
+        columnar: bool = False,
+    ) -> list[dict[str, Any]] | Detections:
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+
+        height, width = frame.shape[:2]
+        rects = self.merge_regions(
+            regions, (height, width), self.roi_padding, self.roi_min_size
+        )
+
+        if len(rects) == 0:
+            detections = Detections.empty(self.names)
+        elif (
+            np.prod(rects[:, 2:] - rects[:, :2], axis=1).sum()
+            >= self.roi_max_coverage * height * width
+        ):
+            # Crops would cover most of the frame anyway
+            return self.detect(frame, class_filter, columnar)
+        else:
+            detections = self._detect_crops(frame, rects, class_filter, self.max_det)
+
+        return detections if columnar else detections.to_dicts()
+
+    def detect_tiled(
+        self,
+        frame: np.ndarray,
+        class_filter: list[str] | None = None,
+        columnar: bool = False,
+        tile_size: int | None = None,
+        tile_overlap: float | None = None,
+    ) -> list[dict[str, Any]] | Detections:
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+
+        tile_size = tile_size or self.tile_size
+        tile_overlap = self.tile_overlap if tile_overlap is None else tile_overlap
+        rects = self.tile_rects(frame.shape[:2], tile_size, tile_overlap)
+
+        # Each tile is fed at its native resolution so small objects survive;
+        # the merged result is not capped at max_det since there are many tiles
+        detections = self._detect_crops(
+            frame, rects, class_filter, max_det=None, imgsz=tile_size
+        )
+        return detections if columnar else detections.to_dicts()
+
+    @staticmethod
+    def tile_rects(
+        frame_shape: tuple[int, int], tile_size: int, tile_overlap: float
+    ) -> np.ndarray:
+        height, width = frame_shape[:2]
+        step = max(1, int(tile_size * (1 - tile_overlap)))
+
+        def starts(length: int) -> list[int]:
+            if length <= tile_size:
+                return [0]
+            positions = list(range(0, length - tile_size, step))
+            # Last tile is aligned to the far edge rather than running past it
+            return positions + [length - tile_size]
+
+        return np.array(
+            [
+                [x, y, min(x + tile_size, width), min(y + tile_size, height)]
+                for y in starts(height)
+                for x in starts(width)
+            ],
+            dtype=np.int64,
+        )
+
+    def benchmark_tiling(
+        self,
+        frame: np.ndarray,
+        tile_configs: list[tuple[int, float]],
+        runs: int = 5,
+        class_filter: list[str] | None = None,
     ) -> list[dict[str, Any]]:
+        report = []
+        for tile_size, tile_overlap in tile_configs:
+            n_tiles = len(self.tile_rects(frame.shape[:2], tile_size, tile_overlap))
+
+            # First call pays for predictor setup at this input size
+            self.detect_tiled(frame, class_filter, True, tile_size, tile_overlap)
+            start = time.perf_counter()
+            for _ in range(runs):
+                detections = self.detect_tiled(
+                    frame, class_filter, True, tile_size, tile_overlap
+                )
+            seconds_per_frame = (time.perf_counter() - start) / runs
+
+            report.append(
+                {
+                    "tile_size": tile_size,
+                    "tile_overlap": tile_overlap,
+                    "tiles": n_tiles,
+                    "ms_per_frame": seconds_per_frame * 1000,
+                    "fps": 1 / seconds_per_frame if seconds_per_frame > 0 else 0.0,
+                    "tiles_per_second": (
+                        n_tiles / seconds_per_frame if seconds_per_frame > 0 else 0.0
+                    ),
+                    "detections": len(detections),
+                }
+            )
+
+        return report
+
+    def _detect_crops(
+        self,
+        frame: np.ndarray,
+        rects: np.ndarray,
+        class_filter: list[str] | None,
+        max_det: int | None,
+        imgsz: int | None = None,
+    ) -> Detections:
+        # max_det caps the merged result; None keeps every detection
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects.tolist()]
+
+        if imgsz is None:
+            # Small crops get a smaller network input instead of being upscaled
+            largest_side = int((rects[:, 2:] - rects[:, :2]).max())
+            imgsz = min(self.imgsz, max(32, math.ceil(largest_side / 32) * 32))
+
+        parts = []
+        for start in range(0, len(crops), self.max_batch_size):
+            chunk = crops[start : start + self.max_batch_size]
+            if self.direct_inference:
+                chunk_detections = self._predict_direct(chunk, class_filter, imgsz)
+            else:
+                chunk_detections = [
+                    self._parse_result_columnar(result)
+                    for result in self._predict(chunk, class_filter, imgsz=imgsz)
+                ]
+            for (x1, y1, _, _), detections in zip(
+                rects[start:].tolist(), chunk_detections
+            ):
+                detections.xyxy += np.array([x1, y1, x1, y1], dtype=np.float32)
+                parts.append(detections)
+
+        return self._merge_detections(parts, max_det)
+
+    def _merge_detections(
+        self, parts: list[Detections], max_det: int | None
+    ) -> Detections:
+        merged = Detections.concatenate(parts, self.names)
+        if len(merged) == 0:
+            return merged
+
+        # Objects near a crop border are found in several crops, whole or cut
+        # in parts; fuse those, then apply the same agnostic NMS and max_det
+        # cap as a full-frame pass
+        sources = np.repeat(np.arange(len(parts)), [len(part) for part in parts])
+        keep, boxes = merge_crop_boxes(
+            merged.xyxy,
+            merged.conf,
+            merged.class_id,
+            sources,
+            self.merge_threshold,
+        )
+        merged = merged.select(keep)
+        merged.xyxy = boxes
+        keep = nms_indices(merged.xyxy, merged.conf, self.nms_iou_threshold)
+        return merged.select(keep[:max_det])
+
+    @staticmethod
+    def merge_regions(
+        regions: np.ndarray,
+        frame_shape: tuple[int, int],
+        padding: int = 0,
+        min_size: int = 0,
+    ) -> np.ndarray:
+        height, width = frame_shape[:2]
+        regions = np.asarray(regions, dtype=np.float64).reshape(-1, 4)
+        if len(regions) == 0:
+            return np.empty((0, 4), dtype=np.int64)
+
+        rects = regions + np.array([-padding, -padding, padding, padding])
+
+        # Grow small regions around their centre so the model keeps some context
+        centers = (rects[:, :2] + rects[:, 2:]) / 2
+        sizes = np.maximum(rects[:, 2:] - rects[:, :2], min(min_size, width, height))
+        rects = np.hstack([centers - sizes / 2, centers + sizes / 2])
+
+        # Shift back inside the frame instead of clipping, to keep the size
+        shift = np.maximum(0, -rects[:, :2]) - np.maximum(
+            0, rects[:, 2:] - np.array([width, height])
+        )
+        rects += np.hstack([shift, shift])
+        rects = np.clip(rects, 0, [width, height, width, height])
+        rects = np.hstack([np.floor(rects[:, :2]), np.ceil(rects[:, 2:])]).astype(
+            np.int64
+        )
+
+        merged: list[list[int]] = []
+        pending = rects.tolist()
+        while pending:
+            rect = pending.pop()
+            for i, other in enumerate(merged):
+                if (
+                    rect[0] < other[2]
+                    and other[0] < rect[2]
+                    and rect[1] < other[3]
+                    and other[1] < rect[3]
+                ):
+                    # The union can overlap rects merged earlier; re-check it
+                    merged.pop(i)
+                    pending.append(
+                        [
+                            min(rect[0], other[0]),
+                            min(rect[1], other[1]),
+                            max(rect[2], other[2]),
+                            max(rect[3], other[3]),
+                        ]
+                    )
+                    break
+            else:
+                merged.append(rect)
+
+        return np.array(merged, dtype=np.int64).reshape(-1, 4)
+
+    def _predict(
+        self,
+        source: np.ndarray | list[np.ndarray],
+        class_filter: list[str] | None,
+        imgsz: int | None = None,
+    ) -> list[Any]:
         if self.model is None:
             raise RuntimeError("Model not loaded. Call load_model() first.")
 
+        class_ids_filter = self._class_ids(class_filter)
+
+        if self.channel_order == "RGB":
+            # Ultralytics expects BGR arrays
+            if isinstance(source, list):
+                source = [cv2.cvtColor(frame, cv2.COLOR_RGB2BGR) for frame in source]
+            else:
+                source = cv2.cvtColor(source, cv2.COLOR_RGB2BGR)
+
+        with self._inference_lock:
+            return self.model(
+                source,
+                conf=self.confidence_threshold,
+                device=self.device,
+                verbose=False,
+                imgsz=imgsz or self.imgsz,
+                half=False,
+                iou=self.nms_iou_threshold,
+                max_det=self.max_det,
+                agnostic_nms=True,
+                classes=class_ids_filter,
+            )
+
+    def _class_ids(self, class_filter: list[str] | None) -> list[int] | None:
         # Convert class filter to class IDs for faster filtering
-        class_ids_filter = None
-        if class_filter:
-            class_ids_filter = [
-                cls_id
-                for cls_id, cls_name in self.model.names.items()
-                if cls_name in class_filter
-            ]
-
-        results = self.model(
-            frame,
-            conf=self.confidence_threshold,
-            device=self.device,
-            verbose=False,
-            imgsz=640,
-            half=False,
-            max_det=50,
-            agnostic_nms=True,
-            classes=class_ids_filter,
+        if not class_filter:
+            return None
+        return [
+            cls_id
+            for cls_id, cls_name in self.names.items()
+            if cls_name in class_filter
+        ]
+
+    def _inference_backend(self) -> InferenceBackend:
+        # Prepared once per model and device, instead of the per-call predictor
+        # setup of YOLO.__call__
+        if (
+            self._backend is None
+            or self._backend[0] is not self.model
+            or self._backend[1] != self.device
+        ):
+            backend = create_backend(self.model, self.device)
+            self.preprocessor.channels_last = backend.channels_last
+            self._backend = (self.model, self.device, backend)
+        return self._backend[2]
+
+    def _predict_direct(
+        self,
+        frames: list[np.ndarray],
+        class_filter: list[str] | None,
+        imgsz: int | None = None,
+        max_det: int | None = None,
+    ) -> list[Detections]:
+        # Lean path: our own letterbox, one forward pass on the backend,
+        # vectorized decode and NMS on the raw output. Same thresholds and
+        # max_det as _predict.
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+
+        # The preprocessor buffers are shared, so one batch at a time (a
+        # background warm-up may be running)
+        with self._inference_lock:
+            backend = self._inference_backend()
+            inputs, infos = self.preprocessor(frames, imgsz or self.imgsz)
+            output = backend(inputs)
+
+        class_ids = self._class_ids(class_filter)
+        max_det = max_det or self.max_det
+        return [
+            self._decode_output(
+                prediction, info, class_ids, max_det, backend.nc, backend.end2end
+            )
+            for prediction, info in zip(output, infos)
+        ]
+
+    def _decode_output(
+        self,
+        prediction: np.ndarray,
+        info: LetterboxInfo,
+        class_ids: list[int] | None,
+        max_det: int,
+        nc: int,
+        end2end: bool,
+    ) -> Detections:
+        if end2end:
+            # (max_det, 6) rows of x1, y1, x2, y2, score, class; already NMS-free
+            conf = prediction[:, 4]
+            class_id = prediction[:, 5].astype(np.int64)
+            keep = conf > self.confidence_threshold
+            if class_ids is not None:
+                keep &= np.isin(class_id, class_ids)
+            keep = np.flatnonzero(keep)[:max_det]
+            xyxy = prediction[keep, :4].copy()
+        else:
+            # (4 + nc, anchors): xywh boxes then per-class scores; best class only
+            scores = prediction[4 : 4 + nc]
+            class_id = scores.argmax(0)
+            conf = np.take_along_axis(scores, class_id[None], 0)[0]
+            keep = conf > self.confidence_threshold
+            if class_ids is not None:
+                keep &= np.isin(class_id, class_ids)
+            keep = np.flatnonzero(keep)
+
+            xywh = prediction[:4, keep].T
+            xyxy = np.empty_like(xywh)
+            xyxy[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+            xyxy[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+            selected = nms_indices(xyxy, conf[keep], self.nms_iou_threshold)[:max_det]
+            keep = keep[selected]
+            xyxy = xyxy[selected]
+
+        if len(keep) == 0:
+            return Detections.empty(self.names)
+        return Detections(
+            self.preprocessor.scale_boxes(xyxy, info),
+            conf[keep],
+            class_id[keep],
+            self.names,
         )
 
+    def _parse_result(self, result: Any) -> list[dict[str, Any]]:
+        boxes = result.boxes
+        if len(boxes) == 0:
+            return []
+
+        # Batch process boxes for better performance
+        class_ids = boxes.cls.cpu().numpy().astype(int)
+        confidences = boxes.conf.cpu().numpy()
+        xyxy = boxes.xyxy.cpu().numpy()
+
         detections = []
-        for result in results:
-            boxes = result.boxes
-            if len(boxes) == 0:
-                continue
+        for i in range(len(boxes)):
+            class_id = int(class_ids[i])
+            class_name = self.names[class_id]
+            confidence = float(confidences[i])
+            x1, y1, x2, y2 = xyxy[i]
 
-            # Batch process boxes for better performance
-            class_ids = boxes.cls.cpu().numpy().astype(int)
-            confidences = boxes.conf.cpu().numpy()
-            xyxy = boxes.xyxy.cpu().numpy()
-
-            for i in range(len(boxes)):
-                class_id = int(class_ids[i])
-                class_name = self.model.names[class_id]
-                confidence = float(confidences[i])
-                x1, y1, x2, y2 = xyxy[i]
-
-                detections.append(
-                    {
-                        "bbox": [float(x1), float(y1), float(x2), float(y2)],
-                        "confidence": confidence,
-                        "class_id": class_id,
-                        "class_name": class_name,
-                    }
-                )
+            detections.append(
+                {
+                    "bbox": [float(x1), float(y1), float(x2), float(y2)],
+                    "confidence": confidence,
+                    "class_id": class_id,
+                    "class_name": class_name,
+                }
+            )
 
         return detections
 
+    def _parse_result_columnar(self, result: Any) -> Detections:
+        boxes = result.boxes
+        if len(boxes) == 0:
+            return Detections.empty(self.names)
+
+        return Detections(
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy(),
+            self.names,
+        )
+
     def get_class_names(self) -> dict[int, str]:
         if self.model is None:
             raise RuntimeError("Model not loaded. Call load_model() first.")
-        return self.model.names
+        return self.names
+
+    def model_hash(self) -> str:
+        # Content hash of the loaded weights; falls back to the name when the
+        # weights are not a local file
+        if self._model_hash is None:
+            path = Path(getattr(self.model, "ckpt_path", None) or self.model_path)
+            if path.is_file():
+                self._model_hash = file_hash(path)
+            else:
+                self._model_hash = hashlib.sha256(path.name.encode()).hexdigest()
+        return self._model_hash
+
+    def cache_params(
+        self, class_filter: list[str] | None = None, tiled: bool = False
+    ) -> dict[str, Any]:
+        # Everything besides the frame and the weights that changes the output
+        # of a full-frame (or tiled) pass
+        params = {
+            "confidence_threshold": self.confidence_threshold,
+            "nms_iou_threshold": self.nms_iou_threshold,
+            "imgsz": self.imgsz,
+            "max_det": self.max_det,
+            "direct_inference": self.direct_inference,
+            "classes": sorted(class_filter) if class_filter else None,
+            "tiled": tiled,
+        }
+        if tiled:
+            params.update(
+                tile_size=self.tile_size,
+                tile_overlap=self.tile_overlap,
+                merge_threshold=self.merge_threshold,
+            )
+        return params
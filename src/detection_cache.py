@@ -0,0 +1,264 @@
+import hashlib
+import json
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from src.detections import Detections
+
+CACHE_VERSION = 2
+
+
+def file_hash(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Per-frame detections of one video, stored as CSR columns: frame i owns rows
+# offsets[i]:offsets[i + 1] of boxes/conf/class_id. Arrays are memory-mapped, so
+# opening a cache is instant and frames are only paged in when used. Frames the
+# recording run skipped (frame skip, motion gating) are marked in `detected`
+# and have no rows.
+class CachedDetections:
+    def __init__(self, path: Path):
+        self.path = path
+        self.meta: dict[str, Any] = json.loads((path / "meta.json").read_text())
+        self.names = {int(k): v for k, v in self.meta["names"].items()}
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        self.xyxy = np.load(path / "boxes.npy", mmap_mode="r")
+        self.conf = np.load(path / "conf.npy", mmap_mode="r")
+        self.class_id = np.load(path / "class_id.npy", mmap_mode="r")
+        self.detected = np.load(path / "detected.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return self.offsets.shape[0] - 1
+
+    def covers(self, i: int) -> bool:
+        # Whether frame i was detected when the cache was recorded
+        return 0 <= i < len(self) and bool(self.detected[i])
+
+    def __getitem__(self, i: int) -> Detections:
+        if not 0 <= i < len(self):
+            return Detections.empty(self.names)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return Detections(
+            self.xyxy[start:end],
+            self.conf[start:end],
+            self.class_id[start:end],
+            self.names,
+        )
+
+
+# Collects detections frame by frame and publishes them atomically on commit(),
+# so an interrupted run never leaves a partial cache behind.
+class DetectionCacheWriter:
+    def __init__(
+        self,
+        path: Path,
+        params: dict[str, Any],
+        on_commit: Callable[[Path], Any] | None = None,
+    ):
+        self.path = path
+        self.params = params
+        self.on_commit = on_commit
+        self.names: dict[int, str] = {}
+        self._counts: list[int] = []
+        self._detected: list[bool] = []
+        self._xyxy: list[np.ndarray] = []
+        self._conf: list[np.ndarray] = []
+        self._class_id: list[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def append(self, detections: Detections | None) -> None:
+        # None records a frame that was not detected
+        self._detected.append(detections is not None)
+        if detections is None:
+            self._counts.append(0)
+            return
+        self.names.update(detections.names)
+        self._counts.append(len(detections))
+        self._xyxy.append(detections.xyxy)
+        self._conf.append(detections.conf)
+        self._class_id.append(detections.class_id)
+
+    def commit(self) -> CachedDetections:
+        tmp = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}")
+        tmp.mkdir(parents=True)
+
+        offsets = np.zeros(len(self._counts) + 1, dtype=np.int64)
+        np.cumsum(self._counts, out=offsets[1:])
+        np.save(tmp / "offsets.npy", offsets)
+        np.save(tmp / "detected.npy", np.array(self._detected, dtype=bool))
+        np.save(
+            tmp / "boxes.npy",
+            np.concatenate([np.empty((0, 4), np.float32), *self._xyxy]),
+        )
+        np.save(
+            tmp / "conf.npy", np.concatenate([np.empty(0, np.float32), *self._conf])
+        )
+        np.save(
+            tmp / "class_id.npy",
+            np.concatenate([np.empty(0, np.int64), *self._class_id]),
+        )
+        meta = {
+            "version": CACHE_VERSION,
+            "frames": len(self._counts),
+            "names": {str(k): v for k, v in self.names.items()},
+            "params": self.params,
+        }
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+
+        # Another run may have published the same key meanwhile; either copy
+        # is valid, so keep the existing one
+        try:
+            tmp.rename(self.path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+        if self.on_commit is not None:
+            self.on_commit(self.path)
+        return CachedDetections(self.path)
+
+
+def _dir_size(path: Path) -> int:
+    return sum(child.stat().st_size for child in path.iterdir() if child.is_file())
+
+
+# Disk cache of raw per-frame detections, keyed by the video content, the model
+# weights and every parameter that changes detector output. Tracking settings
+# are not part of the key, so re-tracking a cached video skips inference. The
+# directory is kept under max_bytes by removing the least recently used videos
+# whenever a new one is written.
+class DetectionCache:
+    def __init__(
+        self,
+        cache_dir: str | Path = "cache/detections",
+        max_bytes: int | None = 1024 * 1024 * 1024,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def key(self, video_hash: str, model_hash: str, params: dict[str, Any]) -> str:
+        payload = json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "video": video_hash,
+                "model": model_hash,
+                "params": params,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def load(self, key: str) -> CachedDetections | None:
+        path = self.cache_dir / key
+        meta = path / "meta.json"
+        if not meta.exists():
+            return None
+        # The modification time of meta.json records the last use
+        meta.touch()
+        return CachedDetections(path)
+
+    def writer(self, key: str, params: dict[str, Any]) -> DetectionCacheWriter:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return DetectionCacheWriter(self.cache_dir / key, params, self.prune)
+
+    def prune(self, keep: Path | None = None) -> None:
+        # Removes least recently used entries until the cache fits max_bytes;
+        # `keep`, the entry just written, always stays
+        if self.max_bytes is None or not self.cache_dir.is_dir():
+            return
+
+        entries = []
+        total = 0
+        for path in self.cache_dir.iterdir():
+            meta = path / "meta.json"
+            # Skips unpublished entries a concurrent run is still writing
+            if not meta.exists():
+                continue
+            size = _dir_size(path)
+            total += size
+            if path != keep:
+                entries.append((meta.stat().st_mtime_ns, size, path))
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def remove(self, key: str) -> None:
+        shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, Detections):
+        return value.xyxy.nbytes + value.conf.nbytes + value.class_id.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+# In-memory LRU bounded by the total size of the cached arrays rather than the
+# number of entries, since one decoded high-resolution image can outweigh
+# thousands of detection results. Entries larger than the whole budget are not
+# cached.
+class LRUCache:
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Any, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._entries
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Any, value: Any, nbytes: int | None = None) -> None:
+        # nbytes overrides the size estimate for values that are not arrays
+        size = _nbytes(value) if nbytes is None else nbytes
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,177 @@
+from collections.abc import Iterator
+from typing import Any
+
+import numpy as np
+
+
+class Detections:
+    __slots__ = ("_class_name", "class_id", "conf", "names", "xyxy")
+
+    def __init__(
+        self,
+        xyxy: np.ndarray,
+        conf: np.ndarray,
+        class_id: np.ndarray,
+        names: dict[int, str] | None = None,
+    ):
+        self.xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.ascontiguousarray(conf, dtype=np.float32).reshape(-1)
+        self.class_id = np.ascontiguousarray(class_id, dtype=np.int64).reshape(-1)
+        self.names = names or {}
+        self._class_name: np.ndarray | None = None
+
+    @classmethod
+    def empty(cls, names: dict[int, str] | None = None) -> "Detections":
+        return cls(
+            np.empty((0, 4), dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.int64),
+            names,
+        )
+
+    @classmethod
+    def from_dicts(
+        cls, detections: list[dict[str, Any]], names: dict[int, str] | None = None
+    ) -> "Detections":
+        if not detections:
+            return cls.empty(names)
+
+        names = dict(names or {})
+        for detection in detections:
+            names.setdefault(detection["class_id"], detection["class_name"])
+
+        return cls(
+            [detection["bbox"] for detection in detections],
+            [detection["confidence"] for detection in detections],
+            [detection["class_id"] for detection in detections],
+            names,
+        )
+
+    @classmethod
+    def concatenate(
+        cls, parts: list["Detections"], names: dict[int, str] | None = None
+    ) -> "Detections":
+        if not parts:
+            return cls.empty(names)
+
+        return cls(
+            np.concatenate([part.xyxy for part in parts]),
+            np.concatenate([part.conf for part in parts]),
+            np.concatenate([part.class_id for part in parts]),
+            names if names is not None else parts[0].names,
+        )
+
+    @property
+    def class_name(self) -> np.ndarray:
+        # Resolved on first access only; most consumers just need class_id
+        if self._class_name is None:
+            self._class_name = np.array(
+                [
+                    self.names.get(int(class_id), str(class_id))
+                    for class_id in self.class_id
+                ],
+                dtype=object,
+            )
+        return self._class_name
+
+    def select(self, index: np.ndarray | slice) -> "Detections":
+        return Detections(
+            self.xyxy[index], self.conf[index], self.class_id[index], self.names
+        )
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        return [self[i] for i in range(len(self))]
+
+    def __len__(self) -> int:
+        return self.conf.shape[0]
+
+    def __getitem__(self, i: int) -> dict[str, Any]:
+        class_id = int(self.class_id[i])
+        return {
+            "bbox": self.xyxy[i].tolist(),
+            "confidence": float(self.conf[i]),
+            "class_id": class_id,
+            "class_name": self.names.get(class_id, str(class_id)),
+        }
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def nms_indices(
+    boxes: np.ndarray, scores: np.ndarray, iou_threshold: float
+) -> np.ndarray:
+    # Greedy class-agnostic NMS; returns kept indices by descending score
+    boxes = np.asarray(boxes, dtype=np.float32)
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        inter_w = np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(
+            boxes[i, 0], boxes[rest, 0]
+        )
+        inter_h = np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(
+            boxes[i, 1], boxes[rest, 1]
+        )
+        inter = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.intp)
+
+
+def merge_crop_boxes(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    sources: np.ndarray,
+    ios_threshold: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Greedy merge of boxes found in different crops of one frame. By descending
+    # score, each kept box absorbs the same-class boxes of other crops whose
+    # intersection covers more than ios_threshold of the smaller box, and grows
+    # to their union, so the parts of an object cut by a crop border become one
+    # box; IoU would keep a part that is small next to the rest. Returns kept
+    # indices and their fused boxes.
+    boxes = np.asarray(boxes, dtype=np.float32)
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    keep, fused = [], []
+    while order.size:
+        i = order[0]
+        rest = order[1:]
+
+        inter_w = np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(
+            boxes[i, 0], boxes[rest, 0]
+        )
+        inter_h = np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(
+            boxes[i, 1], boxes[rest, 1]
+        )
+        inter = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+        smaller = np.minimum(areas[i], areas[rest])
+        ios = np.divide(inter, smaller, out=np.zeros_like(inter), where=smaller > 0)
+        merged = (
+            (ios > ios_threshold)
+            & (class_ids[rest] == class_ids[i])
+            & (sources[rest] != sources[i])
+        )
+
+        group = boxes[np.append(i, rest[merged])]
+        keep.append(i)
+        fused.append(
+            np.concatenate([group[:, :2].min(axis=0), group[:, 2:].max(axis=0)])
+        )
+        order = rest[~merged]
+
+    return np.array(keep, dtype=np.intp), np.array(fused, dtype=np.float32).reshape(
+        -1, 4
+    )
@@ -56,8 +56,27 @@ class LoggingAgent:
             extra={"tracks": tracks},
         )
 
-    def log_model_load(self, model_name: str, load_time: float) -> None:
-        self.logger.info(f"Loaded model '{model_name}' in {load_time:.2f}s")
+    def log_model_load(
+        self,
+        model_name: str,
+        load_time: float,
+        cache_hit: bool = False,
+        stats: dict[str, Any] | None = None,
+    ) -> None:
+        if cache_hit:
+            self.logger.info(
+                f"Reused cached model '{model_name}' in {load_time * 1000:.1f}ms"
+            )
+            self.increment_metric("model_cache_hits")
+        else:
+            self.logger.info(f"Loaded model '{model_name}' in {load_time:.2f}s")
+            self.increment_metric("model_cache_misses")
+            self.update_metrics(
+                "model_load_time", (self.get_metric("model_load_time") or 0) + load_time
+            )
+
+        if stats is not None:
+            self.update_metrics("model_pool", stats)
 
     def log_error(self, error: Exception, context: str = "") -> None:
         error_msg = f"Error in {context}: {str(error)}" if context else str(error)
@@ -1,43 +1,295 @@
+import copy
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Callable
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import yaml
-from ultralytics import YOLO
+
+from src.backends import BACKENDS, PRECISIONS
+from src.config import ConfigSnapshot
+from src.detection_cache import LRUCache, file_hash
+from src.logging_agent import LoggingAgent
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+DEFAULT_OPSET = 17
+
+
+def model_nbytes(model: "YOLO") -> int:
+    # Parameters and buffers of a PyTorch model; an exported model is
+    # approximated by its file size, which its runtime session keeps in memory
+    weights = model.model
+    if isinstance(weights, (str, Path)):
+        return Path(weights).stat().st_size
+    tensors = [*weights.parameters(), *weights.buffers()]
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
 
 
 class ModelManagerAgent:
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(
+        self,
+        config_path: str = "config.yaml",
+        logging_agent: LoggingAgent | None = None,
+    ):
         self.config_path = Path(config_path)
         self.config: dict[str, Any] = {}
+        self.snapshot = ConfigSnapshot()
         self.current_model: YOLO | None = None
         self.model_name: str = ""
+        self.backend: str = "torch"
+        self.precision: str = "fp32"
+        self.logging_agent = logging_agent
+        self.load_time = 0.0
+        self.prefetch_errors: dict[str, str] = {}
         self.load_config()
 
+        # Loaded models by (name, backend, device, precision), so switching
+        # back to a recently used model skips reading the weights again
+        pool_memory_mb = self.get_config_value("model.pool_memory_mb", 1024)
+        self.models = LRUCache(int(pool_memory_mb * 1024 * 1024))
+
     def load_config(self) -> None:
         if not self.config_path.exists():
             raise FileNotFoundError(f"Configuration file not found: {self.config_path}")
 
+        self.config = self._read_config()
+        self.snapshot = ConfigSnapshot.from_dict(self.config)
+
+    def _read_config(self) -> dict[str, Any]:
         with open(self.config_path, "r") as f:
-            self.config = yaml.safe_load(f)
+            config = yaml.safe_load(f) or {}
+        if not isinstance(config, dict):
+            raise TypeError(f"Configuration must be a mapping: {self.config_path}")
+        return config
+
+    def reload_config(
+        self, on_change: Callable[[set[str]], Any] | None = None
+    ) -> set[str]:
+        # Re-reads the file and swaps in a new snapshot in one assignment, so
+        # concurrent readers see either the old or the new version. Returns the
+        # keys whose values changed. A file that fails to parse or validate
+        # raises and leaves the current configuration in place; so does an
+        # on_change callback that fails to apply the changed keys.
+        config = self._read_config()
+        snapshot = ConfigSnapshot.from_dict(config, self.snapshot.version + 1)
+        changed = snapshot.changed_keys(self.snapshot)
 
-    def load_model(self, model_name: str | None = None) -> YOLO:
+        previous = (self.config, self.snapshot)
+        self.config, self.snapshot = config, snapshot
+        if changed and on_change is not None:
+            try:
+                on_change(changed)
+            except BaseException:
+                self.config, self.snapshot = previous
+                raise
+        return changed
+
+    def load_model(
+        self,
+        model_name: str | None = None,
+        backend: str | None = None,
+        device: str | None = None,
+        precision: str | None = None,
+    ) -> "YOLO":
         if model_name is None:
-            model_name = self.config.get("model", {}).get("name", "yolov8n.pt")
+            model_name = self.get_config_value("model.name", "yolov8n.pt")
 
         if not isinstance(model_name, str):
             model_name = "yolov8n.pt"
 
+        backend = backend or self.get_config_value("model.backend", "torch")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+        if Path(model_name).suffix == ".onnx":
+            backend = "onnxruntime"
+
+        precision = precision or self.get_config_value("model.precision", "fp32")
+        if precision not in PRECISIONS:
+            raise ValueError(
+                f"Unknown precision {precision!r}; expected one of {PRECISIONS}"
+            )
+        if precision != "fp32":
+            # Quantized variants are ONNX models
+            backend = "onnxruntime"
+        device = device or self.get_config_value("model.device", "cpu")
+
+        model = self._pooled_model(model_name, backend, device, precision)
+        self.current_model = model
+        self.model_name = model_name
+        self.backend = backend
+        self.precision = precision
+        return model
+
+    def _pooled_model(
+        self, model_name: str, backend: str, device: str, precision: str
+    ) -> "YOLO":
+        key = (model_name, backend, device, precision)
+        start = time.perf_counter()
+        model = self.models.get(key)
+        cache_hit = model is not None
+        if model is None:
+            model = self._load_weights(model_name, backend, precision)
+            self.models.put(key, model, nbytes=model_nbytes(model))
+        load_time = time.perf_counter() - start
+        if not cache_hit:
+            self.load_time += load_time
+
+        if self.logging_agent is not None:
+            self.logging_agent.log_model_load(
+                model_name, load_time, cache_hit, self.pool_stats()
+            )
+        return model
+
+    def prefetch(self, model_names: list[str] | None = None) -> None:
+        # Loads models into the pool without making them current, so a later
+        # switch to them is a pool hit
+        if model_names is None:
+            model_names = self.get_config_value("model.prefetch", None) or []
+        backend = self.get_config_value("model.backend", "torch")
+        device = self.get_config_value("model.device", "cpu")
+        precision = self.get_config_value("model.precision", "fp32")
+
+        for model_name in model_names:
+            model_backend = backend
+            if Path(model_name).suffix == ".onnx" or precision != "fp32":
+                model_backend = "onnxruntime"
+            try:
+                self._pooled_model(model_name, model_backend, device, precision)
+            except Exception as e:  # noqa: BLE001 - a bad entry must not stop the rest
+                self.prefetch_errors[model_name] = str(e)
+                if self.logging_agent is not None:
+                    self.logging_agent.log_error(e, f"prefetching {model_name}")
+
+    def start_prefetch(self, model_names: list[str] | None = None) -> threading.Thread:
+        thread = threading.Thread(
+            target=self.prefetch, args=(model_names,), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _load_weights(
+        self, model_name: str, backend: str, precision: str = "fp32"
+    ) -> "YOLO":
+        # Deferred so config access and tracking-only users never import
+        # ultralytics and torch
+        from ultralytics import YOLO
+
         model_path = Path("models") / model_name
+        weights = str(model_path) if model_path.exists() else model_name
 
-        if model_path.exists():
-            self.current_model = YOLO(str(model_path))
+        if precision != "fp32":
+            weights = str(self.quantize_model(weights, precision))
+        elif backend == "onnxruntime" and Path(weights).suffix != ".onnx":
+            weights = str(self.export_model(weights))
+
+        if Path(weights).suffix == ".onnx":
+            return YOLO(weights, task="detect")
+        return YOLO(weights)
+
+    def pool_stats(self) -> dict[str, Any]:
+        return {
+            "models": len(self.models),
+            "nbytes": self.models.nbytes,
+            "max_bytes": self.models.max_bytes,
+            "hits": self.models.hits,
+            "misses": self.models.misses,
+            "load_time": self.load_time,
+        }
+
+    def export_model(
+        self,
+        weights: str,
+        imgsz: int = 640,
+        opset: int | None = None,
+    ) -> Path:
+        # Exports .pt weights to ONNX once and reuses the artifact, keyed by the
+        # weights' content, input size and opset, so retrained weights under the
+        # same name are exported again
+        from ultralytics import YOLO
+
+        opset = opset or self.get_config_value("model.onnx_opset", DEFAULT_OPSET)
+        export_dir = Path(self.get_config_value("model.export_dir", "cache/models"))
+
+        weights_path = Path(weights)
+        if not weights_path.is_file():
+            # Downloads official weights by name
+            weights_path = Path(YOLO(weights).ckpt_path)
+
+        artifact = export_dir / (
+            f"{weights_path.stem}-{file_hash(weights_path)[:16]}"
+            f"-{imgsz}-opset{opset}.onnx"
+        )
+        if artifact.exists():
+            return artifact
+
+        export_dir.mkdir(parents=True, exist_ok=True)
+        # Ultralytics writes next to the weights; export a private copy so a
+        # user's own .onnx file is never overwritten
+        with tempfile.TemporaryDirectory(dir=export_dir) as tmp:
+            source = Path(tmp) / weights_path.name
+            shutil.copy2(weights_path, source)
+            exported = YOLO(str(source)).export(
+                format="onnx", imgsz=imgsz, opset=opset, dynamic=True, simplify=False
+            )
+            os.replace(exported, artifact)
+
+        return artifact
+
+    def quantize_model(
+        self,
+        weights: str,
+        precision: str,
+        calibration_dir: str | None = None,
+        imgsz: int = 640,
+    ) -> Path:
+        # Builds an INT8 variant of the weights' ONNX export once and reuses
+        # it, keyed by the source model and, for static quantization, the
+        # content of the calibration images
+        from src.quantization import calibration_images, calibration_key, quantize_onnx
+
+        export_dir = Path(self.get_config_value("model.export_dir", "cache/models"))
+        if Path(weights).suffix == ".onnx":
+            source = Path(weights)
         else:
-            self.current_model = YOLO(model_name)
+            source = self.export_model(weights, imgsz)
 
-        self.model_name = model_name
-        return self.current_model
+        calibration = []
+        key = file_hash(source)
+        if precision == "int8-static":
+            calibration_dir = calibration_dir or self.get_config_value(
+                "model.calibration_dir", "calibration"
+            )
+            calibration = calibration_images(
+                calibration_dir,
+                self.get_config_value("model.calibration_frames", 64),
+            )
+            if not calibration:
+                raise FileNotFoundError(
+                    f"No calibration images found in {calibration_dir}"
+                )
+            key += f"{calibration_key(calibration)}-{imgsz}"
+
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        artifact = export_dir / f"{source.stem}-{precision}-{digest}.onnx"
+        if artifact.exists():
+            return artifact
+
+        export_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=export_dir) as tmp:
+            target = Path(tmp) / artifact.name
+            quantize_onnx(source, target, precision, calibration, imgsz)
+            os.replace(target, artifact)
 
-    def get_model(self) -> YOLO:
+        return artifact
+
+    def get_model(self) -> "YOLO":
         if self.current_model is None:
             raise RuntimeError("No model loaded. Call load_model() first.")
         return self.current_model
@@ -48,20 +300,13 @@ class ModelManagerAgent:
         return self.current_model.names
 
     def get_config_value(self, key: str, default: Any = None) -> Any:
-        keys = key.split(".")
-        value = self.config
-
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-
-        return value
+        return self.snapshot.get(key, default)
 
     def update_config(self, key: str, value: Any) -> None:
+        # Edits a copy, so a value that fails validation changes nothing
         keys = key.split(".")
-        config = self.config
+        updated = copy.deepcopy(self.config)
+        config = updated
 
         for k in keys[:-1]:
             if k not in config:
@@ -69,6 +314,8 @@ class ModelManagerAgent:
             config = config[k]
 
         config[keys[-1]] = value
+        snapshot = ConfigSnapshot.from_dict(updated, self.snapshot.version + 1)
+        self.config, self.snapshot = updated, snapshot
 
     def save_config(self) -> None:
         with open(self.config_path, "w") as f:
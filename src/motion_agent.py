@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+
+class MotionAgent:
+    def __init__(
+        self,
+        downscale_width: int = 160,
+        pixel_threshold: int = 25,
+        min_changed_fraction: float = 0.002,
+        max_gap: int = 30,
+        blur_size: int = 5,
+    ):
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_gap = max_gap
+        self.blur_size = blur_size
+        self.reference: np.ndarray | None = None
+        self.motion_mask: np.ndarray | None = None
+        self.changed_fraction = 0.0
+        self.frames_since_detection = 0
+        # True when the last trigger was the first frame or a max_gap refresh
+        # rather than actual motion
+        self.forced = False
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        # Channel order does not matter for differencing, so no RGB/BGR handling
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height, width = gray.shape[:2]
+        if width > self.downscale_width:
+            scaled_height = max(1, round(height * self.downscale_width / width))
+            gray = cv2.resize(
+                gray,
+                (self.downscale_width, scaled_height),
+                interpolation=cv2.INTER_AREA,
+            )
+        if self.blur_size > 1:
+            gray = cv2.GaussianBlur(gray, (self.blur_size, self.blur_size), 0)
+        return gray
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        small = self._prepare(frame)
+
+        if self.reference is None or self.reference.shape != small.shape:
+            self.motion_mask = np.ones(small.shape, dtype=bool)
+            self.changed_fraction = 1.0
+            self.forced = True
+            self._mark_detected(small)
+            return True
+
+        # Compare against the frame of the last detection rather than the
+        # previous frame, so slow movement accumulates until it is noticed
+        diff = cv2.absdiff(small, self.reference)
+        self.motion_mask = diff > self.pixel_threshold
+        self.changed_fraction = float(self.motion_mask.mean())
+        self.frames_since_detection += 1
+
+        if self.changed_fraction >= self.min_changed_fraction:
+            self.forced = False
+            self._mark_detected(small)
+            return True
+
+        if self.frames_since_detection > self.max_gap:
+            self.forced = True
+            self._mark_detected(small)
+            return True
+
+        return False
+
+    def motion_regions(
+        self, frame_shape: tuple[int, ...], min_pixels: int = 4
+    ) -> np.ndarray:
+        # Bounding boxes of changed areas from the last should_detect call,
+        # scaled back to full-frame coordinates
+        if self.motion_mask is None or not self.motion_mask.any():
+            return np.empty((0, 4), dtype=np.float64)
+
+        mask = cv2.dilate(self.motion_mask.astype(np.uint8), np.ones((3, 3), np.uint8))
+        n_labels, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+        # Label 0 is the background
+        stats = stats[1:n_labels]
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= min_pixels]
+        x = stats[:, cv2.CC_STAT_LEFT]
+        y = stats[:, cv2.CC_STAT_TOP]
+        boxes = np.stack(
+            [
+                x,
+                y,
+                x + stats[:, cv2.CC_STAT_WIDTH],
+                y + stats[:, cv2.CC_STAT_HEIGHT],
+            ],
+            axis=1,
+        ).astype(np.float64)
+
+        scale_x = frame_shape[1] / mask.shape[1]
+        scale_y = frame_shape[0] / mask.shape[0]
+        return boxes * np.array([scale_x, scale_y, scale_x, scale_y])
+
+    def _mark_detected(self, small: np.ndarray) -> None:
+        self.reference = small
+        self.frames_since_detection = 0
+
+    def reset(self) -> None:
+        self.reference = None
+        self.motion_mask = None
+        self.changed_fraction = 0.0
+        self.frames_since_detection = 0
+        self.forced = False
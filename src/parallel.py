@@ -0,0 +1,273 @@
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import cv2
+import numpy as np
+
+from src.model_manager_agent import ModelManagerAgent
+from src.pipeline import FrameProcessor, VideoFilePipeline
+from src.tracking_agent import TrackingAgent, assignment_solver
+
+PROCESSOR_SETTINGS = (
+    "class_filter",
+    "frame_skip",
+    "motion_gating",
+    "roi_inference",
+    "tiled_inference",
+)
+DETECTION_SETTINGS = (
+    "device",
+    "confidence_threshold",
+    "max_batch_size",
+    "direct_inference",
+)
+
+_worker_processor: FrameProcessor | None = None
+
+
+def processor_settings(processor: FrameProcessor) -> dict[str, Any]:
+    # Runtime overrides on top of config.yaml that workers need to reproduce
+    settings = {name: getattr(processor, name) for name in PROCESSOR_SETTINGS}
+    settings.update(
+        {name: getattr(processor.detection_agent, name) for name in DETECTION_SETTINGS}
+    )
+    return settings
+
+
+def apply_settings(processor: FrameProcessor, settings: dict[str, Any]) -> None:
+    for name, value in settings.items():
+        if name in PROCESSOR_SETTINGS:
+            setattr(processor, name, value)
+        elif name in DETECTION_SETTINGS:
+            setattr(processor.detection_agent, name, value)
+
+
+def plan_chunks(
+    total_frames: int, n_chunks: int, overlap: int = 10
+) -> list[tuple[int, int, int]]:
+    # Each chunk owns [start, end) and also decodes the `overlap` frames before
+    # start, both to warm up its tracker and to match tracks with the previous
+    # chunk. Returns (read_start, start, end) per chunk.
+    if total_frames <= 0:
+        return []
+
+    # Keep chunks long enough that the overlap stays a small fraction
+    n_chunks = max(1, min(n_chunks, total_frames // max(2 * overlap, 1)))
+    bounds = np.linspace(0, total_frames, n_chunks + 1).astype(int)
+    return [
+        (max(0, int(start) - overlap), int(start), int(end))
+        for start, end in itertools.pairwise(bounds)
+    ]
+
+
+class _FrameRange:
+    # Capture wrapper that stops after a fixed number of frames
+    def __init__(self, capture: Any, n_frames: int):
+        self.capture = capture
+        self.remaining = n_frames
+
+    def read(self) -> tuple[bool, np.ndarray | None]:
+        if self.remaining <= 0:
+            return False, None
+        self.remaining -= 1
+        return self.capture.read()
+
+
+def _init_worker(
+    config_path: str,
+    model_name: str | None,
+    backend: str | None,
+    precision: str | None,
+    settings: dict[str, Any],
+    torch_threads: int,
+) -> None:
+    # One model per process, loaded once and reused for every chunk it gets
+    global _worker_processor
+
+    cv2.setNumThreads(1)
+
+    model_manager = ModelManagerAgent(config_path)
+    model_manager.load_model(model_name, backend, precision=precision)
+    if model_manager.backend == "torch":
+        # ONNX Runtime models never need torch here
+        import torch
+
+        torch.set_num_threads(torch_threads)
+    _worker_processor = FrameProcessor.from_config(model_manager)
+    apply_settings(_worker_processor, settings)
+
+
+def _process_chunk(
+    video_path: str, read_start: int, start: int, end: int
+) -> dict[str, Any]:
+    processor = _worker_processor
+    if processor is None:
+        raise RuntimeError("Worker not initialized")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video file: {video_path}")
+    cap.set(cv2.CAP_PROP_POS_FRAMES, read_start)
+
+    processor.reset()
+    pipeline = VideoFilePipeline(_FrameRange(cap, end - read_start), processor)
+    frames = []
+    pipeline.start()
+    try:
+        for result in pipeline.results():
+            detections = result["detections"]
+            frames.append(
+                {
+                    "frame": read_start + result["frame_index"],
+                    "detections": (
+                        detections
+                        if isinstance(detections, list)
+                        else detections.to_dicts()
+                    ),
+                    "tracks": result["tracks"],
+                }
+            )
+    finally:
+        pipeline.stop()
+        cap.release()
+
+    if pipeline.error:
+        raise RuntimeError(pipeline.error)
+    return {"read_start": read_start, "start": start, "end": end, "frames": frames}
+
+
+def _match_overlap(
+    previous: list[dict[str, Any]],
+    current: list[dict[str, Any]],
+    iou_threshold: float,
+) -> dict[int, int]:
+    # Maps local track IDs of the current chunk to global IDs of the previous
+    # one by their summed IoU over the shared frames
+    previous_by_frame = {record["frame"]: record["tracks"] for record in previous}
+    scores: dict[tuple[int, int], list[float]] = {}
+
+    for record in current:
+        prev_tracks = previous_by_frame.get(record["frame"])
+        if not prev_tracks or not record["tracks"]:
+            continue
+
+        iou = TrackingAgent._iou_matrix(
+            [track["bbox"] for track in record["tracks"]],
+            [track["bbox"] for track in prev_tracks],
+        )
+        for i, track in enumerate(record["tracks"]):
+            for j, prev in enumerate(prev_tracks):
+                if track["class_id"] == prev["class_id"]:
+                    key = (track["track_id"], prev["track_id"])
+                    scores.setdefault(key, []).append(iou[i, j])
+
+    if not scores:
+        return {}
+
+    local_ids = sorted({local for local, _ in scores})
+    global_ids = sorted({global_id for _, global_id in scores})
+    local_index = {track_id: i for i, track_id in enumerate(local_ids)}
+    global_index = {track_id: j for j, track_id in enumerate(global_ids)}
+
+    total = np.zeros((len(local_ids), len(global_ids)))
+    mean = np.zeros_like(total)
+    for (local, global_id), values in scores.items():
+        i, j = local_index[local], global_index[global_id]
+        total[i, j] = sum(values)
+        mean[i, j] = total[i, j] / len(values)
+
+    rows, cols = assignment_solver()(-total)
+    return {
+        local_ids[i]: global_ids[j]
+        for i, j in zip(rows, cols)
+        if mean[i, j] >= iou_threshold
+    }
+
+
+def stitch_chunks(
+    chunks: list[dict[str, Any]], iou_threshold: float = 0.3
+) -> list[dict[str, Any]]:
+    # Rewrites per-chunk track IDs into one global sequence and drops the
+    # overlap frames, which the previous chunk already owns
+    frames: list[dict[str, Any]] = []
+    next_id = 1
+    previous: list[dict[str, Any]] = []
+
+    for chunk in sorted(chunks, key=lambda c: c["start"]):
+        overlap = [r for r in chunk["frames"] if r["frame"] < chunk["start"]]
+        owned = [r for r in chunk["frames"] if r["frame"] >= chunk["start"]]
+        id_map = _match_overlap(previous, overlap, iou_threshold)
+
+        # Both the remapped overlap and the owned frames, so the next chunk
+        # can match against this one's global IDs
+        remapped = []
+        for record in overlap + owned:
+            tracks = []
+            for track in record["tracks"]:
+                if track["track_id"] not in id_map:
+                    id_map[track["track_id"]] = next_id
+                    next_id += 1
+                tracks.append({**track, "track_id": id_map[track["track_id"]]})
+            remapped.append({**record, "tracks": tracks})
+
+        owned = remapped[len(overlap) :]
+        frames.extend(owned)
+        previous = owned
+
+    return frames
+
+
+def process_video_parallel(
+    video_path: str,
+    config_path: str = "config.yaml",
+    workers: int | None = None,
+    overlap: int = 10,
+    model_name: str | None = None,
+    settings: dict[str, Any] | None = None,
+    iou_threshold: float | None = None,
+    backend: str | None = None,
+    precision: str | None = None,
+) -> list[dict[str, Any]]:
+    # Splits the video into time chunks, tracks each in its own process and
+    # stitches the results into per-frame records with global track IDs. Tracks
+    # are matched across chunks at tracking.iou_threshold unless given.
+    workers = workers or os.cpu_count() or 1
+    if iou_threshold is None:
+        iou_threshold = ModelManagerAgent(config_path).get_config_value(
+            "tracking.iou_threshold", 0.3
+        )
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video file: {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    chunks = plan_chunks(total_frames, workers, overlap)
+    if not chunks:
+        return []
+
+    # Spawned workers avoid forking a process that already runs torch threads
+    torch_threads = max(1, (os.cpu_count() or 1) // len(chunks))
+    with ProcessPoolExecutor(
+        max_workers=len(chunks),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(
+            config_path,
+            model_name,
+            backend,
+            precision,
+            settings or {},
+            torch_threads,
+        ),
+    ) as executor:
+        futures = [
+            executor.submit(_process_chunk, str(video_path), *chunk) for chunk in chunks
+        ]
+        results = [future.result() for future in futures]
+
+    return stitch_chunks(results, iou_threshold)
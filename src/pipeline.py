@@ -0,0 +1,719 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from typing import Any
+
+import cv2
+import numpy as np
+
+from src.detection_agent import DetectionAgent
+from src.detection_cache import (
+    CachedDetections,
+    DetectionCache,
+    DetectionCacheWriter,
+    LRUCache,
+)
+from src.detections import Detections
+from src.model_manager_agent import ModelManagerAgent
+from src.motion_agent import MotionAgent
+from src.tracking_agent import TrackingAgent
+
+# Config keys applied to a running FrameProcessor without rebuilding it, as
+# (agent attribute of the processor, or None for the processor itself,
+# attribute name)
+LIVE_SETTINGS = {
+    "model.confidence_threshold": ("detection_agent", "confidence_threshold"),
+    "model.iou_threshold": ("detection_agent", "nms_iou_threshold"),
+    "model.batch_size": ("detection_agent", "max_batch_size"),
+    "model.direct_inference": ("detection_agent", "direct_inference"),
+    "roi.padding": ("detection_agent", "roi_padding"),
+    "roi.min_size": ("detection_agent", "roi_min_size"),
+    "roi.max_coverage": ("detection_agent", "roi_max_coverage"),
+    "tiling.tile_size": ("detection_agent", "tile_size"),
+    "tiling.overlap": ("detection_agent", "tile_overlap"),
+    "tiling.merge_threshold": ("detection_agent", "merge_threshold"),
+    "tracking.max_age": ("tracking_agent", "max_age"),
+    "tracking.min_hits": ("tracking_agent", "min_hits"),
+    "tracking.iou_threshold": ("tracking_agent", "iou_threshold"),
+    "tracking.assignment": ("tracking_agent", "assignment"),
+    "tracking.motion_model": ("tracking_agent", "motion_model"),
+    "tracking.grid_min_tracks": ("tracking_agent", "grid_min_tracks"),
+    "motion.downscale_width": ("motion_agent", "downscale_width"),
+    "motion.pixel_threshold": ("motion_agent", "pixel_threshold"),
+    "motion.min_changed_fraction": ("motion_agent", "min_changed_fraction"),
+    "motion.max_gap": ("motion_agent", "max_gap"),
+    "video.frame_skip": (None, "frame_skip"),
+    "motion.enabled": (None, "motion_gating"),
+    "roi.enabled": (None, "roi_inference"),
+    "tiling.enabled": (None, "tiled_inference"),
+    "ui.show_confidence": (None, "show_confidence"),
+}
+# Config keys that select the loaded model itself
+MODEL_SETTINGS = frozenset(
+    {"model.name", "model.device", "model.backend", "model.precision"}
+)
+
+
+def draw_detections(frame, detections, tracks, show_confidence=True):
+    annotated_frame = frame.copy()
+
+    for track in tracks:
+        x1, y1, x2, y2 = [int(coord) for coord in track["bbox"]]
+
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+
+        label = f"ID:{track['track_id']} {track['class_name']}"
+        if show_confidence:
+            label += f" {track['confidence']:.2f}"
+
+        label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+        cv2.rectangle(
+            annotated_frame,
+            (x1, y1 - label_size[1] - 10),
+            (x1 + label_size[0], y1),
+            (0, 255, 0),
+            -1,
+        )
+        cv2.putText(
+            annotated_frame,
+            label,
+            (x1, y1 - 5),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (0, 0, 0),
+            2,
+        )
+
+    return annotated_frame
+
+
+# Per-frame detect/track logic shared by the UI and the background pipelines.
+# Settings are plain attributes so the UI can change them between frames.
+class FrameProcessor:
+    def __init__(
+        self,
+        detection_agent: DetectionAgent,
+        tracking_agent: TrackingAgent,
+        motion_agent: MotionAgent | None = None,
+    ):
+        self.detection_agent = detection_agent
+        self.tracking_agent = tracking_agent
+        self.motion_agent = motion_agent
+        self.class_filter: list[str] | None = None
+        self.show_confidence = True
+        self.frame_skip = 0
+        self.motion_gating = False
+        self.roi_inference = False
+        self.tiled_inference = False
+        self.frame_count = 0
+        self.last_detections: Detections | list = []
+
+    @classmethod
+    def from_config(
+        cls, model_manager: ModelManagerAgent, warm_up: bool = False
+    ) -> "FrameProcessor":
+        # Builds the agents from config.yaml around the manager's loaded model.
+        # With warm_up, model.warmup starts a background warm-up right away.
+        config = model_manager.get_config_value
+
+        detection_agent = DetectionAgent(
+            model_path=model_manager.model_name,
+            confidence_threshold=config("model.confidence_threshold", 0.5),
+            device=config("model.device", "cpu"),
+            max_batch_size=config("model.batch_size", 8),
+            nms_iou_threshold=config("model.iou_threshold", 0.7),
+            roi_padding=config("roi.padding", 32),
+            roi_min_size=config("roi.min_size", 96),
+            roi_max_coverage=config("roi.max_coverage", 0.6),
+            tile_size=config("tiling.tile_size", 640),
+            tile_overlap=config("tiling.overlap", 0.2),
+            merge_threshold=config("tiling.merge_threshold", 0.5),
+            direct_inference=config("model.direct_inference", False),
+        )
+        detection_agent.model = model_manager.get_model()
+        if warm_up and config("model.warmup", False):
+            detection_agent.start_warm_up(runs=config("model.warmup_runs", 2))
+
+        tracking_agent = TrackingAgent(
+            max_age=config("tracking.max_age", 30),
+            min_hits=config("tracking.min_hits", 3),
+            iou_threshold=config("tracking.iou_threshold", 0.3),
+            assignment=config("tracking.assignment", "greedy"),
+            motion_model=config("tracking.motion_model", "none"),
+            grid_min_tracks=config("tracking.grid_min_tracks", 256),
+        )
+
+        motion_agent = MotionAgent(
+            downscale_width=config("motion.downscale_width", 160),
+            pixel_threshold=config("motion.pixel_threshold", 25),
+            min_changed_fraction=config("motion.min_changed_fraction", 0.002),
+            max_gap=config("motion.max_gap", 30),
+        )
+
+        processor = cls(detection_agent, tracking_agent, motion_agent)
+        processor.show_confidence = config("ui.show_confidence", True)
+        processor.frame_skip = config("video.frame_skip", 0)
+        processor.motion_gating = config("motion.enabled", False)
+        processor.roi_inference = config("roi.enabled", False)
+        processor.tiled_inference = config("tiling.enabled", False)
+        return processor
+
+    def apply_config(
+        self, model_manager: ModelManagerAgent, changed: set[str] | None = None
+    ) -> bool:
+        # Pushes the manager's current config into the running agents, limited
+        # to the changed keys when given. Values were validated when the
+        # snapshot was built. The model is only swapped, through the model pool,
+        # when a key selecting it changed, and before any setting is touched, so
+        # a failed load leaves the processor as it was. Returns whether it was.
+        config = model_manager.get_config_value
+        model = None
+        if changed is not None and changed & MODEL_SETTINGS:
+            # A model or backend chosen outside the file (e.g. --model) is kept
+            # unless the file changes that same key
+            model = model_manager.load_model(
+                None if "model.name" in changed else model_manager.model_name or None,
+                None if "model.backend" in changed else model_manager.backend,
+            )
+
+        for key, (agent, attribute) in LIVE_SETTINGS.items():
+            if changed is not None and key not in changed:
+                continue
+            value = config(key)
+            target = self if agent is None else getattr(self, agent)
+            if value is None or target is None:
+                continue
+            setattr(target, attribute, value)
+        self.detection_agent.max_batch_size = max(
+            1, self.detection_agent.max_batch_size
+        )
+
+        if model is None:
+            return False
+        self.detection_agent.device = config("model.device", "cpu")
+        self.detection_agent.set_model(model, model_manager.model_name)
+        return True
+
+    def plan(
+        self, frame: np.ndarray, frame_index: int | None = None
+    ) -> tuple[bool, np.ndarray | None]:
+        # Returns whether to run detection on this frame and, for ROI inference,
+        # the motion regions to crop around (None means a full-frame pass)
+        if frame_index is None:
+            frame_index = self.frame_count
+
+        if self.motion_gating and self.motion_agent is not None:
+            run_detection = self.motion_agent.should_detect(frame)
+        else:
+            run_detection = (
+                self.frame_skip <= 0 or frame_index % (self.frame_skip + 1) == 0
+            )
+
+        if not run_detection:
+            return False, None
+        return True, self._motion_regions(frame)
+
+    def _motion_regions(self, frame: np.ndarray) -> np.ndarray | None:
+        # Forced refreshes always look at the whole frame to pick up new static
+        # objects
+        if not (self.roi_inference and self.motion_gating and self.motion_agent):
+            return None
+        if self.motion_agent.forced:
+            return None
+        return self.motion_agent.motion_regions(frame.shape)
+
+    def batchable(self, plan: tuple[bool, np.ndarray | None]) -> bool:
+        # ROI frames depend on the tracks of the previous frame and tiled
+        # frames are already batched per tile
+        run_detection, motion_regions = plan
+        return run_detection and motion_regions is None and not self.tiled_inference
+
+    def detect(
+        self, frame: np.ndarray, motion_regions: np.ndarray | None = None
+    ) -> Detections:
+        if motion_regions is not None:
+            # Crops around moving areas and around where tracks are expected
+            regions = np.vstack([motion_regions, self.tracking_agent.track_boxes])
+            return self.detection_agent.detect_regions(
+                frame, regions, self.class_filter, columnar=True
+            )
+
+        if self.tiled_inference:
+            return self.detection_agent.detect_tiled(
+                frame, self.class_filter, columnar=True
+            )
+
+        return self.detection_agent.detect(frame, self.class_filter, columnar=True)
+
+    def detect_frames(self, frames: list[np.ndarray]) -> list[Detections]:
+        # Full-frame (or tiled) detections for every frame, regardless of the
+        # plan; what the detection cache stores
+        if not frames:
+            return []
+        if self.tiled_inference:
+            return [
+                self.detection_agent.detect_tiled(
+                    frame, self.class_filter, columnar=True
+                )
+                for frame in frames
+            ]
+        return self.detection_agent.detect_batch(
+            frames, self.class_filter, columnar=True
+        )
+
+    def open_cache(
+        self, cache: DetectionCache, video_hash: str
+    ) -> tuple[CachedDetections | None, DetectionCacheWriter | None]:
+        # Returns the cached detections for this video and the current detection
+        # settings, or a writer to record them on this run
+        params = self.detection_agent.cache_params(
+            self.class_filter, self.tiled_inference
+        )
+        key = cache.key(video_hash, self.detection_agent.model_hash(), params)
+        cached = cache.load(key)
+        if cached is not None:
+            return cached, None
+        return None, cache.writer(key, params)
+
+    def detect_cached(
+        self, frame: np.ndarray, cache: LRUCache, frame_hash: str
+    ) -> Detections:
+        # Full-frame detections memoized by frame content and detection settings
+        params = self.detection_agent.cache_params(
+            self.class_filter, self.tiled_inference
+        )
+        key = (frame_hash, self.detection_agent.model_hash(), json.dumps(params))
+        detections = cache.get(key)
+        if detections is None:
+            detections = self.detect_frames([frame])[0]
+            cache.put(key, detections)
+        return detections
+
+    def step(
+        self,
+        frame: np.ndarray,
+        detections: Detections | None = None,
+        plan: tuple[bool, np.ndarray | None] | None = None,
+    ) -> tuple[Detections | list, Any]:
+        if plan is None:
+            plan = self.plan(frame)
+        run_detection, motion_regions = plan
+        self.frame_count += 1
+
+        # Skip detection on some frames to improve performance; tracks are moved
+        # along their predicted motion instead
+        if not run_detection:
+            return self.last_detections, self.tracking_agent.predict()
+
+        if detections is None:
+            detections = self.detect(frame, motion_regions)
+        self.last_detections = detections
+
+        return detections, self.tracking_agent.update(detections)
+
+    def annotate(self, frame: np.ndarray, detections: Any, tracks: Any) -> np.ndarray:
+        return draw_detections(frame, detections, tracks, self.show_confidence)
+
+    def process(
+        self,
+        frame: np.ndarray,
+        detections: Detections | None = None,
+        plan: tuple[bool, np.ndarray | None] | None = None,
+    ) -> tuple[np.ndarray, Detections | list, Any]:
+        detections, tracks = self.step(frame, detections, plan)
+        return self.annotate(frame, detections, tracks), detections, tracks
+
+    def reset(self) -> None:
+        self.tracking_agent.reset()
+        if self.motion_agent is not None:
+            self.motion_agent.reset()
+        self.frame_count = 0
+        self.last_detections = []
+
+
+# Bounded hand-off between pipeline stages. When full, put() drops the oldest
+# item so consumers always see the newest frame instead of a stale backlog.
+class LatestQueue:
+    def __init__(self, maxsize: int = 1):
+        self._items: deque = deque(maxlen=max(1, maxsize))
+        self._condition = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        with self._condition:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify()
+
+    def get(self, timeout: float | None = None) -> Any | None:
+        with self._condition:
+            if not self._items:
+                self._condition.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._items)
+
+
+# Capture, inference and annotation each run on their own thread, joined by
+# drop-oldest queues. The UI only polls latest() for the newest finished frame,
+# so slow inference never stalls capture and never renders a queued stale frame.
+# An optional writer (e.g. VideoSink) receives every annotated frame as BGR.
+class WebcamPipeline:
+    def __init__(
+        self,
+        capture: Any,
+        processor: FrameProcessor,
+        queue_size: int = 1,
+        writer: Any | None = None,
+    ):
+        self.capture = capture
+        self.processor = processor
+        self.writer = writer
+        self.frame_queue = LatestQueue(queue_size)
+        self.result_queue = LatestQueue(queue_size)
+        self.error: str | None = None
+        self.captured_frames = 0
+        self.processed_frames = 0
+        self._latest: dict[str, Any] | None = None
+        self._latest_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def dropped_frames(self) -> int:
+        return self.frame_queue.dropped + self.result_queue.dropped
+
+    def start(self) -> None:
+        if self.running:
+            return
+
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=target, daemon=True)
+            for target in (self._capture_loop, self._inference_loop, self._render_loop)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float | None = 2.0) -> None:
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def latest(self) -> dict[str, Any] | None:
+        with self._latest_lock:
+            return self._latest
+
+    def _capture_loop(self) -> None:
+        while not self._stop_event.is_set():
+            ret, frame = self.capture.read()
+            if not ret:
+                self.error = "Failed to read from webcam"
+                self._stop_event.set()
+                return
+
+            self.captured_frames += 1
+            self.frame_queue.put((self.captured_frames, time.time(), frame))
+
+    def _inference_loop(self) -> None:
+        while not self._stop_event.is_set():
+            item = self.frame_queue.get(timeout=0.1)
+            if item is None:
+                continue
+
+            frame_index, captured_at, frame = item
+
+            inference_start = time.time()
+            try:
+                detections, tracks = self.processor.step(frame)
+            except Exception as e:  # noqa: BLE001 - reported via self.error
+                self.error = f"Inference failed: {e}"
+                self._stop_event.set()
+                return
+            inference_time = time.time() - inference_start
+
+            # The track view is live; hand the render thread a copy
+            self.result_queue.put(
+                {
+                    "frame_index": frame_index,
+                    "captured_at": captured_at,
+                    "frame": frame,
+                    "detections": detections,
+                    "tracks": tracks.to_dicts(),
+                    "inference_time": inference_time,
+                }
+            )
+
+    def _render_loop(self) -> None:
+        while not self._stop_event.is_set():
+            result = self.result_queue.get(timeout=0.1)
+            if result is None:
+                continue
+
+            result["annotated_frame"] = self.processor.annotate(
+                result["frame"], result["detections"], result["tracks"]
+            )
+            result["latency"] = time.time() - result["captured_at"]
+            self.processed_frames += 1
+
+            if self.writer is not None:
+                self.writer.write(result["annotated_frame"])
+
+            with self._latest_lock:
+                self._latest = result
+
+
+_END = object()
+
+
+# Decode, inference, annotation and encoding each run on their own thread,
+# joined by bounded blocking queues. Unlike the webcam pipeline nothing is
+# dropped: a full queue blocks the stage before it, so a slow consumer throttles
+# decoding instead of buffering the whole file. OpenCV decode, draw and encode
+# release the GIL and overlap with inference.
+# With `cached` detections the model is skipped and only tracking runs; with a
+# `cache_writer` the frames the plan detects get a full-frame pass whose output
+# is recorded, and skipped frames are recorded as such. Replaying with settings
+# that detect a frame the recording skipped runs the model for that frame.
+class VideoFilePipeline:
+    def __init__(
+        self,
+        capture: Any,
+        processor: FrameProcessor,
+        queue_size: int = 16,
+        batch_size: int | None = None,
+        writer: Any | None = None,
+        cached: CachedDetections | None = None,
+        cache_writer: DetectionCacheWriter | None = None,
+    ):
+        self.capture = capture
+        self.processor = processor
+        self.batch_size = max(1, batch_size or processor.detection_agent.max_batch_size)
+        self.writer = writer
+        self.cached = cached
+        self.cache_writer = cache_writer
+        self.decode_queue: queue.Queue = queue.Queue(queue_size)
+        self.annotate_queue: queue.Queue = queue.Queue(queue_size)
+        self.encode_queue: queue.Queue = queue.Queue(queue_size)
+        self.output_queue: queue.Queue = queue.Queue(queue_size)
+        self.error: str | None = None
+        self.decoded_frames = 0
+        self.processed_frames = 0
+        self._stop_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self) -> None:
+        if self.running:
+            return
+
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=target, daemon=True)
+            for target in (
+                self._decode_loop,
+                self._inference_loop,
+                self._annotate_loop,
+                self._encode_loop,
+            )
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float | None = 2.0) -> None:
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def results(self) -> Iterator[dict[str, Any]]:
+        # Yields finished frames in order; ends at the end of the file, on stop()
+        # or when a stage fails (see error)
+        while True:
+            result = self._get(self.output_queue)
+            if result is _END:
+                return
+            yield result
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return self.results()
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return _END
+
+    def _fail(self, stage: str, error: Exception) -> None:
+        self.error = f"{stage} failed: {error}"
+        self._stop_event.set()
+
+    def _decode_loop(self) -> None:
+        try:
+            while not self._stop_event.is_set():
+                ret, frame = self.capture.read()
+                if not ret:
+                    break
+
+                if not self._put(self.decode_queue, (self.decoded_frames, frame)):
+                    return
+                self.decoded_frames += 1
+        except Exception as e:  # noqa: BLE001 - stage failure stops the pipeline
+            self._fail("Decoding", e)
+            return
+        self._put(self.decode_queue, _END)
+
+    def _next_batch(self) -> tuple[list[tuple[int, np.ndarray]], bool]:
+        # Blocks for the first frame, then takes whatever else is already
+        # decoded so a slow decoder never holds back inference
+        batch = []
+        item = self._get(self.decode_queue)
+        while item is not _END:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                item = self.decode_queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _inference_loop(self) -> None:
+        processor = self.processor
+        try:
+            while not self._stop_event.is_set():
+                batch, finished = self._next_batch()
+                if not batch:
+                    break
+
+                start = time.time()
+                plans = [processor.plan(frame, index) for index, frame in batch]
+                batch_detections = self._batch_detections(batch, plans)
+
+                for i, (index, frame) in enumerate(batch):
+                    detections, tracks = processor.step(
+                        frame, batch_detections.get(i), plans[i]
+                    )
+                    result = {
+                        "frame_index": index,
+                        "frame": frame,
+                        "detections": detections,
+                        "tracks": tracks.to_dicts(),
+                        "inference_time": (time.time() - start) / len(batch),
+                    }
+                    if not self._put(self.annotate_queue, result):
+                        return
+
+                if finished:
+                    break
+        except Exception as e:  # noqa: BLE001 - stage failure stops the pipeline
+            self._fail("Inference", e)
+            return
+        self._put(self.annotate_queue, _END)
+
+    def _batch_detections(
+        self,
+        batch: list[tuple[int, np.ndarray]],
+        plans: list[tuple[bool, np.ndarray | None]],
+    ) -> dict[int, Detections]:
+        processor = self.processor
+
+        # Cached and recorded runs use full-frame detections even where the plan
+        # asks for ROI crops, since crops depend on the tracker state
+        planned = [i for i, plan in enumerate(plans) if plan[0]]
+        if self.cached is not None:
+            found = {
+                i: self.cached[batch[i][0]]
+                for i in planned
+                if self.cached.covers(batch[i][0])
+            }
+            missing = [i for i in planned if i not in found]
+            if missing:
+                detections = processor.detect_frames([batch[i][1] for i in missing])
+                found.update(zip(missing, detections))
+            return found
+
+        if self.cache_writer is not None:
+            detections = dict(
+                zip(planned, processor.detect_frames([batch[i][1] for i in planned]))
+            )
+            for i in range(len(batch)):
+                self.cache_writer.append(detections.get(i))
+            return detections
+
+        # Same batching as the synchronous path: plan every frame first, then
+        # detect the plain full-frame ones in one pass
+        detect_indices = [
+            i for i, plan in enumerate(plans) if processor.batchable(plan)
+        ]
+        return dict(
+            zip(
+                detect_indices,
+                processor.detection_agent.detect_batch(
+                    [batch[i][1] for i in detect_indices],
+                    processor.class_filter,
+                    columnar=True,
+                ),
+            )
+        )
+
+    def _annotate_loop(self) -> None:
+        try:
+            while True:
+                result = self._get(self.annotate_queue)
+                if result is _END:
+                    break
+
+                result["annotated_frame"] = self.processor.annotate(
+                    result["frame"], result["detections"], result["tracks"]
+                )
+                if not self._put(self.encode_queue, result):
+                    return
+        except Exception as e:  # noqa: BLE001 - stage failure stops the pipeline
+            self._fail("Annotation", e)
+            return
+        self._put(self.encode_queue, _END)
+
+    def _encode_loop(self) -> None:
+        try:
+            while True:
+                result = self._get(self.encode_queue)
+                if result is _END:
+                    break
+
+                if self.writer is not None:
+                    self.writer.write(result["annotated_frame"])
+                self.processed_frames += 1
+                if not self._put(self.output_queue, result):
+                    return
+        except Exception as e:  # noqa: BLE001 - stage failure stops the pipeline
+            self._fail("Encoding", e)
+            return
+        self._put(self.output_queue, _END)
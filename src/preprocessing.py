@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+CHANNEL_ORDERS = ("BGR", "RGB")
+
+
+@dataclass(frozen=True)
+class LetterboxInfo:
+    orig_shape: tuple[int, int]
+    gain: tuple[float, float]
+    pad: tuple[int, int]
+
+
+# Letterboxes a batch of frames into the network input layout (N, 3, H, W),
+# RGB, float32 in 0-1, matching the Ultralytics LetterBox geometry. Resize,
+# padding and the fused channel swap/transpose/normalize all write into buffers
+# that are kept per input shape and reused on the next call, so steady-state
+# video inference allocates nothing here. Only the max_buffers most recently
+# used shapes are kept, since ROI crops and edge tiles keep producing new ones.
+# The returned array is overwritten by the next call with the same shape. With
+# channels_last the (N, 3, H, W) result is a view of an NHWC buffer, which skips
+# the transpose and is the layout CPU convolutions prefer.
+class LetterboxPreprocessor:
+    def __init__(
+        self,
+        imgsz: int = 640,
+        stride: int = 32,
+        channel_order: str = "BGR",
+        pad_value: int = 114,
+        channels_last: bool = False,
+        max_buffers: int = 4,
+    ):
+        if channel_order not in CHANNEL_ORDERS:
+            raise ValueError(
+                f"Unknown channel order {channel_order!r}; "
+                f"expected one of {CHANNEL_ORDERS}"
+            )
+
+        self.imgsz = imgsz
+        self.stride = stride
+        self.channel_order = channel_order
+        self.pad_value = pad_value
+        self.channels_last = channels_last
+        self.max_buffers = max_buffers
+        self._canvas: OrderedDict[tuple[int, ...], np.ndarray] = OrderedDict()
+        self._inputs: OrderedDict[tuple[int, ...], np.ndarray] = OrderedDict()
+        self._resized: OrderedDict[tuple[int, ...], np.ndarray] = OrderedDict()
+
+    def _buffer(
+        self,
+        buffers: OrderedDict[tuple[int, ...], np.ndarray],
+        key: tuple[int, ...],
+        allocate: Callable[[], np.ndarray],
+    ) -> np.ndarray:
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = allocate()
+            while len(buffers) > self.max_buffers:
+                buffers.popitem(last=False)
+        else:
+            buffers.move_to_end(key)
+        return buffer
+
+    def geometry(
+        self, frame_shape: tuple[int, int], imgsz: int, auto: bool
+    ) -> tuple[tuple[int, int], tuple[int, int], tuple[int, int]]:
+        # Returns (resized (w, h), padded input (h, w), (left, top) padding)
+        height, width = frame_shape
+        r = min(imgsz / height, imgsz / width)
+        new_w, new_h = round(width * r), round(height * r)
+
+        dw, dh = imgsz - new_w, imgsz - new_h
+        if auto:
+            # Minimum rectangle: pad only up to the next stride multiple
+            dw, dh = dw % self.stride, dh % self.stride
+
+        left, right = round(dw / 2 - 0.1), round(dw / 2 + 0.1)
+        top, bottom = round(dh / 2 - 0.1), round(dh / 2 + 0.1)
+        return (new_w, new_h), (new_h + top + bottom, new_w + left + right), (left, top)
+
+    def __call__(
+        self, frames: list[np.ndarray], imgsz: int | None = None
+    ) -> tuple[np.ndarray, list[LetterboxInfo]]:
+        imgsz = imgsz or self.imgsz
+        auto = len({frame.shape for frame in frames}) == 1
+        geometries = [self.geometry(frame.shape[:2], imgsz, auto) for frame in frames]
+
+        # Mixed shapes are padded to the same square input, as in Ultralytics
+        out_h, out_w = geometries[0][1]
+        key = (len(frames), out_h, out_w)
+        canvas = self._buffer(
+            self._canvas, key, lambda: np.empty((*key, 3), dtype=np.uint8)
+        )
+        if self.channels_last:
+            inputs = self._buffer(
+                self._inputs,
+                (*key, True),
+                lambda: np.empty((*key, 3), np.float32).transpose(0, 3, 1, 2),
+            )
+        else:
+            inputs = self._buffer(
+                self._inputs,
+                (*key, False),
+                lambda: np.empty((len(frames), 3, out_h, out_w), np.float32),
+            )
+
+        infos = []
+        for i, (frame, ((new_w, new_h), _, (left, top))) in enumerate(
+            zip(frames, geometries)
+        ):
+            canvas[i].fill(self.pad_value)
+            region = canvas[i, top : top + new_h, left : left + new_w]
+            if frame.shape[:2] == (new_h, new_w):
+                region[...] = frame
+            else:
+                resized = self._buffer(
+                    self._resized,
+                    (new_h, new_w),
+                    lambda shape=(new_h, new_w, 3): np.empty(shape, dtype=np.uint8),
+                )
+                cv2.resize(
+                    frame, (new_w, new_h), dst=resized, interpolation=cv2.INTER_LINEAR
+                )
+                region[...] = resized
+
+            infos.append(
+                LetterboxInfo(
+                    frame.shape[:2],
+                    (new_h / frame.shape[0], new_w / frame.shape[1]),
+                    (left, top),
+                )
+            )
+
+        # One pass for channel order, HWC -> CHW and 0-255 -> 0-1
+        source = canvas[..., ::-1] if self.channel_order == "BGR" else canvas
+        np.multiply(source.transpose(0, 3, 1, 2), 1 / 255, out=inputs)
+        return inputs, infos
+
+    @staticmethod
+    def scale_boxes(boxes: np.ndarray, info: LetterboxInfo) -> np.ndarray:
+        # Maps xyxy boxes from network input back to the original frame, in place
+        gain_y, gain_x = info.gain
+        pad_x, pad_y = info.pad
+        boxes[:, [0, 2]] -= pad_x
+        boxes[:, [1, 3]] -= pad_y
+        boxes[:, [0, 2]] /= gain_x
+        boxes[:, [1, 3]] /= gain_y
+        height, width = info.orig_shape
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+        return boxes
@@ -0,0 +1,333 @@
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import cv2
+import numpy as np
+
+from src.detection_agent import DetectionAgent
+from src.detection_cache import file_hash
+from src.detections import Detections
+from src.preprocessing import LetterboxPreprocessor
+from src.tracking_agent import TrackingAgent
+
+if TYPE_CHECKING:
+    from src.model_manager_agent import ModelManagerAgent
+
+INT8_PRECISIONS = ("int8-dynamic", "int8-static")
+
+
+def calibration_images(directory: str | Path, limit: int = 64) -> list[Path]:
+    # The first `limit` files in the directory that OpenCV can decode as images
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    paths = [
+        path
+        for path in sorted(directory.iterdir())
+        if path.is_file() and cv2.haveImageReader(str(path))
+    ]
+    return paths[:limit]
+
+
+def calibration_key(paths: list[Path]) -> str:
+    # Changes when any calibration image is added, removed or edited
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(f"{path.name}:{file_hash(path)}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+# Feeds calibration frames to the ONNX Runtime calibrator one at a time,
+# letterboxed exactly as the direct inference path prepares them.
+class CalibrationReader:
+    def __init__(self, paths: list[Path], input_name: str, imgsz: int = 640):
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.preprocessor = LetterboxPreprocessor(imgsz)
+        self._paths = iter(paths)
+
+    def get_next(self) -> dict[str, np.ndarray] | None:
+        for path in self._paths:
+            frame = cv2.imread(str(path))
+            if frame is None:
+                continue
+            inputs, _ = self.preprocessor([frame])
+            # The preprocessor reuses its buffer on the next call
+            return {self.input_name: inputs.copy()}
+        return None
+
+
+def decode_nodes(model: Any) -> list[str]:
+    # Nodes of the detection head outside its conv branches: DFL, anchor
+    # decoding and the concatenated output. 8-bit activations cannot hold pixel
+    # coordinates precisely, so these stay in float.
+    names = [node.name for node in model.graph.node]
+    heads = [
+        int(m.group(1)) for name in names if (m := re.match(r"/model\.(\d+)/", name))
+    ]
+    if not heads:
+        return []
+    prefix = f"/model.{max(heads)}/"
+    return [
+        name
+        for name in names
+        if name.startswith(prefix) and not re.search(r"/(one2one_)?cv\d\.", name)
+    ]
+
+
+def quantize_onnx(
+    source: str | Path,
+    target: str | Path,
+    precision: str,
+    calibration: list[Path] | None = None,
+    imgsz: int = 640,
+) -> None:
+    import onnx
+    from onnxruntime.quantization import (
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    model = onnx.load(str(source))
+    exclude = decode_nodes(model)
+
+    # Unsigned activations with signed weights (U8S8) is the fast path of ONNX
+    # Runtime's x86 int8 kernels; signed activations fall back to float convs
+    if precision == "int8-dynamic":
+        quantize_dynamic(
+            str(source),
+            str(target),
+            weight_type=QuantType.QUInt8,
+            nodes_to_exclude=exclude,
+        )
+    elif precision == "int8-static":
+        if not calibration:
+            raise ValueError("Static INT8 quantization needs calibration images")
+        quantize_static(
+            str(source),
+            str(target),
+            CalibrationReader(calibration, model.graph.input[0].name, imgsz),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=exclude,
+        )
+    else:
+        raise ValueError(
+            f"Unknown INT8 precision {precision!r}; expected one of {INT8_PRECISIONS}"
+        )
+
+
+def match_detections(
+    reference: Detections, candidate: Detections, iou_threshold: float = 0.5
+) -> tuple[int, float]:
+    # Greedy same-class matching by candidate confidence; returns the number of
+    # matched pairs and the sum of their IoUs
+    if not len(reference) or not len(candidate):
+        return 0, 0.0
+
+    iou = TrackingAgent._iou_matrix(candidate.xyxy, reference.xyxy)
+    iou[candidate.class_id[:, None] != reference.class_id[None, :]] = 0.0
+
+    matched, iou_sum = 0, 0.0
+    used = np.zeros(len(reference), dtype=bool)
+    for i in np.argsort(-candidate.conf, kind="stable"):
+        row = np.where(used, 0.0, iou[i])
+        j = int(row.argmax())
+        if row[j] >= iou_threshold:
+            used[j] = True
+            matched += 1
+            iou_sum += float(row[j])
+    return matched, iou_sum
+
+
+def agreement(
+    reference: list[Detections],
+    candidate: list[Detections],
+    iou_threshold: float = 0.5,
+) -> dict[str, float]:
+    # How closely candidate detections reproduce the reference, over all frames
+    matched, iou_sum = 0, 0.0
+    for ref, cand in zip(reference, candidate):
+        frame_matched, frame_iou = match_detections(ref, cand, iou_threshold)
+        matched += frame_matched
+        iou_sum += frame_iou
+
+    n_reference = sum(len(d) for d in reference)
+    n_candidate = sum(len(d) for d in candidate)
+    precision = matched / n_candidate if n_candidate else 1.0
+    recall = matched / n_reference if n_reference else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "mean_iou": iou_sum / matched if matched else 1.0,
+    }
+
+
+def _benchmark(
+    agent: DetectionAgent, frames: list[np.ndarray], runs: int
+) -> tuple[list[Detections], list[float], float]:
+    # Per-frame latencies of single-frame calls, then batched throughput
+    agent.detect(frames[0], columnar=True)
+
+    latencies = []
+    detections = []
+    for _ in range(runs):
+        detections = []
+        for frame in frames:
+            start = time.perf_counter()
+            detections.append(agent.detect(frame, columnar=True))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        agent.detect_batch(frames, columnar=True)
+    fps = runs * len(frames) / (time.perf_counter() - start)
+    return detections, latencies, fps
+
+
+def compare_precisions(
+    model_manager: "ModelManagerAgent",
+    frames: list[np.ndarray],
+    model_name: str | None = None,
+    precisions: tuple[str, ...] = ("fp32", *INT8_PRECISIONS),
+    runs: int = 3,
+    batch_size: int = 8,
+) -> dict[str, Any]:
+    # Latency, throughput and detection agreement of each precision against
+    # the fp32 model on the same frames. fp32 runs on the configured backend,
+    # INT8 variants on ONNX Runtime.
+    if not frames:
+        raise ValueError("No frames to compare on")
+
+    previous_name = model_manager.model_name
+    previous_backend = model_manager.backend
+    previous_precision = model_manager.precision
+    config = model_manager.get_config_value
+    model_name = model_name or previous_name or None
+    precisions = ("fp32", *(p for p in precisions if p != "fp32"))
+
+    results: dict[str, Any] = {}
+    reference: list[Detections] = []
+    try:
+        for precision in precisions:
+            model = model_manager.load_model(model_name, precision=precision)
+            agent = DetectionAgent(
+                model_manager.model_name,
+                confidence_threshold=config("model.confidence_threshold", 0.5),
+                device=config("model.device", "cpu"),
+                max_batch_size=batch_size,
+                nms_iou_threshold=config("model.iou_threshold", 0.7),
+                direct_inference=True,
+            )
+            agent.set_model(model)
+
+            detections, latencies, fps = _benchmark(agent, frames, runs)
+            if precision == "fp32":
+                reference = detections
+
+            weights = model.model
+            path = Path(weights) if isinstance(weights, (str, Path)) else None
+            results[precision] = {
+                "backend": model_manager.backend,
+                "model": str(path) if path else model_manager.model_name,
+                "size_mb": path.stat().st_size / 1e6 if path else None,
+                "latency_ms": float(np.mean(latencies)) * 1000,
+                "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+                "fps": fps,
+                "detections": sum(len(d) for d in detections),
+                "agreement": agreement(reference, detections),
+            }
+    finally:
+        if previous_name:
+            model_manager.load_model(
+                previous_name, previous_backend, precision=previous_precision
+            )
+
+    fp32_latency = results["fp32"]["latency_ms"]
+    for result in results.values():
+        result["speedup"] = fp32_latency / result["latency_ms"]
+    return {"frames": len(frames), "runs": runs, "precisions": results}
+
+
+def format_report(report: dict[str, Any]) -> str:
+    lines = [
+        f"{report['frames']} frames x {report['runs']} runs",
+        (
+            f"{'precision':<14}{'backend':<13}{'ms/frame':>9}{'p95':>9}{'FPS':>8}"
+            f"{'speedup':>9}{'dets':>6}{'recall':>8}{'prec.':>7}{'IoU':>6}"
+        ),
+    ]
+    for precision, result in report["precisions"].items():
+        agreed = result["agreement"]
+        lines.append(
+            f"{precision:<14}{result['backend']:<13}"
+            f"{result['latency_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+            f"{result['fps']:>8.1f}{result['speedup']:>8.2f}x"
+            f"{result['detections']:>6}{agreed['recall']:>8.3f}"
+            f"{agreed['precision']:>7.3f}{agreed['mean_iou']:>6.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from src.model_manager_agent import ModelManagerAgent
+
+    parser = argparse.ArgumentParser(
+        prog="python -m src.quantization",
+        description="Build INT8 variants of a model and compare them with fp32.",
+    )
+    parser.add_argument("frames", help="Directory of evaluation images")
+    parser.add_argument("--config", default="config.yaml", help="Configuration file")
+    parser.add_argument("--model", help="Model weights (default: model.name)")
+    parser.add_argument(
+        "--precisions",
+        nargs="+",
+        choices=INT8_PRECISIONS,
+        default=list(INT8_PRECISIONS),
+        help="Variants to compare with fp32",
+    )
+    parser.add_argument(
+        "--max-frames", type=int, default=32, help="Evaluation images to use"
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Passes over the frames")
+    parser.add_argument("-o", "--output", help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    frames = [
+        frame
+        for path in calibration_images(args.frames, args.max_frames)
+        if (frame := cv2.imread(str(path))) is not None
+    ]
+    if not frames:
+        print(f"No images found in {args.frames}", file=sys.stderr)
+        return 1
+
+    model_manager = ModelManagerAgent(args.config)
+    report = compare_precisions(
+        model_manager,
+        frames,
+        args.model,
+        ("fp32", *args.precisions),
+        runs=args.runs,
+        batch_size=model_manager.get_config_value("model.batch_size", 8),
+    )
+    print(format_report(report))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,74 +1,350 @@
+import functools
+from collections.abc import Callable, Iterator
 from typing import Any
 
+import numpy as np
+
+from src.detections import Detections
+
+ASSIGNMENT_MODES = ("greedy", "hungarian")
+MOTION_MODELS = ("none", "kalman")
+
 
 class TrackingAgent:
     def __init__(
-        self, max_age: int = 30, min_hits: int = 3, iou_threshold: float = 0.3
+        self,
+        max_age: int = 30,
+        min_hits: int = 3,
+        iou_threshold: float = 0.3,
+        assignment: str = "greedy",
+        motion_model: str = "none",
+        grid_min_tracks: int | None = 256,
     ):
+        if assignment not in ASSIGNMENT_MODES:
+            raise ValueError(
+                f"Unknown assignment mode '{assignment}', "
+                f"expected one of {ASSIGNMENT_MODES}"
+            )
+
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
-        self.tracks: list[dict[str, Any]] = []
+        self.assignment = assignment
+        # Above this many tracks, IoU is only evaluated for pairs that share a
+        # grid cell instead of the full detections x tracks matrix
+        self.grid_min_tracks = grid_min_tracks
+        self.spatial_grid = SpatialGrid()
+        self.store = TrackStore()
         self.track_id_counter = 0
+        self._active_view = TrackView(self.store)
+        self.kalman_filter: KalmanBoxFilter | None = None
+        self.motion_model = motion_model
+
+    @property
+    def motion_model(self) -> str:
+        return "kalman" if self.kalman_filter is not None else "none"
 
-    def update(self, detections: list[dict[str, Any]]) -> list[dict[str, Any]]:
-        if not detections:
+    @motion_model.setter
+    def motion_model(self, motion_model: str) -> None:
+        # Can change between frames; live tracks switching to Kalman start
+        # their motion state from their current box
+        if motion_model not in MOTION_MODELS:
+            raise ValueError(
+                f"Unknown motion model '{motion_model}', "
+                f"expected one of {MOTION_MODELS}"
+            )
+        if motion_model == "none":
+            self.kalman_filter = None
+        elif self.kalman_filter is None:
+            self.kalman_filter = KalmanBoxFilter()
+            n = self.store.size
+            if n:
+                self.store.mean[:n], self.store.covariance[:n] = (
+                    self.kalman_filter.initiate(self.store.bbox[:n])
+                )
+
+    @property
+    def tracks(self) -> list[dict[str, Any]]:
+        return [self.store.row(i) for i in range(self.store.size)]
+
+    @property
+    def track_boxes(self) -> np.ndarray:
+        # All live tracks, tentative ones included; predicted boxes with Kalman
+        return self.store.bbox[: self.store.size]
+
+    def update(self, detections: list[dict[str, Any]] | Detections) -> "TrackView":
+        # Associate against where each track is expected to be in this frame
+        self._predict_tracks()
+
+        if not len(detections):
             self._age_tracks()
             return self._get_active_tracks()
 
+        if not isinstance(detections, Detections):
+            detections = Detections.from_dicts(detections)
+
         matched_tracks, unmatched_detections = self._match_detections_to_tracks(
             detections
         )
 
-        for track_idx, detection in matched_tracks:
-            self.tracks[track_idx]["bbox"] = detection["bbox"]
-            self.tracks[track_idx]["confidence"] = detection["confidence"]
-            self.tracks[track_idx]["class_name"] = detection["class_name"]
-            self.tracks[track_idx]["hits"] += 1
-            self.tracks[track_idx]["age"] = 0
+        if matched_tracks:
+            track_indices = np.array([track_idx for track_idx, _ in matched_tracks])
+            det_indices = np.array([det_idx for _, det_idx in matched_tracks])
 
-        for detection in unmatched_detections:
-            self._create_new_track(detection)
+            store = self.store
+            if self.kalman_filter is not None:
+                self._correct_tracks(detections, track_indices, det_indices)
+            else:
+                store.bbox[track_indices] = detections.xyxy[det_indices]
+            store.confidence[track_indices] = detections.conf[det_indices]
+            store.hits[track_indices] += 1
+            store.age[track_indices] = 0
+
+        if unmatched_detections:
+            self._create_new_tracks(detections, unmatched_detections)
 
+        self.store.partition(self.min_hits)
         self._age_tracks()
 
         return self._get_active_tracks()
 
+    def predict(self) -> "TrackView":
+        # For frames where detection is skipped: advance motion state only,
+        # without aging tracks or spending hits
+        self._predict_tracks()
+        return self._get_active_tracks()
+
+    def _predict_tracks(self) -> None:
+        n = self.store.size
+        if self.kalman_filter is None or n == 0:
+            return
+
+        store = self.store
+        store.mean[:n], store.covariance[:n] = self.kalman_filter.predict(
+            store.mean[:n], store.covariance[:n]
+        )
+        store.bbox[:n] = self.kalman_filter.to_xyxy(store.mean[:n])
+
+    def _correct_tracks(
+        self, detections: Detections, track_indices: np.ndarray, det_indices: np.ndarray
+    ) -> None:
+        store = self.store
+        mean, covariance = self.kalman_filter.update(
+            store.mean[track_indices],
+            store.covariance[track_indices],
+            detections.xyxy[det_indices],
+        )
+        store.mean[track_indices] = mean
+        store.covariance[track_indices] = covariance
+        store.bbox[track_indices] = self.kalman_filter.to_xyxy(mean)
+
     def _match_detections_to_tracks(
-        self, detections: list[dict[str, Any]]
-    ) -> tuple[list[tuple[int, dict[str, Any]]], list[dict[str, Any]]]:
-        if not self.tracks:
-            return [], detections
+        self, detections: Detections
+    ) -> tuple[list[tuple[int, int]], list[int]]:
+        n = self.store.size
+        if n == 0:
+            return [], list(range(len(detections)))
+
+        # Columns are visited oldest track first, the order the greedy pass has
+        # always used to break ties; swap-removal scrambles the storage order
+        order = np.argsort(self.store.track_id[:n], kind="stable")
+
+        if self.grid_min_tracks is not None and n >= self.grid_min_tracks:
+            matched, unmatched_detections = self._match_sparse(detections, order)
+        else:
+            iou = self._iou_cost_matrix(
+                detections.xyxy,
+                detections.class_id,
+                self.store.bbox[order],
+                self.store.class_id[order],
+            )
+
+            if self.assignment == "hungarian":
+                matched, unmatched_detections = self._assign_hungarian(iou)
+            else:
+                matched, unmatched_detections = self._assign_greedy(iou)
+
+        return [
+            (int(order[track_idx]), det_idx) for track_idx, det_idx in matched
+        ], unmatched_detections
+
+    def _match_sparse(
+        self, detections: Detections, order: np.ndarray
+    ) -> tuple[list[tuple[int, int]], list[int]]:
+        track_boxes = self.store.bbox[order]
+        det_indices, track_indices = self.spatial_grid.candidate_pairs(
+            detections.xyxy, track_boxes
+        )
+
+        iou = self._pairwise_iou(
+            detections.xyxy[det_indices], track_boxes[track_indices]
+        )
+        valid = (iou > max(self.iou_threshold, 0.0)) & (
+            detections.class_id[det_indices]
+            == self.store.class_id[order][track_indices]
+        )
+        det_indices = det_indices[valid]
+        track_indices = track_indices[valid]
+        iou = iou[valid]
+
+        if self.assignment == "hungarian":
+            matched = self._assign_hungarian_sparse(det_indices, track_indices, iou)
+        else:
+            matched = self._assign_greedy_sparse(det_indices, track_indices, iou)
+
+        matched_detections = {det_idx for _, det_idx in matched}
+        unmatched_detections = [
+            det_idx
+            for det_idx in range(len(detections))
+            if det_idx not in matched_detections
+        ]
+        return matched, unmatched_detections
+
+    def _assign_greedy_sparse(
+        self, det_indices: np.ndarray, track_indices: np.ndarray, iou: np.ndarray
+    ) -> list[tuple[int, int]]:
+        # Same choices as _assign_greedy: detections in order, each taking its
+        # highest-IoU free track, lowest column first on ties
+        sort = np.lexsort((track_indices, -iou, det_indices))
 
         matched = []
-        unmatched_detections = []
         used_tracks = set()
+        last_matched_det = -1
+        for det_idx, track_idx in zip(
+            det_indices[sort].tolist(), track_indices[sort].tolist()
+        ):
+            if det_idx == last_matched_det or track_idx in used_tracks:
+                continue
+            matched.append((track_idx, det_idx))
+            used_tracks.add(track_idx)
+            last_matched_det = det_idx
+
+        return matched
+
+    def _assign_hungarian_sparse(
+        self, det_indices: np.ndarray, track_indices: np.ndarray, iou: np.ndarray
+    ) -> list[tuple[int, int]]:
+        # Pairs that cannot be matched contribute nothing, so the optimum
+        # decomposes into independent problems per connected component
+        solver = assignment_solver()
+        matched = []
+
+        for component in _connected_components(det_indices, track_indices):
+            if len(component) == 1:
+                matched.append(
+                    (int(track_indices[component[0]]), int(det_indices[component[0]]))
+                )
+                continue
 
-        for detection in detections:
-            best_iou = 0
-            best_track_idx = -1
+            dets, det_rows = np.unique(det_indices[component], return_inverse=True)
+            tracks, track_cols = np.unique(
+                track_indices[component], return_inverse=True
+            )
+            cost = np.zeros((len(dets), len(tracks)))
+            cost[det_rows, track_cols] = iou[component]
 
-            for track_idx, track in enumerate(self.tracks):
-                if track_idx in used_tracks:
-                    continue
+            rows, cols = solver(-cost)
+            matched.extend(
+                (int(tracks[col]), int(dets[row]))
+                for row, col in zip(rows, cols)
+                if cost[row, col] > 0
+            )
 
-                if track["class_name"] != detection["class_name"]:
-                    continue
+        matched.sort(key=lambda pair: pair[1])
+        return matched
 
-                iou = self._calculate_iou(detection["bbox"], track["bbox"])
+    def _assign_greedy(
+        self, iou: np.ndarray
+    ) -> tuple[list[tuple[int, int]], list[int]]:
+        matched = []
+        unmatched_detections = []
+        min_iou = max(self.iou_threshold, 0.0)
 
-                if iou > self.iou_threshold and iou > best_iou:
-                    best_iou = iou
-                    best_track_idx = track_idx
+        # Greedy in detection order; argmax returns the first best track, which
+        # matches the tie-breaking of the original per-pair loop
+        for det_idx in range(iou.shape[0]):
+            row = iou[det_idx]
+            track_idx = int(row.argmax())
 
-            if best_track_idx >= 0:
-                matched.append((best_track_idx, detection))
-                used_tracks.add(best_track_idx)
+            if row[track_idx] > min_iou:
+                matched.append((track_idx, det_idx))
+                iou[:, track_idx] = 0.0
             else:
-                unmatched_detections.append(detection)
+                unmatched_detections.append(det_idx)
+
+        return matched, unmatched_detections
+
+    def _assign_hungarian(
+        self, iou: np.ndarray
+    ) -> tuple[list[tuple[int, int]], list[int]]:
+        # Maximizing total IoU over pairs above the threshold only; gated and
+        # sub-threshold pairs are zeroed so they cannot displace a valid pair,
+        # and are dropped again by the check below
+        min_iou = max(self.iou_threshold, 0.0)
+        iou = np.where(iou > min_iou, iou, 0.0)
+
+        solver = assignment_solver()
+        det_indices, track_indices = solver(-iou)
+
+        matched = [
+            (int(track_idx), int(det_idx))
+            for det_idx, track_idx in zip(det_indices, track_indices)
+            if iou[det_idx, track_idx] > min_iou
+        ]
+
+        matched_detections = {det_idx for _, det_idx in matched}
+        unmatched_detections = [
+            det_idx
+            for det_idx in range(iou.shape[0])
+            if det_idx not in matched_detections
+        ]
 
         return matched, unmatched_detections
 
+    def _iou_cost_matrix(
+        self,
+        det_boxes: np.ndarray,
+        det_class_ids: np.ndarray,
+        track_boxes: np.ndarray,
+        track_class_ids: np.ndarray,
+    ) -> np.ndarray:
+        iou = self._iou_matrix(det_boxes, track_boxes)
+        iou[det_class_ids[:, None] != track_class_ids[None, :]] = 0.0
+        return iou
+
+    @staticmethod
+    def _iou_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+        boxes1 = np.asarray(boxes1, dtype=np.float64)
+        boxes2 = np.asarray(boxes2, dtype=np.float64)
+        return TrackingAgent._pairwise_iou(boxes1[:, None, :], boxes2[None, :, :])
+
+    @staticmethod
+    def _pairwise_iou(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+        # Same arithmetic as _calculate_iou, broadcast over the leading axes in
+        # float64; shared by the dense matrix and the grid-gated pairs
+        boxes1 = np.asarray(boxes1, dtype=np.float64)
+        boxes2 = np.asarray(boxes2, dtype=np.float64)
+
+        inter_w = np.minimum(boxes1[..., 2], boxes2[..., 2]) - np.maximum(
+            boxes1[..., 0], boxes2[..., 0]
+        )
+        inter_h = np.minimum(boxes1[..., 3], boxes2[..., 3]) - np.maximum(
+            boxes1[..., 1], boxes2[..., 1]
+        )
+        overlap = (inter_w > 0) & (inter_h > 0)
+        inter_area = np.where(overlap, inter_w * inter_h, 0.0)
+
+        area1 = (boxes1[..., 2] - boxes1[..., 0]) * (boxes1[..., 3] - boxes1[..., 1])
+        area2 = (boxes2[..., 2] - boxes2[..., 0]) * (boxes2[..., 3] - boxes2[..., 1])
+        union_area = area1 + area2 - inter_area
+
+        return np.divide(
+            inter_area,
+            union_area,
+            out=np.zeros_like(inter_area),
+            where=overlap & (union_area != 0),
+        )
+
     def _calculate_iou(self, bbox1: list[float], bbox2: list[float]) -> float:
         x1_min, y1_min, x1_max, y1_max = bbox1
         x2_min, y2_min, x2_max, y2_max = bbox2
@@ -93,28 +369,503 @@ class TrackingAgent:
 
         return inter_area / union_area
 
-    def _create_new_track(self, detection: dict[str, Any]) -> None:
-        track = {
-            "track_id": self.track_id_counter,
-            "bbox": detection["bbox"],
-            "confidence": detection["confidence"],
-            "class_id": detection["class_id"],
-            "class_name": detection["class_name"],
-            "hits": 1,
-            "age": 0,
-        }
-        self.tracks.append(track)
-        self.track_id_counter += 1
+    def _create_new_tracks(
+        self, detections: Detections, det_indices: list[int]
+    ) -> None:
+        det_indices = np.asarray(det_indices)
+        class_ids = detections.class_id[det_indices]
+        class_names = [
+            detections.names.get(int(class_id), str(class_id)) for class_id in class_ids
+        ]
+        track_ids = np.arange(
+            self.track_id_counter, self.track_id_counter + len(det_indices)
+        )
+
+        start = self.store.extend(
+            track_ids,
+            detections.xyxy[det_indices],
+            detections.conf[det_indices],
+            class_ids,
+            class_names,
+        )
+        if self.kalman_filter is not None:
+            end = start + len(det_indices)
+            self.store.mean[start:end], self.store.covariance[start:end] = (
+                self.kalman_filter.initiate(detections.xyxy[det_indices])
+            )
+
+        self.track_id_counter += len(det_indices)
 
     def _age_tracks(self) -> None:
-        self.tracks = [track for track in self.tracks if track["age"] < self.max_age]
+        store = self.store
+        expired = store.age[: store.size] >= self.max_age
+        if expired.any():
+            store.remove(np.flatnonzero(expired))
 
-        for track in self.tracks:
-            track["age"] += 1
+        store.age[: store.size] += 1
 
-    def _get_active_tracks(self) -> list[dict[str, Any]]:
-        return [track for track in self.tracks if track["hits"] >= self.min_hits]
+    def _get_active_tracks(self) -> "TrackView":
+        if self.store.min_hits != self.min_hits:
+            self.store.partition(self.min_hits)
+        return self._active_view
 
     def reset(self) -> None:
-        self.tracks = []
+        self.store.clear()
         self.track_id_counter = 0
+
+
+# Uniform grid over box extents, rebuilt from the current boxes on every query.
+# Each box is registered in every cell it touches, so any two overlapping boxes
+# share a cell and no pair with IoU > 0 is missed; the cell size only affects
+# how many non-overlapping pairs are let through.
+class SpatialGrid:
+    # Keeps cell keys well inside int64 for coordinates up to ~1e6 cells
+    _KEY_OFFSET = 1 << 20
+    _KEY_STRIDE = 1 << 22
+
+    def __init__(self, cell_size: float | None = None):
+        self.cell_size = cell_size
+
+    def candidate_pairs(
+        self, query_boxes: np.ndarray, boxes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if len(query_boxes) == 0 or len(boxes) == 0:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty
+
+        cell_size = self.cell_size or self._auto_cell_size(boxes)
+        box_owner, box_keys = self._cell_keys(boxes, cell_size)
+        query_owner, query_keys = self._cell_keys(query_boxes, cell_size)
+
+        sort = np.argsort(box_keys, kind="stable")
+        box_owner = box_owner[sort]
+        box_keys = box_keys[sort]
+
+        lo = np.searchsorted(box_keys, query_keys, side="left")
+        counts = np.searchsorted(box_keys, query_keys, side="right") - lo
+        query_idx = np.repeat(query_owner, counts)
+        box_idx = box_owner[np.repeat(lo, counts) + self._ranks(counts)]
+
+        # Boxes sharing several cells produce duplicate pairs
+        pair_keys = np.unique(query_idx * len(boxes) + box_idx)
+        return pair_keys // len(boxes), pair_keys % len(boxes)
+
+    @staticmethod
+    def _auto_cell_size(boxes: np.ndarray) -> float:
+        sizes = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        return max(float(np.median(sizes)) * 2.0, 1.0)
+
+    @staticmethod
+    def _ranks(counts: np.ndarray) -> np.ndarray:
+        # 0..count-1 for every run, concatenated
+        starts = np.cumsum(counts) - counts
+        return np.arange(counts.sum()) - np.repeat(starts, counts)
+
+    def _cell_keys(
+        self, boxes: np.ndarray, cell_size: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        cells = np.floor(np.asarray(boxes, dtype=np.float64) / cell_size).astype(
+            np.int64
+        )
+        x0, y0, x1, y1 = cells[:, 0], cells[:, 1], cells[:, 2], cells[:, 3]
+        nx = np.maximum(x1 - x0 + 1, 1)
+        ny = np.maximum(y1 - y0 + 1, 1)
+        counts = nx * ny
+
+        owner = np.repeat(np.arange(len(boxes)), counts)
+        rank = self._ranks(counts)
+        cx = x0[owner] + rank % nx[owner]
+        cy = y0[owner] + rank // nx[owner]
+
+        keys = (cx + self._KEY_OFFSET) * self._KEY_STRIDE + (cy + self._KEY_OFFSET)
+        return owner, keys
+
+
+# Columnar track storage. Rows [0, n_active) are tracks with at least min_hits
+# hits and rows [n_active, size) are tentative ones, so the active set is always
+# a prefix and can be handed out without building a new list. Rows are removed
+# by moving the last row into the hole, which keeps every column contiguous.
+class TrackStore:
+    __slots__ = (
+        "age",
+        "bbox",
+        "class_id",
+        "class_name",
+        "confidence",
+        "covariance",
+        "hits",
+        "mean",
+        "min_hits",
+        "n_active",
+        "size",
+        "track_id",
+    )
+
+    def __init__(self, capacity: int = 64):
+        self.size = 0
+        self.n_active = 0
+        self.min_hits = 1
+        self.track_id = np.zeros(capacity, dtype=np.int64)
+        self.bbox = np.zeros((capacity, 4), dtype=np.float64)
+        self.confidence = np.zeros(capacity, dtype=np.float64)
+        self.class_id = np.zeros(capacity, dtype=np.int64)
+        self.hits = np.zeros(capacity, dtype=np.int64)
+        self.age = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros((capacity, 8), dtype=np.float64)
+        self.covariance = np.zeros((capacity, 8, 8), dtype=np.float64)
+        self.class_name: list[str] = []
+
+    @property
+    def capacity(self) -> int:
+        return self.track_id.shape[0]
+
+    def _columns(self) -> tuple[np.ndarray, ...]:
+        return (
+            self.track_id,
+            self.bbox,
+            self.confidence,
+            self.class_id,
+            self.hits,
+            self.age,
+            self.mean,
+            self.covariance,
+        )
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = max(min_capacity, self.capacity * 2)
+        for name in ("track_id", "bbox", "confidence", "class_id", "hits", "age"):
+            setattr(self, name, self._resized(getattr(self, name), capacity))
+        self.mean = self._resized(self.mean, capacity)
+        self.covariance = self._resized(self.covariance, capacity)
+
+    def _resized(self, column: np.ndarray, capacity: int) -> np.ndarray:
+        resized = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+        resized[: self.size] = column[: self.size]
+        return resized
+
+    def extend(
+        self,
+        track_ids: np.ndarray,
+        bbox: np.ndarray,
+        confidence: np.ndarray,
+        class_id: np.ndarray,
+        class_name: list[str],
+    ) -> int:
+        start = self.size
+        end = start + len(track_ids)
+        if end > self.capacity:
+            self._grow(end)
+
+        self.track_id[start:end] = track_ids
+        self.bbox[start:end] = bbox
+        self.confidence[start:end] = confidence
+        self.class_id[start:end] = class_id
+        self.hits[start:end] = 1
+        self.age[start:end] = 0
+        self.class_name.extend(class_name)
+        self.size = end
+        return start
+
+    def _move(self, src: int, dst: int) -> None:
+        for column in self._columns():
+            column[dst] = column[src]
+        self.class_name[dst] = self.class_name[src]
+
+    def remove(self, indices: np.ndarray) -> None:
+        # Descending order guarantees the row moved into a hole is never one
+        # that is still waiting to be removed
+        for i in sorted(indices.tolist(), reverse=True):
+            last = self.size - 1
+            if i < self.n_active:
+                last_active = self.n_active - 1
+                if i != last_active:
+                    self._move(last_active, i)
+                if last != last_active:
+                    self._move(last, last_active)
+                self.n_active -= 1
+            elif i != last:
+                self._move(last, i)
+
+            self.class_name.pop()
+            self.size -= 1
+
+    def partition(self, min_hits: int) -> None:
+        # Hits only grow, so normally only tentative rows need checking; a
+        # changed min_hits re-partitions everything
+        start = 0 if min_hits != self.min_hits else self.n_active
+        self.min_hits = min_hits
+
+        promoted = self.hits[start : self.size] >= min_hits
+        n_promoted = int(promoted.sum())
+        if n_promoted == 0 or promoted.all():
+            self.n_active = start + n_promoted
+            return
+
+        if not promoted[:n_promoted].all():
+            order = np.concatenate(
+                [np.flatnonzero(promoted), np.flatnonzero(~promoted)]
+            )
+            for column in self._columns():
+                column[start : self.size] = column[start : self.size][order]
+            names = self.class_name[start:]
+            self.class_name[start:] = [names[i] for i in order]
+
+        self.n_active = start + n_promoted
+
+    def row(self, i: int) -> dict[str, Any]:
+        return {
+            "track_id": int(self.track_id[i]),
+            "bbox": self.bbox[i].tolist(),
+            "confidence": float(self.confidence[i]),
+            "class_id": int(self.class_id[i]),
+            "class_name": self.class_name[i],
+            "hits": int(self.hits[i]),
+            "age": int(self.age[i]),
+        }
+
+    def clear(self) -> None:
+        self.size = 0
+        self.n_active = 0
+        self.class_name.clear()
+
+
+# Live, read-only view of the active tracks in a TrackStore. It reflects the
+# store as of the latest update; use to_dicts() to keep a copy across frames.
+class TrackView:
+    __slots__ = ("store",)
+
+    def __init__(self, store: TrackStore):
+        self.store = store
+
+    @property
+    def track_id(self) -> np.ndarray:
+        return self.store.track_id[: self.store.n_active]
+
+    @property
+    def bbox(self) -> np.ndarray:
+        return self.store.bbox[: self.store.n_active]
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self.store.confidence[: self.store.n_active]
+
+    @property
+    def class_id(self) -> np.ndarray:
+        return self.store.class_id[: self.store.n_active]
+
+    @property
+    def class_name(self) -> list[str]:
+        return self.store.class_name[: self.store.n_active]
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        return [self.store.row(i) for i in range(self.store.n_active)]
+
+    def __len__(self) -> int:
+        return self.store.n_active
+
+    def __getitem__(self, i: int) -> dict[str, Any]:
+        n = self.store.n_active
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("track index out of range")
+        return self.store.row(i)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for i in range(self.store.n_active):
+            yield self.store.row(i)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, TrackView)):
+            return self.to_dicts() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+
+# Constant-velocity Kalman filter over (cx, cy, w, h) box states, batched over
+# the leading axis. Process and measurement noise scale with the box size.
+class KalmanBoxFilter:
+    def __init__(
+        self,
+        std_weight_position: float = 1.0 / 20,
+        std_weight_velocity: float = 1.0 / 160,
+    ):
+        self.std_weight_position = std_weight_position
+        self.std_weight_velocity = std_weight_velocity
+
+        self._motion_mat = np.eye(8)
+        self._motion_mat[:4, 4:] = np.eye(4)
+
+    def initiate(self, boxes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        measurement = self.to_cxcywh(boxes)
+        mean = np.concatenate([measurement, np.zeros_like(measurement)], axis=1)
+
+        size = self._size(measurement)
+        std = np.concatenate(
+            [
+                2 * self.std_weight_position * size,
+                10 * self.std_weight_velocity * size,
+            ],
+            axis=1,
+        )
+        return mean, self._diag(std**2)
+
+    def predict(
+        self, mean: np.ndarray, covariance: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        size = self._size(mean)
+        std = np.concatenate(
+            [self.std_weight_position * size, self.std_weight_velocity * size],
+            axis=1,
+        )
+
+        mean = mean @ self._motion_mat.T
+        covariance = self._motion_mat @ covariance @ self._motion_mat.T + self._diag(
+            std**2
+        )
+        return mean, covariance
+
+    def update(
+        self, mean: np.ndarray, covariance: np.ndarray, boxes: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        measurement = self.to_cxcywh(boxes)
+        std = self.std_weight_position * self._size(mean)
+
+        projected_cov = covariance[:, :4, :4] + self._diag(std**2)
+        # K = P H^T S^-1, solved rather than inverted; S is symmetric
+        kalman_gain = np.linalg.solve(projected_cov, covariance[:, :4, :]).transpose(
+            0, 2, 1
+        )
+        innovation = measurement - mean[:, :4]
+
+        mean = mean + (kalman_gain @ innovation[:, :, None])[:, :, 0]
+        covariance = covariance - kalman_gain @ projected_cov @ kalman_gain.transpose(
+            0, 2, 1
+        )
+        return mean, covariance
+
+    @staticmethod
+    def to_cxcywh(boxes: np.ndarray) -> np.ndarray:
+        boxes = np.asarray(boxes, dtype=np.float64)
+        wh = boxes[:, 2:4] - boxes[:, 0:2]
+        return np.concatenate([boxes[:, 0:2] + wh / 2, wh], axis=1)
+
+    @staticmethod
+    def to_xyxy(mean: np.ndarray) -> np.ndarray:
+        half_wh = np.maximum(mean[:, 2:4], 1.0) / 2
+        return np.concatenate([mean[:, 0:2] - half_wh, mean[:, 0:2] + half_wh], axis=1)
+
+    @staticmethod
+    def _size(state: np.ndarray) -> np.ndarray:
+        wh = np.maximum(state[:, 2:4], 1.0)
+        return np.concatenate([wh, wh], axis=1)
+
+    @staticmethod
+    def _diag(values: np.ndarray) -> np.ndarray:
+        out = np.zeros(values.shape + values.shape[-1:])
+        idx = np.arange(values.shape[-1])
+        out[:, idx, idx] = values
+        return out
+
+
+def _connected_components(
+    det_indices: np.ndarray, track_indices: np.ndarray
+) -> list[np.ndarray]:
+    # Union-find over the bipartite pair graph, with detections as nodes
+    # 0..D-1 and tracks after them; returns pair indices per component
+    n_dets = int(det_indices.max()) + 1 if len(det_indices) else 0
+    n_nodes = n_dets + (int(track_indices.max()) + 1 if len(track_indices) else 0)
+    parent = list(range(n_nodes))
+
+    def find(node: int) -> int:
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for det_idx, track_idx in zip(det_indices.tolist(), track_indices.tolist()):
+        det_root = find(det_idx)
+        track_root = find(n_dets + track_idx)
+        if det_root != track_root:
+            parent[det_root] = track_root
+
+    labels = np.array([find(det_idx) for det_idx in det_indices.tolist()])
+    sort = np.argsort(labels, kind="stable")
+    splits = np.flatnonzero(np.diff(labels[sort])) + 1
+    return np.split(sort, splits)
+
+
+@functools.cache
+def assignment_solver() -> Callable[[np.ndarray], tuple[np.ndarray, np.ndarray]]:
+    # SciPy's solver when installed, imported on first use since importing
+    # scipy.optimize costs about as much as the rest of the tracker
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError:
+        return _linear_sum_assignment
+    return linear_sum_assignment
+
+
+def _linear_sum_assignment(cost: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Hungarian algorithm with potentials (O(n^2 m)), used when SciPy is not
+    # installed. Returns (row_indices, col_indices) sorted by row like SciPy.
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+
+    n, m = cost.shape
+    if n == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # p[j] is the (1-based) row assigned to column j, column 0 is a sentinel
+    p = np.zeros(m + 1, dtype=np.intp)
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(candidates.argmin()) + 1
+            delta = candidates[j1 - 1]
+
+            used_columns = np.flatnonzero(used)
+            u[p[used_columns]] += delta
+            v[used_columns] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+
+    if transposed:
+        rows, cols = cols, rows
+
+    order = np.argsort(rows)
+    return rows[order], cols[order]
@@ -0,0 +1,207 @@
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import cv2
+import numpy as np
+
+from src.model_manager_agent import ModelManagerAgent
+
+_END = object()
+
+
+# Drop-in for cv2.VideoWriter that encodes on a background thread fed by a
+# bounded queue. By default write() never blocks: when encoding falls behind the
+# frame is dropped and counted, so detection keeps its pace. Output can be split
+# into segments by duration (in video time) and/or file size. With paced, frames
+# are placed by the wall-clock time write() was called rather than one per
+# output frame: slow stretches repeat the last frame and bursts faster than fps
+# are thinned, so a live recording plays back in real time.
+class VideoSink:
+    def __init__(
+        self,
+        output_dir: str | Path,
+        prefix: str = "visiontrack",
+        fps: float = 30.0,
+        codec: str = "mp4v",
+        extension: str = ".mp4",
+        queue_size: int = 64,
+        segment_seconds: float | None = None,
+        segment_size_mb: float | None = None,
+        block: bool = False,
+        paced: bool = False,
+    ):
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.fps = fps
+        self.codec = codec
+        self.extension = extension
+        self.segment_seconds = segment_seconds or None
+        self.segment_size_mb = segment_size_mb or None
+        self.block = block
+        self.paced = paced
+        self.segments: list[Path] = []
+        self.error: str | None = None
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self._queue: queue.Queue = queue.Queue(max(1, queue_size))
+        self._writer: Any | None = None
+        self._frame_size: tuple[int, int] | None = None
+        self._segment_frames = 0
+        self._start_time: float | None = None
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    @classmethod
+    def from_config(
+        cls, model_manager: ModelManagerAgent, prefix: str = "visiontrack", **overrides
+    ) -> "VideoSink":
+        config = model_manager.get_config_value
+        settings = {
+            "output_dir": config("video.output_path", "outputs/"),
+            "fps": config("video.fps", 30),
+            "codec": config("video.codec", "mp4v"),
+            "queue_size": config("video.queue_size", 64),
+            "segment_seconds": config("video.segment_seconds", None),
+            "segment_size_mb": config("video.segment_size_mb", None),
+        }
+        settings.update(overrides)
+        return cls(prefix=prefix, **settings)
+
+    @property
+    def rotating(self) -> bool:
+        return self.segment_seconds is not None or self.segment_size_mb is not None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "VideoSink":
+        if self.running:
+            return self
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._closed = False
+        self._thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def write(self, frame: np.ndarray) -> bool:
+        # Takes a BGR frame like cv2.VideoWriter; returns False if it was dropped
+        if self._closed or self.error is not None:
+            self.dropped_frames += 1
+            return False
+        if not self.running:
+            self.start()
+        item = (frame, time.monotonic())
+
+        if not self.block:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self.dropped_frames += 1
+                return False
+
+        while self.error is None:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        self.dropped_frames += 1
+        return False
+
+    def close(self, timeout: float | None = None) -> list[Path]:
+        # Flushes queued frames, finalizes the last segment and returns all
+        # segment paths
+        if self._closed:
+            return self.segments
+        self._closed = True
+
+        if self._thread is not None:
+            while self._thread.is_alive():
+                try:
+                    self._queue.put(_END, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        return self.segments
+
+    def release(self) -> None:
+        self.close()
+
+    def _segment_path(self) -> Path:
+        if not self.rotating and not self.segments:
+            return self.output_dir / f"{self.prefix}{self.extension}"
+        index = len(self.segments)
+        return self.output_dir / f"{self.prefix}_{index:03d}{self.extension}"
+
+    def _open_segment(self, frame_size: tuple[int, int]) -> None:
+        path = self._segment_path()
+        writer = cv2.VideoWriter(
+            str(path), cv2.VideoWriter_fourcc(*self.codec), self.fps, frame_size
+        )
+        if not writer.isOpened():
+            raise RuntimeError(f"Cannot open video writer: {path}")
+
+        self._writer = writer
+        self._frame_size = frame_size
+        self._segment_frames = 0
+        self.segments.append(path)
+
+    def _close_segment(self) -> None:
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    def _segment_full(self) -> bool:
+        if (
+            self.segment_seconds is not None
+            and self._segment_frames >= self.segment_seconds * self.fps
+        ):
+            return True
+        return (
+            self.segment_size_mb is not None
+            and self.segments[-1].stat().st_size >= self.segment_size_mb * 1024 * 1024
+        )
+
+    def _repeats(self, timestamp: float) -> int:
+        # How many output frames this input covers when paced
+        if not self.paced:
+            return 1
+        if self._start_time is None:
+            self._start_time = timestamp
+        due = int((timestamp - self._start_time) * self.fps) + 1
+        return max(0, due - self.written_frames)
+
+    def _encode_loop(self) -> None:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    break
+                frame, timestamp = item
+
+                frame_size = (frame.shape[1], frame.shape[0])
+                for _ in range(self._repeats(timestamp)):
+                    # Resolution changes need a new file; so do full segments,
+                    # checked per output frame since one late paced input can
+                    # repeat for longer than a segment
+                    if self._writer is not None and (
+                        frame_size != self._frame_size or self._segment_full()
+                    ):
+                        self._close_segment()
+                    if self._writer is None:
+                        self._open_segment(frame_size)
+                    self._writer.write(frame)
+                    self._segment_frames += 1
+                    self.written_frames += 1
+        except Exception as e:  # noqa: BLE001 - reported via self.error
+            self.error = f"Video encoding failed: {e}"
+        finally:
+            self._close_segment()
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import yaml
+from ultralytics import YOLO
+
+from src.backends import OnnxRuntimeBackend, TorchBackend, create_backend
+from src.detection_agent import DetectionAgent
+from src.model_manager_agent import ModelManagerAgent
+
+
+@pytest.fixture(scope="module")
+def onnx_path(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("export")
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(
+        yaml.safe_dump({"model": {"export_dir": str(tmp_path / "models")}})
+    )
+    return ModelManagerAgent(str(config_path)).export_model("yolov8n.pt")
+
+
+@pytest.fixture
+def inputs():
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, 1, (2, 3, 256, 320)).astype(np.float32)
+
+
+def test_create_backend_dispatches_on_weights(onnx_path):
+    assert isinstance(create_backend(YOLO("yolov8n.pt")), TorchBackend)
+    assert isinstance(
+        create_backend(YOLO(str(onnx_path), task="detect")), OnnxRuntimeBackend
+    )
+
+
+def test_onnxruntime_matches_torch(onnx_path, inputs):
+    torch_backend = TorchBackend(YOLO("yolov8n.pt"))
+    ort_backend = OnnxRuntimeBackend(onnx_path)
+
+    expected = torch_backend(inputs)
+    output = ort_backend(inputs)
+
+    assert ort_backend.nc == torch_backend.nc == 80
+    assert ort_backend.end2end == torch_backend.end2end
+    assert len(ort_backend.names) == 80
+    assert output.shape == expected.shape
+    np.testing.assert_allclose(output, expected, rtol=1e-3, atol=1e-2)
+
+
+def test_torch_backend_accepts_channels_last_view(inputs):
+    backend = TorchBackend(YOLO("yolov8n.pt"))
+    nhwc = np.ascontiguousarray(inputs.transpose(0, 2, 3, 1)).transpose(0, 3, 1, 2)
+
+    np.testing.assert_allclose(backend(nhwc), backend(inputs), atol=1e-3)
+
+
+def test_detection_agent_on_onnxruntime(onnx_path):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    torch_agent = DetectionAgent("yolov8n.pt", 0.1, direct_inference=True)
+    torch_agent.load_model()
+    ort_agent = DetectionAgent("yolov8n.pt", 0.1, direct_inference=True)
+    ort_agent.model = YOLO(str(onnx_path), task="detect")
+
+    expected = torch_agent.detect(frame, columnar=True)
+    detections = ort_agent.detect(frame, columnar=True)
+
+    assert isinstance(ort_agent._inference_backend(), OnnxRuntimeBackend)
+    assert len(detections) == len(expected)
+    np.testing.assert_allclose(detections.xyxy, expected.xyxy, atol=1.0)
+    assert ort_agent.model_hash() != torch_agent.model_hash()
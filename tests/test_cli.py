@@ -0,0 +1,182 @@
+import argparse
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from src.cli import build_parser, collect_inputs, main, tile_config
+
+
+@pytest.fixture
+def media_dir(tmp_path):
+    media = tmp_path / "media"
+    media.mkdir()
+
+    writer = cv2.VideoWriter(
+        str(media / "clip.avi"), cv2.VideoWriter_fourcc(*"MJPG"), 10, (160, 120)
+    )
+    for i in range(6):
+        writer.write(np.full((120, 160, 3), i * 20, dtype=np.uint8))
+    writer.release()
+
+    for name in ("a.jpg", "b.png"):
+        cv2.imwrite(str(media / name), np.zeros((120, 160, 3), dtype=np.uint8))
+    (media / "notes.txt").write_text("not media")
+    return media
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    config = tmp_path / "config.yaml"
+    config.write_text(
+        'model:\n  name: "yolov8n.pt"\n  device: "cpu"\n' "motion:\n  enabled: false\n"
+    )
+    return config
+
+
+def test_collect_inputs_splits_videos_and_images(media_dir):
+    videos, images = collect_inputs([str(media_dir), str(media_dir / "*.jpg")])
+
+    assert videos == [media_dir / "clip.avi"]
+    assert images == [media_dir / "a.jpg", media_dir / "b.png"]
+
+
+def test_collect_inputs_ignores_missing(tmp_path):
+    assert collect_inputs([str(tmp_path / "missing*.mp4")]) == ([], [])
+
+
+def test_parser_leaves_config_defaults_unset():
+    args = build_parser().parse_args(["video.mp4", "--no-motion-gating"])
+
+    assert args.inputs == ["video.mp4"]
+    assert args.motion_gating is False
+    assert args.tiled is None
+    assert args.confidence is None
+    assert args.classes is None
+
+
+def test_main_without_inputs_fails(tmp_path, config_file):
+    assert main([str(tmp_path / "*.mp4"), "--config", str(config_file)]) == 1
+
+
+def test_main_writes_results(media_dir, config_file, tmp_path, capsys):
+    output_dir = tmp_path / "out"
+
+    exit_code = main(
+        [
+            str(media_dir),
+            "--config",
+            str(config_file),
+            "--output-dir",
+            str(output_dir),
+            "--save-annotated",
+        ]
+    )
+
+    assert exit_code == 0
+
+    frames = [
+        json.loads(line)
+        for line in (output_dir / "clip.jsonl").read_text().splitlines()
+    ]
+    assert [frame["frame"] for frame in frames] == list(range(6))
+    assert all(set(frame) == {"frame", "detections", "tracks"} for frame in frames)
+
+    images = [
+        json.loads(line)
+        for line in (output_dir / "images.jsonl").read_text().splitlines()
+    ]
+    assert [image["image"] for image in images] == [
+        str(media_dir / "a.jpg"),
+        str(media_dir / "b.png"),
+    ]
+    assert (output_dir / "clip_annotated.mp4").exists()
+    assert (output_dir / "a_annotated.jpg").exists()
+
+    output = capsys.readouterr().out
+    assert "Total: 8 frames" in output
+
+
+@pytest.mark.parametrize("flag", ["--save-annotated", "--watch-config", "--cache"])
+def test_workers_reject_unsupported_options(flag, capsys):
+    with pytest.raises(SystemExit):
+        main(["video.mp4", "--workers", "2", flag])
+
+    assert f"{flag} is not supported with --workers" in capsys.readouterr().err
+
+
+def test_workers_stitch_at_tracker_threshold(media_dir, tmp_path, monkeypatch):
+    config = tmp_path / "config.yaml"
+    config.write_text("tracking:\n  iou_threshold: 0.45\n")
+    calls = []
+
+    def fake_parallel(path, **kwargs):
+        calls.append(kwargs)
+        return []
+
+    monkeypatch.setattr("src.cli.process_video_parallel", fake_parallel)
+    main(
+        [
+            str(media_dir / "clip.avi"),
+            "--config",
+            str(config),
+            "--output-dir",
+            str(tmp_path / "out"),
+            "--workers",
+            "2",
+        ]
+    )
+
+    assert calls[0]["iou_threshold"] == 0.45
+
+
+def test_workers_skip_configured_cache(media_dir, tmp_path, monkeypatch, capsys):
+    config = tmp_path / "config.yaml"
+    cache_dir = tmp_path / "cache"
+    config.write_text(f"cache:\n  enabled: true\n  dir: {cache_dir}\n")
+    monkeypatch.setattr("src.cli.process_video_parallel", lambda path, **kw: [])
+
+    main(
+        [
+            str(media_dir / "clip.avi"),
+            "--config",
+            str(config),
+            "--output-dir",
+            str(tmp_path / "out"),
+            "--workers",
+            "2",
+        ]
+    )
+
+    assert "Detection cache is not used with --workers" in capsys.readouterr().err
+    assert not cache_dir.exists()
+
+
+def test_tile_config_parses_size_and_overlap():
+    assert tile_config("640") == (640, None)
+    assert tile_config("320:0.1") == (320, 0.1)
+    with pytest.raises(argparse.ArgumentTypeError):
+        tile_config("large")
+
+
+def test_main_benchmarks_tiling(media_dir, config_file, tmp_path, capsys):
+    exit_code = main(
+        [
+            str(media_dir / "a.jpg"),
+            "--config",
+            str(config_file),
+            "--output-dir",
+            str(tmp_path / "out"),
+            "--benchmark-tiling",
+            "640",
+            "64:0.5",
+        ]
+    )
+
+    output = capsys.readouterr().out
+    assert exit_code == 0
+    assert "a.jpg (160x120)" in output
+    assert "tile 640 overlap 0.20: 1 tiles" in output
+    assert "tile 64 overlap 0.50" in output
+    assert not (tmp_path / "out").exists()
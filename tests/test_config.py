@@ -0,0 +1,186 @@
+import os
+
+import pytest
+import yaml
+
+from src.config import ConfigSnapshot, ConfigWatcher
+from src.model_manager_agent import ModelManagerAgent
+
+
+@pytest.fixture
+def snapshot():
+    return ConfigSnapshot.from_dict(
+        {"model": {"name": "yolov8n.pt", "prefetch": ["a.pt"]}, "video": {"fps": 30}}
+    )
+
+
+@pytest.fixture
+def manager(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({"model": {"confidence_threshold": 0.5}}))
+    return ModelManagerAgent(str(config_path))
+
+
+def _write(path, config):
+    path.write_text(config if isinstance(config, str) else yaml.safe_dump(config))
+    # Make the change visible even within the filesystem's mtime resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_snapshot_lookups(snapshot):
+    assert snapshot.get("model.name") == "yolov8n.pt"
+    assert snapshot.get("video")["fps"] == 30
+    assert snapshot.get("model.missing", "default") == "default"
+    assert snapshot.get("model.name.extra") is None
+
+
+def test_snapshot_is_read_only(snapshot):
+    with pytest.raises(TypeError):
+        snapshot.get("video")["fps"] = 60
+    with pytest.raises(AttributeError):
+        snapshot.version = 2
+    assert snapshot.get("model.prefetch") == ("a.pt",)
+
+
+def test_snapshot_copies_source():
+    data = {"model": {"name": "yolov8n.pt"}}
+    snapshot = ConfigSnapshot.from_dict(data)
+
+    data["model"]["name"] = "yolov8s.pt"
+
+    assert snapshot.get("model.name") == "yolov8n.pt"
+
+
+def test_changed_keys(snapshot):
+    other = ConfigSnapshot.from_dict(
+        {"model": {"name": "yolov8s.pt", "prefetch": ["a.pt"]}, "ui": {"theme": "x"}}
+    )
+
+    assert other.changed_keys(snapshot) == {"model.name", "video.fps", "ui.theme"}
+    assert snapshot.changed_keys(snapshot) == set()
+
+
+def test_update_config_publishes_new_snapshot(manager):
+    old = manager.snapshot
+
+    manager.update_config("model.confidence_threshold", 0.7)
+
+    assert manager.snapshot.version == old.version + 1
+    assert old.get("model.confidence_threshold") == 0.5
+    assert manager.get_config_value("model.confidence_threshold") == 0.7
+
+
+def test_reload_config(manager):
+    _write(manager.config_path, {"model": {"confidence_threshold": 0.6}})
+
+    changed = manager.reload_config()
+
+    assert changed == {"model.confidence_threshold"}
+    assert manager.get_config_value("model.confidence_threshold") == 0.6
+    assert manager.config["model"]["confidence_threshold"] == 0.6
+
+
+def test_reload_keeps_config_on_parse_error(manager):
+    manager.config_path.write_text("model: [unclosed")
+
+    with pytest.raises(yaml.YAMLError):
+        manager.reload_config()
+    assert manager.get_config_value("model.confidence_threshold") == 0.5
+
+
+def test_watcher_reloads_changed_file(manager):
+    calls = []
+    watcher = ConfigWatcher(manager, on_change=calls.append)
+
+    assert watcher.check() == set()
+    _write(manager.config_path, {"model": {"confidence_threshold": 0.9}})
+
+    assert watcher.check() == {"model.confidence_threshold"}
+    assert calls == [{"model.confidence_threshold"}]
+    assert watcher.check() == set()
+    assert watcher.reloads == 1
+
+
+def test_watcher_survives_bad_file(manager):
+    watcher = ConfigWatcher(manager)
+
+    _write(manager.config_path, "model: [unclosed")
+    assert watcher.check() == set()
+    assert watcher.error is not None
+
+    _write(manager.config_path, {"model": {"confidence_threshold": 0.4}})
+    assert watcher.check() == {"model.confidence_threshold"}
+    assert watcher.error is None
+
+
+def test_watcher_thread_applies_changes(manager):
+    watcher = ConfigWatcher(manager, interval=0.01)
+    watcher.start()
+    try:
+        _write(manager.config_path, {"model": {"confidence_threshold": 0.3}})
+        for _ in range(200):
+            if watcher.reloads:
+                break
+            watcher._stop_event.wait(0.01)
+    finally:
+        watcher.stop()
+
+    assert manager.get_config_value("model.confidence_threshold") == 0.3
+
+
+def test_snapshot_coerces_typed_keys():
+    snapshot = ConfigSnapshot.from_dict(
+        {"video": {"frame_skip": "2"}, "model": {"confidence_threshold": 1}}
+    )
+
+    assert snapshot.get("video.frame_skip") == 2
+    assert isinstance(snapshot.get("model.confidence_threshold"), float)
+    assert snapshot.get("video")["frame_skip"] == 2
+
+
+@pytest.mark.parametrize(
+    "section, key, value",
+    [
+        ("tracking", "max_age", "30s"),
+        ("video", "frame_skip", 1.5),
+        ("motion", "enabled", "yes"),
+        ("model", "backend", "tensorrt"),
+        ("model", "precision", "int8"),
+    ],
+)
+def test_snapshot_rejects_bad_values(section, key, value):
+    with pytest.raises(ValueError, match=f"{section}.{key}"):
+        ConfigSnapshot.from_dict({section: {key: value}})
+
+
+def test_update_config_rejects_bad_value(manager):
+    with pytest.raises(ValueError):
+        manager.update_config("model.confidence_threshold", "high")
+
+    assert manager.config["model"]["confidence_threshold"] == 0.5
+    assert manager.get_config_value("model.confidence_threshold") == 0.5
+
+
+def test_watcher_keeps_snapshot_on_invalid_value(manager):
+    watcher = ConfigWatcher(manager)
+
+    _write(manager.config_path, {"model": {"confidence_threshold": "high"}})
+
+    assert watcher.check() == set()
+    assert "model.confidence_threshold" in watcher.error
+    assert manager.get_config_value("model.confidence_threshold") == 0.5
+
+
+def test_reload_rolls_back_when_apply_fails(manager):
+    old = manager.snapshot
+
+    def fail(changed):
+        raise RuntimeError("apply failed")
+
+    _write(manager.config_path, {"model": {"confidence_threshold": 0.9}})
+    with pytest.raises(RuntimeError):
+        manager.reload_config(fail)
+
+    assert manager.snapshot is old
+    assert manager.config["model"]["confidence_threshold"] == 0.5
@@ -1,7 +1,13 @@
+import cv2
 import numpy as np
 import pytest
+import torch
+from ultralytics.utils import ASSETS
+from ultralytics.utils.nms import non_max_suppression
 
 from src.detection_agent import DetectionAgent
+from src.detections import Detections
+from src.preprocessing import LetterboxInfo
 
 
 @pytest.fixture
@@ -77,3 +83,310 @@ def test_get_class_names_without_model():
     agent = DetectionAgent(model_path="yolov8n.pt")
     with pytest.raises(RuntimeError, match="Model not loaded"):
         agent.get_class_names()
+
+
+def test_detect_columnar(detection_agent, sample_frame):
+    detections = detection_agent.detect(sample_frame, columnar=True)
+    assert isinstance(detections, Detections)
+    assert detections.xyxy.shape == (len(detections), 4)
+    assert detections.to_dicts() == detection_agent.detect(sample_frame)
+
+
+def test_detect_batch_returns_per_frame_lists(detection_agent, sample_frame):
+    batch_detections = detection_agent.detect_batch([sample_frame] * 3)
+    assert isinstance(batch_detections, list)
+    assert len(batch_detections) == 3
+    for detections in batch_detections:
+        assert isinstance(detections, list)
+
+
+def test_detect_batch_splits_by_max_batch_size(detection_agent, sample_frame):
+    detection_agent.max_batch_size = 2
+    batch_detections = detection_agent.detect_batch([sample_frame] * 5)
+    assert len(batch_detections) == 5
+    assert detection_agent.detect_batch([]) == []
+
+
+def test_detect_batch_without_loaded_model(sample_frame):
+    agent = DetectionAgent(model_path="yolov8n.pt")
+    with pytest.raises(RuntimeError, match="Model not loaded"):
+        agent.detect_batch([sample_frame])
+
+
+def test_merge_regions_pads_grows_and_merges():
+    regions = np.array(
+        [
+            [100.0, 100.0, 110.0, 110.0],
+            [130.0, 100.0, 140.0, 110.0],
+            [500, 500, 600, 600],
+        ]
+    )
+    rects = DetectionAgent.merge_regions(regions, (720, 1280), padding=8, min_size=64)
+
+    # The two nearby regions overlap once grown and become one crop
+    assert rects.shape == (2, 4)
+    assert np.all(rects[:, 2:] - rects[:, :2] >= 64)
+    assert sorted(rects[:, 0].tolist()) == [73, 492]
+
+
+def test_merge_regions_stays_inside_frame():
+    rects = DetectionAgent.merge_regions(
+        np.array([[0.0, 0.0, 5.0, 5.0], [630.0, 470.0, 640.0, 480.0]]),
+        (480, 640),
+        padding=16,
+        min_size=96,
+    )
+
+    assert np.all(rects[:, :2] >= 0)
+    assert np.all(rects[:, 2] <= 640)
+    assert np.all(rects[:, 3] <= 480)
+    assert np.all(rects[:, 2:] - rects[:, :2] == 96)
+
+
+def test_merge_regions_empty():
+    assert DetectionAgent.merge_regions(np.empty((0, 4)), (480, 640)).shape == (0, 4)
+
+
+def test_detect_regions(detection_agent, sample_frame):
+    detections = detection_agent.detect_regions(
+        sample_frame, np.array([[10.0, 10.0, 60.0, 60.0]]), columnar=True
+    )
+    assert isinstance(detections, Detections)
+
+    empty = detection_agent.detect_regions(sample_frame, np.empty((0, 4)))
+    assert empty == []
+
+
+def test_detect_regions_falls_back_to_full_frame(detection_agent, sample_frame):
+    detection_agent.roi_max_coverage = 0.1
+    detections = detection_agent.detect_regions(
+        sample_frame, np.array([[0.0, 0.0, 400.0, 400.0]])
+    )
+    assert detections == detection_agent.detect(sample_frame)
+
+
+def test_tile_rects_cover_frame_with_overlap():
+    rects = DetectionAgent.tile_rects((2160, 3840), tile_size=640, tile_overlap=0.2)
+
+    assert np.all(rects[:, 2:] - rects[:, :2] == 640)
+    assert rects[:, 2].max() == 3840
+    assert rects[:, 3].max() == 2160
+    xs = np.unique(rects[:, 0])
+    assert np.all(np.diff(xs) <= 512)
+
+
+def test_tile_rects_small_frame_is_single_tile():
+    rects = DetectionAgent.tile_rects((480, 640), tile_size=640, tile_overlap=0.2)
+    assert rects.tolist() == [[0, 0, 640, 480]]
+
+
+def test_merge_detections_joins_object_across_tile_edge(detection_agent):
+    # Tiles [0, 640) and [512, 1152) both cut a person spanning x 400-700
+    rects = DetectionAgent.tile_rects((640, 1152), tile_size=640, tile_overlap=0.2)
+    assert rects[:, 0].tolist() == [0, 512]
+    parts = [
+        Detections([[400, 100, 640, 300]], [0.8], [0]),
+        Detections([[512, 100, 700, 300], [600, 400, 650, 450]], [0.7, 0.6], [0, 0]),
+    ]
+
+    merged = detection_agent._merge_detections(parts, max_det=None)
+
+    assert len(merged) == 2
+    np.testing.assert_allclose(
+        merged.xyxy, [[400, 100, 700, 300], [600, 400, 650, 450]]
+    )
+    assert merged.conf.tolist() == pytest.approx([0.8, 0.6])
+
+
+def test_detect_tiled(detection_agent):
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    detections = detection_agent.detect_tiled(frame, columnar=True, tile_size=320)
+    assert isinstance(detections, Detections)
+    assert isinstance(detection_agent.detect_tiled(frame, tile_size=320), list)
+
+
+def test_benchmark_tiling(detection_agent):
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    report = detection_agent.benchmark_tiling(frame, [(640, 0.2), (320, 0.1)], runs=1)
+
+    assert [entry["tile_size"] for entry in report] == [640, 320]
+    assert report[1]["tiles"] > report[0]["tiles"]
+    for entry in report:
+        assert entry["ms_per_frame"] > 0
+        assert entry["fps"] > 0
+
+
+def test_cache_params(detection_agent):
+    params = detection_agent.cache_params(["person", "car"])
+
+    assert params["confidence_threshold"] == 0.5
+    assert params["classes"] == ["car", "person"]
+    assert not params["tiled"]
+    assert "tile_size" not in params
+    assert detection_agent.cache_params(tiled=True)["tile_size"] == 640
+
+
+def test_cache_params_follow_inference_settings(detection_agent):
+    params = detection_agent.cache_params()
+
+    detection_agent.direct_inference = True
+    direct = detection_agent.cache_params()
+    detection_agent.imgsz, detection_agent.max_det = 320, 10
+    smaller = detection_agent.cache_params()
+
+    assert direct != params
+    assert direct["direct_inference"] is True
+    assert (smaller["imgsz"], smaller["max_det"]) == (320, 10)
+
+
+def test_model_hash_is_stable(detection_agent):
+    model_hash = detection_agent.model_hash()
+
+    assert len(model_hash) == 64
+    assert detection_agent.model_hash() == model_hash
+
+
+def test_rgb_channel_order_matches_bgr(detection_agent):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+    rgb_agent = DetectionAgent(
+        model_path="yolov8n.pt", confidence_threshold=0.01, channel_order="RGB"
+    )
+    rgb_agent.model = detection_agent.model
+    detection_agent.confidence_threshold = 0.01
+
+    bgr = detection_agent.detect(frame, columnar=True)
+    rgb = rgb_agent.detect(np.ascontiguousarray(frame[..., ::-1]), columnar=True)
+
+    np.testing.assert_allclose(rgb.xyxy, bgr.xyxy, atol=1e-3)
+    np.testing.assert_array_equal(rgb.class_id, bgr.class_id)
+
+
+def test_preprocess_uses_channel_order(detection_agent):
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    frame[..., 0] = 255
+
+    inputs, infos = detection_agent.preprocess([frame], imgsz=64)
+
+    # Blue in BGR lands in the last (B) plane of the RGB network input
+    assert inputs.shape == (1, 3, 64, 64)
+    assert inputs[0, 2].min() == 1.0 and inputs[0, 0].max() == 0.0
+    assert infos[0].orig_shape == (64, 64)
+
+
+@pytest.fixture
+def raw_prediction():
+    # Network output layout (4 + nc, anchors) with overlapping boxes
+    rng = np.random.default_rng(1)
+    n_anchors = 300
+    centers = rng.uniform(50, 590, (2, n_anchors))
+    sizes = rng.uniform(20, 120, (2, n_anchors))
+    scores = rng.uniform(0, 1, (3, n_anchors)) ** 4
+    return np.concatenate([centers, sizes, scores]).astype(np.float32)
+
+
+def test_direct_decode_matches_ultralytics_nms(detection_agent, raw_prediction):
+    info = LetterboxInfo(orig_shape=(640, 640), gain=(1.0, 1.0), pad=(0, 0))
+    detections = detection_agent._decode_output(
+        raw_prediction.copy(), info, None, max_det=50, nc=3, end2end=False
+    )
+
+    expected = non_max_suppression(
+        torch.from_numpy(raw_prediction)[None],
+        conf_thres=detection_agent.confidence_threshold,
+        iou_thres=detection_agent.nms_iou_threshold,
+        agnostic=True,
+        max_det=50,
+    )[0].numpy()
+    expected[:, :4] = expected[:, :4].clip(0, 640)
+
+    assert len(detections) == len(expected) > 0
+    np.testing.assert_allclose(detections.xyxy, expected[:, :4], atol=1e-3)
+    np.testing.assert_allclose(detections.conf, expected[:, 4], atol=1e-6)
+    np.testing.assert_array_equal(detections.class_id, expected[:, 5])
+
+
+def test_direct_decode_class_filter_and_max_det(detection_agent, raw_prediction):
+    info = LetterboxInfo(orig_shape=(640, 640), gain=(1.0, 1.0), pad=(0, 0))
+    detection_agent.confidence_threshold = 0.01
+
+    filtered = detection_agent._decode_output(
+        raw_prediction.copy(), info, [2], max_det=50, nc=3, end2end=False
+    )
+    capped = detection_agent._decode_output(
+        raw_prediction.copy(), info, None, max_det=5, nc=3, end2end=False
+    )
+
+    assert len(filtered) > 0
+    assert set(filtered.class_id.tolist()) == {2}
+    assert len(capped) == 5
+    assert np.all(np.diff(capped.conf) <= 0)
+
+
+def test_direct_decode_end2end(detection_agent):
+    info = LetterboxInfo(orig_shape=(320, 320), gain=(0.5, 0.5), pad=(0, 0))
+    prediction = np.array(
+        [[10, 10, 50, 50, 0.9, 0], [60, 60, 100, 100, 0.2, 1]], dtype=np.float32
+    )
+
+    detections = detection_agent._decode_output(
+        prediction, info, None, max_det=50, nc=80, end2end=True
+    )
+
+    assert len(detections) == 1
+    np.testing.assert_allclose(detections.xyxy, [[20, 20, 100, 100]])
+    assert detections.class_id.tolist() == [0]
+
+
+def test_direct_inference_matches_predictor(detection_agent):
+    # A real photo, in two aspect ratios, so there are detections to compare
+    image = cv2.imread(str(ASSETS / "bus.jpg"))
+    frames = [image, cv2.resize(image, (500, 360))]
+    direct_agent = DetectionAgent(
+        model_path="yolov8n.pt", confidence_threshold=0.1, direct_inference=True
+    )
+    direct_agent.model = detection_agent.model
+    detection_agent.confidence_threshold = 0.1
+
+    for frame in frames:
+        expected = detection_agent.detect(frame, columnar=True)
+        detections = direct_agent.detect(frame, columnar=True)
+
+        assert len(expected) > 0
+        assert len(detections) == len(expected)
+        np.testing.assert_allclose(detections.xyxy, expected.xyxy, atol=1.0)
+        np.testing.assert_allclose(detections.conf, expected.conf, atol=1e-3)
+        np.testing.assert_array_equal(detections.class_id, expected.class_id)
+
+    batch = direct_agent.detect_batch(frames)
+    assert [len(d) for d in batch] == [
+        len(detection_agent.detect(frame)) for frame in frames
+    ]
+
+
+def test_warm_up_records_latency(detection_agent):
+    warmup_time = detection_agent.warm_up(runs=1, imgsz=320)
+
+    assert warmup_time > 0
+    assert detection_agent.warmup_time == warmup_time
+    assert detection_agent.ready
+
+
+def test_start_warm_up_runs_in_background(detection_agent):
+    thread = detection_agent.start_warm_up(runs=1, imgsz=320)
+    thread.join(timeout=60)
+
+    assert detection_agent.ready
+    assert detection_agent.warmup_error is None
+    assert detection_agent.warmup_time > 0
+    # Inference after warm-up still works on the shared buffers
+    assert isinstance(detection_agent.detect(np.zeros((320, 320, 3), np.uint8)), list)
+
+
+def test_start_warm_up_reports_errors():
+    agent = DetectionAgent(model_path="yolov8n.pt")
+
+    agent.start_warm_up(runs=1, imgsz=64).join(timeout=10)
+
+    assert agent.ready
+    assert "Model not loaded" in agent.warmup_error
@@ -0,0 +1,218 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.detection_cache import DetectionCache, LRUCache, file_hash
+from src.detections import Detections
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DetectionCache(tmp_path / "cache")
+
+
+@pytest.fixture
+def frames():
+    names = {0: "person", 2: "car"}
+    return [
+        Detections(
+            np.array([[10, 10, 50, 50], [60, 60, 90, 90]], dtype=np.float32),
+            np.array([0.9, 0.6], dtype=np.float32),
+            np.array([0, 2]),
+            names,
+        ),
+        Detections.empty(names),
+        Detections(
+            np.array([[12, 11, 52, 51]], dtype=np.float32),
+            np.array([0.8], dtype=np.float32),
+            np.array([0]),
+            names,
+        ),
+    ]
+
+
+def test_file_hash_depends_on_content(tmp_path):
+    a = tmp_path / "a.bin"
+    b = tmp_path / "b.bin"
+    a.write_bytes(b"video")
+    b.write_bytes(b"video")
+
+    assert file_hash(a) == file_hash(b)
+
+    b.write_bytes(b"other")
+    assert file_hash(a) != file_hash(b)
+
+
+def test_cache_key_covers_params(cache):
+    params = {"confidence_threshold": 0.5, "classes": None}
+
+    key = cache.key("video", "model", params)
+
+    assert key == cache.key("video", "model", dict(params))
+    assert key != cache.key("video", "model", {**params, "confidence_threshold": 0.4})
+    assert key != cache.key("video", "other", params)
+    assert key != cache.key("other", "model", params)
+
+
+def test_cache_round_trip(cache, frames):
+    key = cache.key("video", "model", {})
+    assert cache.load(key) is None
+
+    writer = cache.writer(key, {"confidence_threshold": 0.5})
+    for detections in frames:
+        writer.append(detections)
+    writer.commit()
+
+    cached = cache.load(key)
+    assert len(cached) == 3
+    assert cached.meta["params"] == {"confidence_threshold": 0.5}
+    assert isinstance(cached.xyxy, np.memmap)
+
+    for original, loaded in zip(frames, cached):
+        np.testing.assert_array_equal(loaded.xyxy, original.xyxy)
+        np.testing.assert_array_equal(loaded.conf, original.conf)
+        np.testing.assert_array_equal(loaded.class_id, original.class_id)
+    assert cached[0].to_dicts()[1]["class_name"] == "car"
+
+
+def test_cache_records_skipped_frames(cache, frames):
+    writer = cache.writer("key", {})
+    writer.append(frames[0])
+    writer.append(None)
+    writer.append(frames[1])
+    cached = writer.commit()
+
+    assert len(cached) == 3
+    assert [cached.covers(i) for i in range(4)] == [True, False, True, False]
+    assert len(cached[1]) == 0
+    np.testing.assert_array_equal(cached[2].xyxy, frames[1].xyxy)
+
+
+def test_cache_out_of_range_frame_is_empty(cache, frames):
+    writer = cache.writer("key", {})
+    writer.append(frames[0])
+    cached = writer.commit()
+
+    assert len(cached[5]) == 0
+    assert cached[5].names == {0: "person", 2: "car"}
+
+
+def test_uncommitted_writer_leaves_no_entry(cache, frames):
+    writer = cache.writer("key", {})
+    writer.append(frames[0])
+
+    assert cache.load("key") is None
+    assert list(cache.cache_dir.iterdir()) == []
+
+
+def test_commit_keeps_existing_entry(cache, frames):
+    first = cache.writer("key", {})
+    first.append(frames[0])
+    first.commit()
+
+    second = cache.writer("key", {})
+    second.append(frames[2])
+    cached = second.commit()
+
+    assert len(cached[0]) == 2
+    assert [p.name for p in cache.cache_dir.iterdir()] == ["key"]
+
+
+def test_remove_and_clear(cache, frames):
+    for key in ("a", "b"):
+        writer = cache.writer(key, {})
+        writer.append(frames[0])
+        writer.commit()
+
+    cache.remove("a")
+    assert cache.load("a") is None
+    assert cache.load("b") is not None
+
+    cache.clear()
+    assert cache.load("b") is None
+
+
+def _write(cache, key, frames):
+    writer = cache.writer(key, {})
+    for detections in frames:
+        writer.append(detections)
+    return writer.commit()
+
+
+def test_cache_evicts_least_recently_used_videos(cache, frames):
+    _write(cache, "a", frames)
+    entry_size = sum(f.stat().st_size for f in (cache.cache_dir / "a").iterdir())
+    cache.max_bytes = 2 * entry_size
+    _write(cache, "b", frames)
+    # Make the order independent of the filesystem's timestamp resolution
+    os.utime(cache.cache_dir / "b" / "meta.json", ns=(0, 0))
+
+    assert cache.load("a") is not None
+    _write(cache, "c", frames)
+
+    assert sorted(path.name for path in cache.cache_dir.iterdir()) == ["a", "c"]
+
+
+def test_cache_keeps_new_entry_over_budget(cache, frames):
+    cache.max_bytes = 1
+    _write(cache, "a", frames)
+    _write(cache, "b", frames)
+
+    assert cache.load("a") is None
+    assert len(cache.load("b")) == 3
+
+
+def test_lru_cache_get_and_put():
+    lru = LRUCache(max_bytes=1024)
+    lru.put("a", np.zeros(10, dtype=np.uint8))
+
+    assert "a" in lru
+    assert lru.get("a").shape == (10,)
+    assert lru.get("missing") is None
+    assert (lru.hits, lru.misses) == (1, 1)
+    assert lru.nbytes == 10
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = LRUCache(max_bytes=300)
+    for key in ("a", "b", "c"):
+        lru.put(key, np.zeros(100, dtype=np.uint8))
+    lru.get("a")
+
+    lru.put("d", np.zeros(100, dtype=np.uint8))
+
+    assert "b" not in lru
+    assert all(key in lru for key in ("a", "c", "d"))
+    assert lru.nbytes == 300
+
+
+def test_lru_cache_counts_detections_and_skips_oversized(frames):
+    lru = LRUCache(max_bytes=100)
+    lru.put("detections", frames[0])
+    lru.put("image", np.zeros(1000, dtype=np.uint8))
+
+    assert lru.nbytes == frames[0].xyxy.nbytes + 2 * 4 + 2 * 8
+    assert "image" not in lru
+
+
+def test_lru_cache_replace_updates_size():
+    lru = LRUCache(max_bytes=1000)
+    lru.put("a", np.zeros(100, dtype=np.uint8))
+    lru.put("a", np.zeros(50, dtype=np.uint8))
+
+    assert len(lru) == 1
+    assert lru.nbytes == 50
+
+    lru.clear()
+    assert len(lru) == 0
+    assert lru.nbytes == 0
+
+
+def test_lru_cache_explicit_size():
+    lru = LRUCache(max_bytes=100)
+    lru.put("a", object(), nbytes=60)
+    lru.put("b", object(), nbytes=60)
+
+    assert "a" not in lru
+    assert lru.nbytes == 60
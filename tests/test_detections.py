@@ -0,0 +1,114 @@
+import numpy as np
+
+from src.detections import Detections, merge_crop_boxes, nms_indices
+
+
+def sample_detections():
+    return Detections(
+        xyxy=[[0.0, 0.0, 10.0, 10.0], [20.0, 20.0, 40.0, 40.0]],
+        conf=[0.9, 0.6],
+        class_id=[0, 2],
+        names={0: "person", 2: "car"},
+    )
+
+
+def test_detections_array_layout():
+    detections = sample_detections()
+    assert detections.xyxy.shape == (2, 4)
+    assert detections.xyxy.dtype == np.float32
+    assert detections.xyxy.flags["C_CONTIGUOUS"]
+    assert detections.conf.shape == (2,)
+    assert detections.class_id.shape == (2,)
+    assert len(detections) == 2
+
+
+def test_detections_class_name_is_lazy():
+    detections = sample_detections()
+    assert detections._class_name is None
+    assert list(detections.class_name) == ["person", "car"]
+    assert detections.class_name is detections.class_name
+
+
+def test_detections_empty():
+    detections = Detections.empty({0: "person"})
+    assert len(detections) == 0
+    assert not detections
+    assert detections.xyxy.shape == (0, 4)
+    assert detections.to_dicts() == []
+
+
+def test_detections_dict_view():
+    detections = sample_detections()
+    detection = detections[1]
+    assert detection["bbox"] == [20.0, 20.0, 40.0, 40.0]
+    assert detection["class_id"] == 2
+    assert detection["class_name"] == "car"
+    assert isinstance(detection["confidence"], float)
+    assert [d["class_name"] for d in detections] == ["person", "car"]
+
+
+def test_detections_from_dicts_round_trip():
+    dicts = [
+        {
+            "bbox": [1.0, 2.0, 3.0, 4.0],
+            "confidence": 0.5,
+            "class_id": 1,
+            "class_name": "bicycle",
+        }
+    ]
+    detections = Detections.from_dicts(dicts)
+    assert detections.names == {1: "bicycle"}
+    assert detections.to_dicts() == dicts
+
+
+def test_detections_select():
+    detections = sample_detections()
+    selected = detections.select(detections.conf > 0.7)
+    assert len(selected) == 1
+    assert selected[0]["class_name"] == "person"
+
+
+def test_detections_concatenate():
+    detections = Detections.concatenate(
+        [sample_detections(), sample_detections().select(slice(0, 1))]
+    )
+    assert len(detections) == 3
+    assert detections.names == {0: "person", 2: "car"}
+    assert len(Detections.concatenate([])) == 0
+
+
+def test_nms_indices_suppresses_overlaps():
+    boxes = np.array(
+        [
+            [0.0, 0.0, 10.0, 10.0],
+            [1.0, 1.0, 11.0, 11.0],
+            [50.0, 50.0, 60.0, 60.0],
+        ]
+    )
+    scores = np.array([0.6, 0.9, 0.5])
+
+    keep = nms_indices(boxes, scores, iou_threshold=0.5)
+    assert keep.tolist() == [1, 2]
+
+    keep = nms_indices(boxes, scores, iou_threshold=0.9)
+    assert keep.tolist() == [1, 0, 2]
+
+
+def test_merge_crop_boxes_fuses_parts_from_other_crops():
+    boxes = np.array(
+        [
+            [400.0, 100.0, 640.0, 300.0],  # left part, crop 0
+            [512.0, 100.0, 700.0, 300.0],  # right part, crop 1
+            [520.0, 150.0, 560.0, 200.0],  # other class inside, crop 1
+            [420.0, 120.0, 460.0, 160.0],  # same class inside, same crop
+        ]
+    )
+    scores = np.array([0.8, 0.7, 0.6, 0.5])
+
+    keep, fused = merge_crop_boxes(
+        boxes, scores, np.array([0, 0, 2, 0]), np.array([0, 1, 1, 0]), 0.5
+    )
+
+    assert keep.tolist() == [0, 2, 3]
+    np.testing.assert_allclose(fused[0], [400, 100, 700, 300])
+    np.testing.assert_allclose(fused[1:], boxes[2:])
@@ -0,0 +1,59 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("torch", "ultralytics", "onnxruntime")
+
+
+def _import_in_subprocess(module: str) -> dict:
+    # A fresh interpreter, so modules imported by other tests do not count
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, "
+        "'modules': sorted(m for m in sys.modules if '.' not in m)}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=120,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "src.tracking_agent",
+        "src.label_agent",
+        "src.detection_agent",
+        "src.model_manager_agent",
+        "src.pipeline",
+        "src.cli",
+    ],
+)
+def test_agents_do_not_import_frameworks(module):
+    modules = _import_in_subprocess(module)["modules"]
+
+    assert not set(HEAVY_MODULES) & set(modules)
+
+
+def test_tracking_agent_defers_scipy():
+    assert "scipy" not in _import_in_subprocess("src.tracking_agent")["modules"]
+
+
+def test_pipeline_imports_faster_than_ultralytics():
+    # Relative to the framework itself rather than a wall-clock budget, so a
+    # slow machine does not make this flaky
+    pipeline = _import_in_subprocess("src.pipeline")["seconds"]
+    ultralytics = _import_in_subprocess("ultralytics")["seconds"]
+
+    assert pipeline < ultralytics / 2
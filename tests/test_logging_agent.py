@@ -125,3 +125,14 @@ def test_multiple_metric_operations(logging_agent):
     assert logging_agent.get_metric("frame_count") == 2
     assert logging_agent.get_metric("fps") == 30.0
     assert logging_agent.get_metric("detection_count") == 5
+
+
+def test_log_model_load_tracks_pool_metrics(logging_agent):
+    stats = {"models": 1, "hits": 1, "misses": 1}
+    logging_agent.log_model_load("yolov8n.pt", 1.5)
+    logging_agent.log_model_load("yolov8n.pt", 0.001, cache_hit=True, stats=stats)
+
+    assert logging_agent.get_metric("model_cache_misses") == 1
+    assert logging_agent.get_metric("model_cache_hits") == 1
+    assert logging_agent.get_metric("model_load_time") == 1.5
+    assert logging_agent.get_metric("model_pool") == stats
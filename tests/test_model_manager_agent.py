@@ -1,8 +1,10 @@
 from pathlib import Path
 
 import pytest
+import yaml
 
-from src.model_manager_agent import ModelManagerAgent
+from src.logging_agent import LoggingAgent
+from src.model_manager_agent import ModelManagerAgent, model_nbytes
 
 
 @pytest.fixture
@@ -87,3 +89,108 @@ def test_get_available_models():
     manager = ModelManagerAgent()
     models = manager.get_available_models()
     assert isinstance(models, list)
+
+
+@pytest.fixture
+def export_manager(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(
+        yaml.safe_dump({"model": {"export_dir": str(tmp_path / "models")}})
+    )
+    return ModelManagerAgent(str(config_path))
+
+
+def test_export_model_is_cached(export_manager, tmp_path):
+    artifact = export_manager.export_model("yolov8n.pt")
+    mtime = artifact.stat().st_mtime_ns
+
+    assert artifact.parent == tmp_path / "models"
+    assert artifact.suffix == ".onnx"
+    assert "-640-opset17" in artifact.name
+    assert export_manager.export_model("yolov8n.pt") == artifact
+    assert artifact.stat().st_mtime_ns == mtime
+    assert export_manager.export_model("yolov8n.pt", imgsz=320) != artifact
+
+
+def test_load_model_onnxruntime_backend(export_manager):
+    model = export_manager.load_model("yolov8n.pt", backend="onnxruntime")
+
+    assert export_manager.backend == "onnxruntime"
+    assert str(model.model).endswith(".onnx")
+    assert export_manager.model_name == "yolov8n.pt"
+
+
+def test_load_model_unknown_backend(model_manager):
+    with pytest.raises(ValueError, match="Unknown backend"):
+        model_manager.load_model(backend="tensorflow")
+
+
+def test_model_pool_reuses_loaded_models(model_manager):
+    first = model_manager.load_model("yolov8n.pt")
+    again = model_manager.load_model("yolov8n.pt")
+
+    assert again is first
+    assert model_manager.models.hits == 1
+    assert model_manager.models.misses == 1
+    assert model_manager.load_model("yolov8n.pt", device="cuda") is not first
+    assert len(model_manager.models) == 2
+
+
+def test_model_pool_evicts_over_budget(model_manager):
+    model = model_manager.load_model("yolov8n.pt")
+    size = model_nbytes(model)
+    model_manager.models.max_bytes = int(size * 1.5)
+
+    model_manager.load_model("yolov8n.pt", device="cuda")
+
+    assert len(model_manager.models) == 1
+    assert model_manager.models.nbytes == size
+    assert model_manager.load_model("yolov8n.pt") is not model
+
+
+def test_model_nbytes_counts_parameters(model_manager):
+    model = model_manager.load_model("yolov8n.pt")
+
+    # yolov8n has about 3.2M float32 parameters
+    assert 10e6 < model_nbytes(model) < 16e6
+
+
+def test_load_model_reports_to_logging_agent(tmp_path):
+    logging_agent = LoggingAgent(log_dir=str(tmp_path), log_to_file=False)
+    manager = ModelManagerAgent(logging_agent=logging_agent)
+
+    manager.load_model("yolov8n.pt")
+    manager.load_model("yolov8n.pt")
+
+    assert logging_agent.get_metric("model_cache_misses") == 1
+    assert logging_agent.get_metric("model_cache_hits") == 1
+    assert logging_agent.get_metric("model_load_time") > 0
+    assert logging_agent.get_metric("model_pool")["models"] == 1
+
+
+def test_load_model_unknown_precision(model_manager):
+    with pytest.raises(ValueError, match="Unknown precision"):
+        model_manager.load_model(precision="fp8")
+
+
+def test_prefetch_fills_pool_without_switching(model_manager):
+    model_manager.load_model("yolov8n.pt")
+    current = model_manager.get_model()
+
+    model_manager.start_prefetch(["yolov8n.pt"]).join(timeout=60)
+    model_manager.prefetch(["yolov8n.pt"])
+
+    assert model_manager.get_model() is current
+    assert model_manager.models.hits == 2
+    assert model_manager.prefetch_errors == {}
+
+
+def test_prefetch_defaults_to_config(tmp_path):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump({"model": {"prefetch": ["yolov8n.pt"]}}))
+    manager = ModelManagerAgent(str(config_path))
+
+    manager.prefetch()
+
+    assert len(manager.models) == 1
+    assert manager.current_model is None
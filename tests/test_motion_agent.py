@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from src.motion_agent import MotionAgent
+
+
+@pytest.fixture
+def motion_agent():
+    return MotionAgent(max_gap=5)
+
+
+@pytest.fixture
+def static_frame():
+    return np.full((480, 640, 3), 80, dtype=np.uint8)
+
+
+def test_motion_agent_initialization():
+    agent = MotionAgent(downscale_width=120, max_gap=10)
+    assert agent.downscale_width == 120
+    assert agent.max_gap == 10
+    assert agent.reference is None
+    assert agent.frames_since_detection == 0
+
+
+def test_first_frame_triggers_detection(motion_agent, static_frame):
+    assert motion_agent.should_detect(static_frame)
+    assert motion_agent.reference is not None
+    assert motion_agent.reference.shape[1] == motion_agent.downscale_width
+
+
+def test_static_scene_skips_detection(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+
+    for _ in range(3):
+        assert not motion_agent.should_detect(static_frame.copy())
+
+    assert motion_agent.changed_fraction == 0.0
+    assert motion_agent.frames_since_detection == 3
+
+
+def test_motion_triggers_detection(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+
+    moved = static_frame.copy()
+    moved[100:200, 100:200] = 255
+    assert motion_agent.should_detect(moved)
+    assert motion_agent.motion_mask.any()
+    assert motion_agent.frames_since_detection == 0
+
+
+def test_max_gap_forces_refresh(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+
+    decisions = [motion_agent.should_detect(static_frame) for _ in range(6)]
+    assert decisions == [False] * 5 + [True]
+
+
+def test_small_noise_is_ignored(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+
+    noisy = static_frame.copy()
+    noisy[240, 320] = 255
+    assert not motion_agent.should_detect(noisy)
+
+
+def test_resolution_change_triggers_detection(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+    assert motion_agent.should_detect(np.full((720, 1280, 3), 80, dtype=np.uint8))
+
+
+def test_reset(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+    motion_agent.reset()
+
+    assert motion_agent.reference is None
+    assert motion_agent.should_detect(static_frame)
+
+
+def test_forced_flag(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+    assert motion_agent.forced
+
+    moved = static_frame.copy()
+    moved[100:200, 100:200] = 255
+    motion_agent.should_detect(moved)
+    assert not motion_agent.forced
+
+
+def test_motion_regions_in_frame_coordinates(motion_agent, static_frame):
+    motion_agent.should_detect(static_frame)
+
+    moved = static_frame.copy()
+    moved[100:200, 300:400] = 255
+    motion_agent.should_detect(moved)
+    regions = motion_agent.motion_regions(moved.shape)
+
+    assert regions.shape == (1, 4)
+    x1, y1, x2, y2 = regions[0]
+    assert x1 <= 300 and y1 <= 100 and x2 >= 400 and y2 >= 200
+    assert x2 - x1 < 200 and y2 - y1 < 200
+
+
+def test_motion_regions_empty_without_motion(motion_agent, static_frame):
+    assert motion_agent.motion_regions(static_frame.shape).shape == (0, 4)
+    motion_agent.should_detect(static_frame)
+    motion_agent.should_detect(static_frame)
+    assert motion_agent.motion_regions(static_frame.shape).shape == (0, 4)
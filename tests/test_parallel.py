@@ -0,0 +1,118 @@
+import itertools
+
+import cv2
+import numpy as np
+import pytest
+
+from src.detection_agent import DetectionAgent
+from src.parallel import (
+    apply_settings,
+    plan_chunks,
+    process_video_parallel,
+    processor_settings,
+    stitch_chunks,
+)
+from src.pipeline import FrameProcessor
+from src.tracking_agent import TrackingAgent
+
+
+def make_track(track_id, x, class_id=0):
+    return {
+        "track_id": track_id,
+        "bbox": [x, 10.0, x + 40.0, 50.0],
+        "confidence": 0.9,
+        "class_id": class_id,
+        "class_name": "person",
+        "hits": 3,
+        "age": 0,
+    }
+
+
+def make_chunk(start, end, read_start, tracks_for_frame):
+    return {
+        "read_start": read_start,
+        "start": start,
+        "end": end,
+        "frames": [
+            {"frame": f, "detections": [], "tracks": tracks_for_frame(f)}
+            for f in range(read_start, end)
+        ],
+    }
+
+
+@pytest.fixture
+def video_path(tmp_path):
+    path = tmp_path / "clip.avi"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, (160, 120))
+    for i in range(16):
+        writer.write(np.full((120, 160, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_plan_chunks_covers_all_frames():
+    chunks = plan_chunks(100, 4, overlap=5)
+
+    assert len(chunks) == 4
+    assert chunks[0] == (0, 0, 25)
+    assert chunks[1] == (20, 25, 50)
+    assert chunks[-1][2] == 100
+    assert all(prev[2] == cur[1] for prev, cur in itertools.pairwise(chunks))
+
+
+def test_plan_chunks_limits_short_videos():
+    assert len(plan_chunks(30, 8, overlap=10)) == 1
+    assert plan_chunks(0, 4) == []
+
+
+def test_stitch_chunks_keeps_ids_across_boundary():
+    # One object moving right, tracked as ID 1 in the first chunk and ID 7 in
+    # the second; a new object appears only in the second chunk
+    first = make_chunk(0, 10, 0, lambda f: [make_track(1, 2.0 * f)])
+    second = make_chunk(
+        10,
+        20,
+        6,
+        lambda f: [make_track(7, 2.0 * f)]
+        + ([make_track(8, 100.0)] if f >= 15 else []),
+    )
+
+    frames = stitch_chunks([second, first])
+
+    assert [record["frame"] for record in frames] == list(range(20))
+    moving_ids = {record["tracks"][0]["track_id"] for record in frames}
+    assert moving_ids == {1}
+    assert frames[-1]["tracks"][1]["track_id"] == 2
+
+
+def test_stitch_chunks_does_not_match_other_classes():
+    first = make_chunk(0, 10, 0, lambda f: [make_track(1, 0.0, class_id=0)])
+    second = make_chunk(10, 20, 6, lambda f: [make_track(1, 0.0, class_id=2)])
+
+    frames = stitch_chunks([first, second])
+
+    assert frames[9]["tracks"][0]["track_id"] == 1
+    assert frames[10]["tracks"][0]["track_id"] == 2
+
+
+def test_settings_round_trip():
+    source = FrameProcessor(DetectionAgent("yolov8n.pt"), TrackingAgent())
+    source.class_filter = ["car"]
+    source.frame_skip = 2
+    source.detection_agent.confidence_threshold = 0.7
+
+    target = FrameProcessor(DetectionAgent("yolov8n.pt"), TrackingAgent())
+    apply_settings(target, processor_settings(source))
+
+    assert target.class_filter == ["car"]
+    assert target.frame_skip == 2
+    assert target.detection_agent.confidence_threshold == 0.7
+
+
+def test_process_video_parallel(video_path):
+    frames = process_video_parallel(
+        str(video_path), workers=2, overlap=3, settings={"motion_gating": False}
+    )
+
+    assert [record["frame"] for record in frames] == list(range(16))
+    assert all(set(record) == {"frame", "detections", "tracks"} for record in frames)
@@ -0,0 +1,525 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+import yaml
+
+from src.detection_agent import DetectionAgent
+from src.detection_cache import DetectionCache, LRUCache
+from src.detections import Detections
+from src.model_manager_agent import ModelManagerAgent
+from src.motion_agent import MotionAgent
+from src.pipeline import (
+    FrameProcessor,
+    LatestQueue,
+    VideoFilePipeline,
+    WebcamPipeline,
+    draw_detections,
+)
+from src.tracking_agent import TrackingAgent
+
+
+class FakeCapture:
+    def __init__(self, n_frames=None, delay=0.0):
+        self.n_frames = n_frames
+        self.delay = delay
+        self.reads = 0
+
+    def read(self):
+        if self.n_frames is not None and self.reads >= self.n_frames:
+            return False, None
+        self.reads += 1
+        time.sleep(self.delay)
+        return True, np.full((120, 160, 3), self.reads % 255, dtype=np.uint8)
+
+
+class FakeWriter:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.frames = []
+
+    def write(self, frame):
+        if self.fail:
+            raise OSError("disk full")
+        self.frames.append(frame)
+
+
+@pytest.fixture
+def detection_agent():
+    agent = DetectionAgent(
+        model_path="yolov8n.pt", confidence_threshold=0.5, device="cpu"
+    )
+    agent.load_model()
+    return agent
+
+
+@pytest.fixture
+def processor(detection_agent):
+    return FrameProcessor(detection_agent, TrackingAgent(), MotionAgent())
+
+
+@pytest.fixture
+def sample_detections():
+    return Detections(
+        np.array([[10, 10, 50, 50]], dtype=np.float32),
+        np.array([0.9], dtype=np.float32),
+        np.array([0]),
+        {0: "person"},
+    )
+
+
+def test_latest_queue_drops_oldest():
+    queue = LatestQueue(maxsize=2)
+    for i in range(5):
+        queue.put(i)
+
+    assert len(queue) == 2
+    assert queue.dropped == 3
+    assert queue.get() == 3
+    assert queue.get() == 4
+    assert queue.get(timeout=0.01) is None
+
+
+def test_latest_queue_get_wakes_on_put():
+    queue = LatestQueue()
+    threading.Timer(0.05, queue.put, args=("frame",)).start()
+
+    assert queue.get(timeout=2.0) == "frame"
+
+
+def _manager(tmp_path, config):
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(config))
+    model_manager = ModelManagerAgent(str(config_path))
+    model_manager.load_model()
+    return model_manager
+
+
+def test_frame_processor_from_config(tmp_path):
+    model_manager = _manager(
+        tmp_path,
+        {
+            "model": {"batch_size": 8, "direct_inference": True},
+            "tracking": {"assignment": "hungarian", "motion_model": "kalman"},
+            "motion": {"enabled": True, "max_gap": 30},
+        },
+    )
+
+    processor = FrameProcessor.from_config(model_manager)
+
+    assert processor.detection_agent.model is model_manager.get_model()
+    assert processor.detection_agent.max_batch_size == 8
+    assert processor.detection_agent.direct_inference is True
+    assert processor.tracking_agent.assignment == "hungarian"
+    assert processor.tracking_agent.motion_model == "kalman"
+    assert processor.motion_agent.max_gap == 30
+    assert processor.motion_gating is True
+    assert processor.tiled_inference is False
+    assert processor.detection_agent.warmup_time is None
+
+
+def test_frame_processor_defaults_to_predictor(tmp_path):
+    processor = FrameProcessor.from_config(_manager(tmp_path, {}))
+
+    assert processor.detection_agent.direct_inference is False
+
+
+def test_frame_processor_from_config_warms_up(tmp_path):
+    model_manager = _manager(tmp_path, {"model": {"warmup": True}})
+
+    processor = FrameProcessor.from_config(model_manager, warm_up=True)
+    detection_agent = processor.detection_agent
+    detection_agent._ready.wait(timeout=60)
+
+    assert detection_agent.ready
+    assert detection_agent.warmup_error is None
+    assert detection_agent.warmup_time > 0
+
+
+@pytest.fixture
+def configured(tmp_path):
+    config = {
+        "model": {"name": "yolov8n.pt", "confidence_threshold": 0.5},
+        "tracking": {"max_age": 30, "min_hits": 3, "assignment": "greedy"},
+        "video": {"frame_skip": 0},
+    }
+    model_manager = _manager(tmp_path, config)
+    return model_manager, FrameProcessor.from_config(model_manager), config
+
+
+def _edit(model_manager, config, section, key, value):
+    config[section][key] = value
+    model_manager.config_path.write_text(yaml.safe_dump(config))
+    return model_manager.reload_config()
+
+
+def test_apply_config_updates_running_agents(configured):
+    model_manager, processor, config = configured
+    model = processor.detection_agent.model
+
+    _edit(model_manager, config, "model", "confidence_threshold", 0.8)
+    _edit(model_manager, config, "tracking", "max_age", 5)
+    changed = _edit(model_manager, config, "video", "frame_skip", 2)
+    reloaded = processor.apply_config(model_manager)
+
+    assert changed == {"video.frame_skip"}
+    assert reloaded is False
+    assert processor.detection_agent.confidence_threshold == 0.8
+    assert processor.tracking_agent.max_age == 5
+    assert processor.frame_skip == 2
+    assert processor.detection_agent.model is model
+
+
+def test_apply_config_only_touches_changed_keys(configured):
+    model_manager, processor, config = configured
+    processor.detection_agent.confidence_threshold = 0.2  # e.g. from the CLI
+
+    changed = _edit(model_manager, config, "tracking", "min_hits", 1)
+    processor.apply_config(model_manager, changed)
+
+    assert processor.tracking_agent.min_hits == 1
+    assert processor.detection_agent.confidence_threshold == 0.2
+
+
+def test_apply_config_reloads_model_on_name_change(configured):
+    model_manager, processor, config = configured
+    model = processor.detection_agent.model
+
+    changed = _edit(model_manager, config, "model", "name", "./yolov8n.pt")
+    reloaded = processor.apply_config(model_manager, changed)
+
+    assert reloaded is True
+    assert processor.detection_agent.model is not model
+    assert processor.detection_agent.model is model_manager.get_model()
+    assert str(processor.detection_agent.model_path) == "yolov8n.pt"
+
+
+def test_reload_rejects_unknown_assignment(configured):
+    model_manager, _, config = configured
+    _edit(model_manager, config, "tracking", "assignment", "hungarian")
+
+    with pytest.raises(ValueError):
+        _edit(model_manager, config, "tracking", "assignment", "auction")
+    assert model_manager.get_config_value("tracking.assignment") == "hungarian"
+
+
+def test_reload_applies_motion_model(configured):
+    model_manager, processor, config = configured
+    config["tracking"]["motion_model"] = "kalman"
+    model_manager.config_path.write_text(yaml.safe_dump(config))
+
+    model_manager.reload_config(lambda c: processor.apply_config(model_manager, c))
+
+    assert processor.tracking_agent.motion_model == "kalman"
+    assert processor.tracking_agent.kalman_filter is not None
+
+
+def test_reload_coerces_live_settings(configured):
+    model_manager, processor, config = configured
+    config["tracking"]["max_age"] = "12"
+    model_manager.config_path.write_text(yaml.safe_dump(config))
+
+    model_manager.reload_config(lambda c: processor.apply_config(model_manager, c))
+
+    assert processor.tracking_agent.max_age == 12
+
+
+def test_failed_apply_rolls_back_reload(configured, monkeypatch):
+    model_manager, processor, config = configured
+    snapshot = model_manager.snapshot
+
+    def fail(*args, **kwargs):
+        raise FileNotFoundError("missing.pt")
+
+    monkeypatch.setattr(model_manager, "load_model", fail)
+    config["model"]["name"] = "missing.pt"
+    config["video"]["frame_skip"] = 4
+    model_manager.config_path.write_text(yaml.safe_dump(config))
+
+    with pytest.raises(FileNotFoundError):
+        model_manager.reload_config(lambda c: processor.apply_config(model_manager, c))
+
+    assert model_manager.snapshot is snapshot
+    assert model_manager.get_config_value("model.name") == "yolov8n.pt"
+    assert processor.frame_skip == 0
+
+
+def test_frame_processor_plan_frame_skip():
+    processor = FrameProcessor(DetectionAgent("yolov8n.pt"), TrackingAgent())
+    processor.frame_skip = 2
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+
+    runs = [processor.plan(frame, i)[0] for i in range(6)]
+
+    assert runs == [True, False, False, True, False, False]
+
+
+def test_frame_processor_batchable():
+    processor = FrameProcessor(DetectionAgent("yolov8n.pt"), TrackingAgent())
+
+    assert processor.batchable((True, None))
+    assert not processor.batchable((False, None))
+    assert not processor.batchable((True, np.zeros((1, 4))))
+
+    processor.tiled_inference = True
+    assert not processor.batchable((True, None))
+
+
+def test_frame_processor_step_uses_given_detections(sample_detections):
+    processor = FrameProcessor(DetectionAgent("yolov8n.pt"), TrackingAgent(min_hits=1))
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+
+    detections, tracks = processor.step(frame, sample_detections, plan=(True, None))
+
+    assert detections is sample_detections
+    assert len(tracks) == 1
+    assert processor.frame_count == 1
+
+    # Skipped frames reuse the last detections and keep the tracks alive
+    detections, tracks = processor.step(frame, plan=(False, None))
+    assert detections is sample_detections
+    assert len(tracks) == 1
+    assert processor.frame_count == 2
+
+
+def test_frame_processor_process(processor):
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+
+    annotated, detections, _ = processor.process(frame, plan=(True, None))
+
+    assert annotated.shape == frame.shape
+    assert isinstance(detections, Detections)
+    assert processor.frame_count == 1
+
+
+def test_frame_processor_reset(sample_detections):
+    processor = FrameProcessor(DetectionAgent("yolov8n.pt"), TrackingAgent(min_hits=1))
+    processor.step(np.zeros((64, 64, 3), dtype=np.uint8), sample_detections)
+
+    processor.reset()
+
+    assert processor.frame_count == 0
+    assert processor.last_detections == []
+    assert len(processor.tracking_agent.tracks) == 0
+
+
+def test_draw_detections_does_not_modify_input():
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    tracks = [
+        {
+            "track_id": 1,
+            "bbox": [10, 30, 60, 80],
+            "class_name": "person",
+            "confidence": 0.9,
+        }
+    ]
+
+    annotated = draw_detections(frame, [], tracks)
+
+    assert frame.sum() == 0
+    assert annotated.sum() > 0
+
+
+def test_webcam_pipeline_produces_results(processor):
+    pipeline = WebcamPipeline(FakeCapture(delay=0.01), processor)
+    pipeline.start()
+
+    deadline = time.time() + 30
+    while pipeline.latest() is None and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+
+    result = pipeline.latest()
+    assert result is not None
+    assert result["annotated_frame"].shape == (120, 160, 3)
+    assert result["latency"] >= result["inference_time"]
+    assert isinstance(result["tracks"], list)
+    assert pipeline.processed_frames >= 1
+    assert not pipeline.running
+    assert pipeline.error is None
+
+
+def test_webcam_pipeline_writes_annotated_frames(processor):
+    writer = FakeWriter()
+    pipeline = WebcamPipeline(FakeCapture(delay=0.01), processor, writer=writer)
+    pipeline.start()
+
+    deadline = time.time() + 30
+    while pipeline.processed_frames < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+
+    assert len(writer.frames) == pipeline.processed_frames
+    assert writer.frames[0].shape == (120, 160, 3)
+
+
+def test_webcam_pipeline_reports_capture_failure(processor):
+    pipeline = WebcamPipeline(FakeCapture(n_frames=0), processor)
+    pipeline.start()
+
+    deadline = time.time() + 5
+    while pipeline.error is None and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+
+    assert pipeline.error == "Failed to read from webcam"
+    assert pipeline.captured_frames == 0
+
+
+def test_video_file_pipeline_processes_all_frames_in_order(processor):
+    writer = FakeWriter()
+    pipeline = VideoFilePipeline(FakeCapture(n_frames=12), processor, writer=writer)
+    pipeline.start()
+
+    results = list(pipeline.results())
+    pipeline.stop()
+
+    assert [r["frame_index"] for r in results] == list(range(12))
+    assert all(r["annotated_frame"].shape == (120, 160, 3) for r in results)
+    assert len(writer.frames) == 12
+    assert pipeline.decoded_frames == 12
+    assert pipeline.processed_frames == 12
+    assert processor.frame_count == 12
+    assert pipeline.error is None
+
+
+def test_video_file_pipeline_applies_backpressure(processor):
+    pipeline = VideoFilePipeline(FakeCapture(n_frames=60), processor, queue_size=2)
+    pipeline.start()
+
+    results = pipeline.results()
+    next(results)
+    time.sleep(0.5)
+
+    # Four queues of two slots plus one in-flight batch, far short of the file
+    assert pipeline.decoded_frames < 30
+
+    assert len(list(results)) == 59
+    pipeline.stop()
+
+
+def test_video_file_pipeline_reports_stage_failure(processor):
+    pipeline = VideoFilePipeline(
+        FakeCapture(n_frames=5), processor, writer=FakeWriter(fail=True)
+    )
+    pipeline.start()
+
+    results = list(pipeline.results())
+    pipeline.stop()
+
+    assert results == []
+    assert pipeline.error == "Encoding failed: disk full"
+    assert not pipeline.running
+
+
+def test_video_file_pipeline_records_and_replays_cache(processor, tmp_path):
+    cache = DetectionCache(tmp_path)
+    processor.motion_gating = False
+
+    cached, cache_writer = processor.open_cache(cache, "video")
+    assert cached is None
+    pipeline = VideoFilePipeline(
+        FakeCapture(n_frames=6), processor, cache_writer=cache_writer
+    )
+    pipeline.start()
+    first = [result["tracks"] for result in pipeline.results()]
+    pipeline.stop()
+    cache_writer.commit()
+
+    # Replaying must not touch the model at all
+    processor.reset()
+    cached, cache_writer = processor.open_cache(cache, "video")
+    assert cache_writer is None
+    assert len(cached) == 6
+    model = processor.detection_agent.model
+    processor.detection_agent.model = None
+    pipeline = VideoFilePipeline(FakeCapture(n_frames=6), processor, cached=cached)
+    pipeline.start()
+    replay = [result["tracks"] for result in pipeline.results()]
+    pipeline.stop()
+    processor.detection_agent.model = model
+
+    assert pipeline.error is None
+    assert replay == first
+
+
+def test_cache_records_only_planned_frames(processor, tmp_path, monkeypatch):
+    cache = DetectionCache(tmp_path)
+    processor.motion_gating = False
+    processor.frame_skip = 2
+    detect_frames = processor.detect_frames
+    detected = []
+
+    def counting(frames):
+        detected.append(len(frames))
+        return detect_frames(frames)
+
+    monkeypatch.setattr(processor, "detect_frames", counting)
+
+    _, cache_writer = processor.open_cache(cache, "video")
+    pipeline = VideoFilePipeline(
+        FakeCapture(n_frames=6), processor, cache_writer=cache_writer
+    )
+    pipeline.start()
+    list(pipeline.results())
+    pipeline.stop()
+    cached = cache_writer.commit()
+
+    assert sum(detected) == 2
+    assert [cached.covers(i) for i in range(6)] == [
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+    ]
+
+    # Replaying with a smaller frame skip detects only the frames not recorded
+    detected.clear()
+    processor.reset()
+    processor.frame_skip = 1
+    pipeline = VideoFilePipeline(FakeCapture(n_frames=6), processor, cached=cached)
+    pipeline.start()
+    results = list(pipeline.results())
+    pipeline.stop()
+
+    assert pipeline.error is None
+    assert len(results) == 6
+    assert sum(detected) == 2  # frames 2 and 4
+
+
+def test_open_cache_keys_on_detection_settings(processor, tmp_path):
+    cache = DetectionCache(tmp_path)
+    _, cache_writer = processor.open_cache(cache, "video")
+    cache_writer.commit()
+
+    processor.detection_agent.confidence_threshold = 0.25
+    cached, _ = processor.open_cache(cache, "video")
+    assert cached is None
+
+    # Tracking settings are not part of the key
+    processor.detection_agent.confidence_threshold = 0.5
+    processor.tracking_agent.iou_threshold = 0.1
+    cached, _ = processor.open_cache(cache, "video")
+    assert cached is not None
+
+
+def test_detect_cached_skips_model_on_hit(processor):
+    cache = LRUCache()
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+
+    first = processor.detect_cached(frame, cache, "image")
+    model = processor.detection_agent.model
+    processor.detection_agent.model = None
+    second = processor.detect_cached(frame, cache, "image")
+    processor.detection_agent.model = model
+
+    assert second is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Different detection settings are a different entry
+    processor.detection_agent.confidence_threshold = 0.3
+    processor.detect_cached(frame, cache, "image")
+    assert len(cache) == 2
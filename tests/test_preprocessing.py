@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from ultralytics.data.augment import LetterBox
+
+from src.preprocessing import LetterboxInfo, LetterboxPreprocessor
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (360, 500, 3), dtype=np.uint8)
+
+
+def _reference(frame, imgsz=640):
+    # What Ultralytics feeds the network for a BGR numpy frame
+    letterboxed = LetterBox((imgsz, imgsz), auto=True, stride=32)(image=frame)
+    return letterboxed[..., ::-1].transpose(2, 0, 1).astype(np.float32) / 255
+
+
+def test_matches_ultralytics_letterbox(frame):
+    preprocessor = LetterboxPreprocessor()
+
+    inputs, infos = preprocessor([frame])
+
+    expected = _reference(frame)
+    assert inputs.shape == (1, *expected.shape)
+    np.testing.assert_allclose(inputs[0], expected, atol=1e-6)
+    assert infos[0].orig_shape == (360, 500)
+
+
+def test_rgb_input_gives_same_tensor(frame):
+    bgr_inputs, _ = LetterboxPreprocessor(channel_order="BGR")([frame])
+    rgb_inputs, _ = LetterboxPreprocessor(channel_order="RGB")(
+        [np.ascontiguousarray(frame[..., ::-1])]
+    )
+
+    np.testing.assert_array_equal(bgr_inputs, rgb_inputs)
+
+
+def test_unknown_channel_order_rejected():
+    with pytest.raises(ValueError):
+        LetterboxPreprocessor(channel_order="GRB")
+
+
+def test_buffers_reused_across_calls(frame):
+    preprocessor = LetterboxPreprocessor()
+
+    first, _ = preprocessor([frame, frame])
+    second, _ = preprocessor([frame, frame])
+
+    assert first is second
+    assert preprocessor([frame])[0] is not first
+
+
+def test_mixed_shapes_padded_to_square(frame):
+    preprocessor = LetterboxPreprocessor(imgsz=320)
+
+    inputs, infos = preprocessor([frame, frame[:100]])
+
+    assert inputs.shape == (2, 3, 320, 320)
+    assert infos[1].orig_shape == (100, 500)
+
+
+def test_scale_boxes_inverts_letterbox():
+    # 500x360 resized to 640x461 and padded to 480 rows, 9 on top
+    info = LetterboxInfo(orig_shape=(360, 500), gain=(461 / 360, 640 / 500), pad=(0, 9))
+    boxes = np.array([[64.0, 73.0, 128.0, 137.0], [-5.0, 0.0, 700.0, 500.0]])
+
+    scaled = LetterboxPreprocessor.scale_boxes(boxes, info)
+
+    np.testing.assert_allclose(scaled[0], [50, 64 * 360 / 461, 100, 128 * 360 / 461])
+    np.testing.assert_allclose(scaled[1], [0, 0, 500, 360])
+
+
+def test_channels_last_matches_contiguous(frame):
+    contiguous, _ = LetterboxPreprocessor()([frame])
+    inputs, _ = LetterboxPreprocessor(channels_last=True)([frame])
+
+    assert inputs.shape == contiguous.shape
+    assert inputs.strides[1] == 4  # channels are the innermost axis
+    np.testing.assert_array_equal(inputs, contiguous)
+
+
+def test_buffers_bounded_across_shapes():
+    preprocessor = LetterboxPreprocessor(max_buffers=2)
+    rng = np.random.default_rng(0)
+
+    for height, width in rng.integers(32, 600, (20, 2)):
+        preprocessor([np.zeros((height, width, 3), dtype=np.uint8)], imgsz=320)
+
+    assert len(preprocessor._canvas) <= 2
+    assert len(preprocessor._inputs) <= 2
+    assert len(preprocessor._resized) <= 2
+
+
+def test_recent_buffers_kept(frame):
+    preprocessor = LetterboxPreprocessor(max_buffers=2)
+
+    first, _ = preprocessor([frame])
+    preprocessor([frame[:100]])
+    again, _ = preprocessor([frame])
+
+    assert again is first
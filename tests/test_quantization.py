@@ -0,0 +1,195 @@
+import cv2
+import numpy as np
+import onnx
+import pytest
+import yaml
+
+from src.detections import Detections
+from src.model_manager_agent import ModelManagerAgent
+from src.quantization import (
+    CalibrationReader,
+    agreement,
+    calibration_images,
+    calibration_key,
+    compare_precisions,
+    decode_nodes,
+    format_report,
+    match_detections,
+)
+
+
+def _write_images(directory, count, seed=0):
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        image = rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+        cv2.imwrite(str(directory / f"frame_{i:02d}.png"), image)
+    return directory
+
+
+@pytest.fixture(scope="module")
+def quant_manager(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("quantization")
+    calibration_dir = _write_images(tmp_path / "calibration", 3)
+    (calibration_dir / "notes.txt").write_text("not an image")
+
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(
+        yaml.safe_dump(
+            {
+                "model": {
+                    "export_dir": str(tmp_path / "models"),
+                    "calibration_dir": str(calibration_dir),
+                    "confidence_threshold": 0.25,
+                }
+            }
+        )
+    )
+    return ModelManagerAgent(str(config_path))
+
+
+def _detections(boxes, class_ids, conf=None):
+    boxes = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+    conf = np.ones(len(boxes), np.float32) if conf is None else np.array(conf)
+    return Detections(boxes, conf, np.array(class_ids, dtype=np.int64), {0: "a"})
+
+
+def test_calibration_images_skip_other_files(quant_manager):
+    directory = quant_manager.get_config_value("model.calibration_dir")
+
+    paths = calibration_images(directory)
+
+    assert [p.name for p in paths] == ["frame_00.png", "frame_01.png", "frame_02.png"]
+    assert len(calibration_images(directory, limit=2)) == 2
+    assert calibration_images(directory + "-missing") == []
+
+
+def test_calibration_reader_letterboxes_frames(quant_manager):
+    paths = calibration_images(quant_manager.get_config_value("model.calibration_dir"))
+    reader = CalibrationReader(paths, "images", imgsz=320)
+
+    batches = list(iter(reader.get_next, None))
+
+    assert len(batches) == 3
+    assert batches[0]["images"].shape == (1, 3, 256, 320)
+    assert batches[0]["images"] is not batches[1]["images"]
+
+
+def test_decode_nodes_keep_conv_branches(quant_manager):
+    model = onnx.load(str(quant_manager.export_model("yolov8n.pt")))
+
+    excluded = decode_nodes(model)
+
+    assert any("/dfl/" in name for name in excluded)
+    assert not any("/cv2." in name or "/cv3." in name for name in excluded)
+    assert not any(name.startswith("/model.0/") for name in excluded)
+
+
+def test_quantize_model_is_cached(quant_manager):
+    dynamic = quant_manager.quantize_model("yolov8n.pt", "int8-dynamic")
+    static = quant_manager.quantize_model("yolov8n.pt", "int8-static")
+    mtime = static.stat().st_mtime_ns
+
+    assert "-int8-dynamic-" in dynamic.name
+    assert "-int8-static-" in static.name
+    assert quant_manager.quantize_model("yolov8n.pt", "int8-static") == static
+    assert static.stat().st_mtime_ns == mtime
+    ops = {node.op_type for node in onnx.load(str(static)).graph.node}
+    assert "QuantizeLinear" in ops
+
+
+def test_static_variant_depends_on_calibration_set(quant_manager, tmp_path):
+    static = quant_manager.quantize_model("yolov8n.pt", "int8-static")
+    other_dir = _write_images(tmp_path / "other", 2, seed=1)
+
+    other = quant_manager.quantize_model(
+        "yolov8n.pt", "int8-static", calibration_dir=str(other_dir)
+    )
+
+    assert other != static
+    assert calibration_key(calibration_images(other_dir)) != calibration_key(
+        calibration_images(quant_manager.get_config_value("model.calibration_dir"))
+    )
+
+
+def test_static_quantization_needs_images(quant_manager, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        quant_manager.quantize_model(
+            "yolov8n.pt", "int8-static", calibration_dir=str(tmp_path)
+        )
+
+
+def test_load_quantized_model(quant_manager):
+    model = quant_manager.load_model("yolov8n.pt", precision="int8-static")
+
+    assert quant_manager.backend == "onnxruntime"
+    assert quant_manager.precision == "int8-static"
+    assert "-int8-static-" in str(model.model)
+    assert (
+        quant_manager.models.get(("yolov8n.pt", "onnxruntime", "cpu", "int8-static"))
+        is model
+    )
+    # Class names survive quantization in the ONNX metadata
+    assert model.names == quant_manager.load_model("yolov8n.pt").names
+
+
+def test_match_detections_same_class_only():
+    reference = _detections([[0, 0, 10, 10], [20, 20, 30, 30]], [0, 0])
+    candidate = _detections([[0, 0, 10, 11], [20, 20, 30, 30]], [0, 1])
+
+    matched, iou_sum = match_detections(reference, candidate)
+
+    assert matched == 1
+    assert iou_sum == pytest.approx(100 / 110)
+
+
+def test_agreement_scores():
+    reference = [_detections([[0, 0, 10, 10], [20, 20, 30, 30]], [0, 0])]
+    candidate = [_detections([[0, 0, 10, 10]], [0])]
+
+    scores = agreement(reference, candidate)
+
+    assert scores["precision"] == 1.0
+    assert scores["recall"] == 0.5
+    assert scores["f1"] == pytest.approx(2 / 3)
+    assert agreement([Detections.empty()], [Detections.empty()])["f1"] == 1.0
+
+
+def test_compare_precisions_report(quant_manager):
+    quant_manager.load_model("yolov8n.pt")
+    frames = [
+        cv2.imread(str(path))
+        for path in calibration_images(
+            quant_manager.get_config_value("model.calibration_dir")
+        )
+    ]
+
+    report = compare_precisions(
+        quant_manager, frames, precisions=("int8-static",), runs=1, batch_size=2
+    )
+
+    results = report["precisions"]
+    assert list(results) == ["fp32", "int8-static"]
+    assert results["fp32"]["agreement"]["f1"] == 1.0
+    assert results["fp32"]["speedup"] == 1.0
+    assert results["int8-static"]["backend"] == "onnxruntime"
+    assert results["int8-static"]["latency_ms"] > 0
+    assert results["int8-static"]["fps"] > 0
+    # The previously loaded model is current again
+    assert quant_manager.precision == "fp32"
+    assert quant_manager.backend == "torch"
+    assert "int8-static" in format_report(report)
+
+
+def test_compare_precisions_restores_quantized_model(quant_manager):
+    quant_manager.load_model("yolov8n.pt", precision="int8-dynamic")
+    frames = [np.zeros((240, 320, 3), dtype=np.uint8)]
+
+    compare_precisions(
+        quant_manager, frames, precisions=("int8-dynamic",), runs=1, batch_size=1
+    )
+
+    assert quant_manager.precision == "int8-dynamic"
+    assert quant_manager.backend == "onnxruntime"
+    assert "-int8-dynamic-" in str(quant_manager.get_model().model)
+    assert all(key[2] == "cpu" for key in quant_manager.models._entries)
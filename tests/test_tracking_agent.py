@@ -1,6 +1,17 @@
+import itertools
+
+import numpy as np
 import pytest
 
-from src.tracking_agent import TrackingAgent
+from src.detections import Detections
+from src.tracking_agent import (
+    KalmanBoxFilter,
+    SpatialGrid,
+    TrackingAgent,
+    TrackStore,
+    TrackView,
+    _linear_sum_assignment,
+)
 
 
 @pytest.fixture
@@ -166,3 +177,322 @@ def test_multiple_detections_same_frame(tracking_agent):
     active_tracks = tracking_agent.update([detection1, detection2])
     assert len(active_tracks) == 2
     assert active_tracks[0]["track_id"] != active_tracks[1]["track_id"]
+
+
+def test_update_accepts_columnar_detections(tracking_agent):
+    detections = Detections(
+        xyxy=[[100.0, 100.0, 200.0, 200.0], [300.0, 300.0, 400.0, 400.0]],
+        conf=[0.9, 0.8],
+        class_id=[0, 2],
+        names={0: "person", 2: "car"},
+    )
+
+    for _ in range(3):
+        active_tracks = tracking_agent.update(detections)
+
+    assert len(active_tracks) == 2
+    assert [track["class_name"] for track in active_tracks] == ["person", "car"]
+    assert active_tracks[0]["bbox"] == [100.0, 100.0, 200.0, 200.0]
+
+    assert tracking_agent.update(Detections.empty()) == active_tracks
+
+
+def test_iou_matrix_matches_scalar_iou(tracking_agent):
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 200, size=(20, 2))
+    boxes = np.hstack([xy, xy + rng.uniform(0, 60, size=(20, 2))])
+
+    iou = tracking_agent._iou_matrix(boxes[:12], boxes[8:])
+
+    for i in range(12):
+        for j in range(12):
+            expected = tracking_agent._calculate_iou(
+                boxes[i].tolist(), boxes[8 + j].tolist()
+            )
+            assert iou[i, j] == expected
+
+
+def test_vectorized_matching_matches_greedy_loop(tracking_agent):
+    rng = np.random.default_rng(1)
+
+    for _ in range(20):
+        tracking_agent.reset()
+        for _ in range(3):
+            xy = rng.uniform(0, 300, size=(15, 2))
+            boxes = np.hstack([xy, xy + rng.uniform(20, 80, size=(15, 2))])
+            tracking_agent.update(
+                Detections(boxes, np.full(15, 0.9), rng.integers(0, 2, size=15))
+            )
+
+        xy = rng.uniform(0, 300, size=(15, 2))
+        boxes = np.hstack([xy, xy + rng.uniform(20, 80, size=(15, 2))])
+        detections = Detections(boxes, np.full(15, 0.9), rng.integers(0, 2, size=15))
+
+        # Reference: the original first-come greedy double loop
+        expected_matched = []
+        expected_unmatched = []
+        used_tracks = set()
+        for det_idx, detection in enumerate(detections):
+            best_iou = 0
+            best_track_idx = -1
+            for track_idx, track in enumerate(tracking_agent.tracks):
+                if track_idx in used_tracks:
+                    continue
+                if track["class_id"] != detection["class_id"]:
+                    continue
+                iou = tracking_agent._calculate_iou(detection["bbox"], track["bbox"])
+                if iou > tracking_agent.iou_threshold and iou > best_iou:
+                    best_iou = iou
+                    best_track_idx = track_idx
+            if best_track_idx >= 0:
+                expected_matched.append((best_track_idx, det_idx))
+                used_tracks.add(best_track_idx)
+            else:
+                expected_unmatched.append(det_idx)
+
+        matched, unmatched = tracking_agent._match_detections_to_tracks(detections)
+        assert matched == expected_matched
+        assert unmatched == expected_unmatched
+
+
+def test_invalid_assignment_mode():
+    with pytest.raises(ValueError, match="Unknown assignment mode"):
+        TrackingAgent(assignment="auction")
+
+
+def test_hungarian_assignment_avoids_greedy_id_switch():
+    first_frame = Detections(
+        [[0.0, 0.0, 100.0, 100.0], [100.0, 0.0, 200.0, 100.0]], [0.9, 0.9], [0, 0]
+    )
+    second_frame = Detections(
+        [[60.0, 0.0, 160.0, 100.0], [150.0, 0.0, 250.0, 100.0]], [0.9, 0.9], [0, 0]
+    )
+
+    greedy = TrackingAgent(min_hits=1, iou_threshold=0.2, assignment="greedy")
+    greedy.update(first_frame)
+    greedy.update(second_frame)
+    # The first detection steals track 1, so the second one starts a new track
+    assert greedy.track_id_counter == 3
+
+    hungarian = TrackingAgent(min_hits=1, iou_threshold=0.2, assignment="hungarian")
+    hungarian.update(first_frame)
+    active_tracks = hungarian.update(second_frame)
+    assert hungarian.track_id_counter == 2
+    assert [track["bbox"][0] for track in active_tracks] == [60.0, 150.0]
+
+
+def test_builtin_linear_sum_assignment_is_optimal():
+    rng = np.random.default_rng(2)
+
+    for n_rows, n_cols in [(0, 3), (4, 4), (3, 6), (6, 3)]:
+        cost = rng.random((n_rows, n_cols))
+        rows, cols = _linear_sum_assignment(cost)
+
+        assert len(rows) == min(n_rows, n_cols)
+        assert len(set(rows.tolist())) == len(rows)
+        assert len(set(cols.tolist())) == len(cols)
+
+        # Brute force over all assignments of the smaller side
+        best = min(
+            (
+                sum(cost[i, j] for i, j in zip(perm_rows, perm_cols))
+                for perm_rows, perm_cols in _all_assignments(n_rows, n_cols)
+            ),
+            default=0.0,
+        )
+        assert np.isclose(cost[rows, cols].sum(), best)
+
+
+def _all_assignments(n_rows, n_cols):
+    if n_rows <= n_cols:
+        for perm in itertools.permutations(range(n_cols), n_rows):
+            yield range(n_rows), perm
+    else:
+        for perm in itertools.permutations(range(n_rows), n_cols):
+            yield perm, range(n_cols)
+
+
+def test_invalid_motion_model():
+    with pytest.raises(ValueError, match="Unknown motion model"):
+        TrackingAgent(motion_model="particle")
+
+
+def _moving_box_ids(motion_model):
+    agent = TrackingAgent(min_hits=1, motion_model=motion_model)
+    track_ids = set()
+
+    # Detect every frame while the velocity is learned, then only every 4th
+    # frame; the box moves 80px between detections, more than its own width
+    for frame in range(40):
+        x = 20.0 * frame
+        if frame < 6 or frame % 4 == 0:
+            tracks = agent.update(Detections([[x, 100.0, x + 50.0, 150.0]], [0.9], [0]))
+            track_ids.update(track["track_id"] for track in tracks)
+        else:
+            agent.predict()
+
+    return track_ids
+
+
+def test_kalman_keeps_identity_across_skipped_frames():
+    assert len(_moving_box_ids("none")) > 1
+    assert _moving_box_ids("kalman") == {0}
+
+
+def test_predict_advances_tracks_without_aging():
+    agent = TrackingAgent(min_hits=1, motion_model="kalman")
+    for frame in range(5):
+        x = 10.0 * frame
+        agent.update(Detections([[x, 0.0, x + 50.0, 50.0]], [0.9], [0]))
+
+    before = agent.tracks[0]["bbox"][0]
+    tracks = agent.predict()
+
+    assert tracks[0]["bbox"][0] > before
+    assert agent.tracks[0]["age"] == 1
+    assert agent.tracks[0]["hits"] == 5
+
+
+def test_motion_model_switches_between_frames():
+    agent = TrackingAgent(min_hits=1)
+    agent.update(Detections([[0.0, 0.0, 50.0, 50.0]], [0.9], [0]))
+
+    agent.motion_model = "kalman"
+    tracks = agent.update(Detections([[10.0, 0.0, 60.0, 50.0]], [0.9], [0]))
+
+    assert agent.kalman_filter is not None
+    assert [track["track_id"] for track in tracks] == [0]
+    assert tracks[0]["bbox"][0] == pytest.approx(10.0, abs=5.0)
+
+    agent.motion_model = "none"
+    assert agent.kalman_filter is None
+    with pytest.raises(ValueError):
+        agent.motion_model = "particle"
+
+
+def test_predict_without_motion_model_is_noop(tracking_agent, sample_detection):
+    for _ in range(3):
+        tracking_agent.update([sample_detection])
+
+    tracks = tracking_agent.predict()
+    assert tracks[0]["bbox"] == sample_detection["bbox"]
+
+
+def test_kalman_filter_converges_to_measurement():
+    kalman_filter = KalmanBoxFilter()
+    mean, covariance = kalman_filter.initiate(np.array([[0.0, 0.0, 10.0, 10.0]]))
+
+    for _ in range(10):
+        mean, covariance = kalman_filter.predict(mean, covariance)
+        mean, covariance = kalman_filter.update(
+            mean, covariance, np.array([[0.0, 0.0, 10.0, 10.0]])
+        )
+
+    assert np.allclose(kalman_filter.to_xyxy(mean), [[0.0, 0.0, 10.0, 10.0]], atol=0.1)
+    assert np.allclose(mean[0, 4:], 0.0, atol=0.1)
+
+
+def test_active_tracks_view_is_reused(tracking_agent, sample_detection):
+    first = tracking_agent.update([sample_detection])
+    second = tracking_agent.update([sample_detection])
+    assert first is second
+    assert isinstance(first, TrackView)
+
+
+def test_active_tracks_view_columns():
+    agent = TrackingAgent(min_hits=1)
+    detections = Detections(
+        [[0.0, 0.0, 10.0, 10.0], [50.0, 50.0, 60.0, 60.0]], [0.9, 0.8], [0, 1]
+    )
+    active_tracks = agent.update(detections)
+
+    assert active_tracks.bbox.shape == (2, 4)
+    assert np.shares_memory(active_tracks.bbox, agent.store.bbox)
+    assert sorted(active_tracks.track_id.tolist()) == [0, 1]
+    assert active_tracks.to_dicts() == list(active_tracks)
+
+
+def test_track_store_grows_and_swap_removes():
+    agent = TrackingAgent(max_age=1, min_hits=1)
+    agent.store = TrackStore(capacity=2)
+    agent._active_view = TrackView(agent.store)
+
+    boxes = [[100.0 * i, 0.0, 100.0 * i + 50.0, 50.0] for i in range(5)]
+    agent.update(Detections(boxes, np.full(5, 0.9), np.zeros(5)))
+    assert agent.store.capacity >= 5
+    assert len(agent.tracks) == 5
+
+    # Keep tracks 1 and 3 alive; the others expire and are swap-removed
+    agent.update(Detections([boxes[1], boxes[3]], [0.9, 0.9], [0, 0]))
+    active_tracks = agent.update(Detections([boxes[1], boxes[3]], [0.9, 0.9], [0, 0]))
+
+    assert sorted(track["track_id"] for track in active_tracks) == [1, 3]
+    assert agent.store.size == 2
+    assert agent.store.class_name == ["0", "0"]
+
+
+def test_tentative_tracks_are_kept_behind_active_ones(tracking_agent):
+    old_detection = Detections([[0.0, 0.0, 50.0, 50.0]], [0.9], [0])
+    for _ in range(3):
+        tracking_agent.update(old_detection)
+
+    both = Detections(
+        [[0.0, 0.0, 50.0, 50.0], [200.0, 0.0, 250.0, 50.0]], [0.9, 0.9], [0, 0]
+    )
+    active_tracks = tracking_agent.update(both)
+
+    assert [track["track_id"] for track in active_tracks] == [0]
+    assert tracking_agent.store.n_active == 1
+    assert tracking_agent.store.size == 2
+
+    tracking_agent.min_hits = 1
+    assert len(tracking_agent.predict()) == 2
+
+
+def test_spatial_grid_finds_every_overlapping_pair():
+    rng = np.random.default_rng(3)
+    xy = rng.uniform(0, 1000, size=(300, 2))
+    boxes = np.hstack([xy, xy + rng.uniform(5, 120, size=(300, 2))])
+
+    query_idx, box_idx = SpatialGrid().candidate_pairs(boxes[:150], boxes[150:])
+    candidates = set(zip(query_idx.tolist(), box_idx.tolist()))
+
+    iou = TrackingAgent._iou_matrix(boxes[:150], boxes[150:])
+    overlapping = set(zip(*np.nonzero(iou > 0)))
+    assert overlapping <= candidates
+    assert len(candidates) < 150 * 150 // 4
+
+
+def test_spatial_grid_empty_inputs():
+    query_idx, box_idx = SpatialGrid().candidate_pairs(
+        np.empty((0, 4)), np.array([[0.0, 0.0, 1.0, 1.0]])
+    )
+    assert len(query_idx) == 0
+    assert len(box_idx) == 0
+
+
+@pytest.mark.parametrize("assignment", ["greedy", "hungarian"])
+def test_grid_gated_matching_matches_dense(assignment):
+    rng = np.random.default_rng(4)
+    dense = TrackingAgent(min_hits=1, assignment=assignment, grid_min_tracks=None)
+    gated = TrackingAgent(min_hits=1, assignment=assignment, grid_min_tracks=1)
+
+    xy = rng.uniform(0, 1500, size=(300, 2))
+    wh = rng.uniform(5, 60, size=(300, 2))
+    for _ in range(5):
+        moved = xy + rng.normal(0, 4, size=xy.shape)
+        keep = rng.random(300) < 0.8
+        boxes = np.hstack([moved, moved + wh])[keep]
+        detections = Detections(
+            boxes, np.full(len(boxes), 0.9), rng.integers(0, 3, len(boxes))
+        )
+
+        dense_ids = sorted(track["track_id"] for track in dense.update(detections))
+        gated_ids = sorted(track["track_id"] for track in gated.update(detections))
+        assert dense_ids == gated_ids
+
+
+def test_track_boxes_include_tentative_tracks(tracking_agent, sample_detection):
+    tracking_agent.update([sample_detection])
+    assert tracking_agent.track_boxes.tolist() == [sample_detection["bbox"]]
+    assert len(tracking_agent.update([sample_detection])) == 0
@@ -0,0 +1,142 @@
+import cv2
+import numpy as np
+import pytest
+
+from src.video_sink import VideoSink
+
+
+@pytest.fixture
+def frame():
+    return np.full((120, 160, 3), 128, dtype=np.uint8)
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    frames = 0
+    while cap.read()[0]:
+        frames += 1
+    cap.release()
+    return frames
+
+
+def test_video_sink_writes_single_file(tmp_path, frame):
+    sink = VideoSink(tmp_path, prefix="clip", fps=10, block=True).start()
+    for _ in range(12):
+        assert sink.write(frame)
+
+    segments = sink.close()
+
+    assert segments == [tmp_path / "clip.mp4"]
+    assert count_frames(segments[0]) == 12
+    assert sink.written_frames == 12
+    assert sink.dropped_frames == 0
+    assert sink.error is None
+
+
+def test_video_sink_rotates_by_duration(tmp_path, frame):
+    sink = VideoSink(tmp_path, prefix="clip", fps=10, segment_seconds=0.5, block=True)
+    for _ in range(12):
+        sink.write(frame)
+
+    segments = sink.close()
+
+    assert [path.name for path in segments] == [
+        "clip_000.mp4",
+        "clip_001.mp4",
+        "clip_002.mp4",
+    ]
+    assert [count_frames(path) for path in segments] == [5, 5, 2]
+
+
+def test_video_sink_rotates_by_size(tmp_path):
+    sink = VideoSink(tmp_path, prefix="clip", fps=10, segment_size_mb=0.2, block=True)
+    # Noise does not compress, so the encoder flushes to disk every few frames
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        sink.write(rng.integers(0, 255, (240, 320, 3), dtype=np.uint8))
+
+    segments = sink.close()
+
+    assert len(segments) > 1
+    assert sum(count_frames(path) for path in segments) == 20
+
+
+def test_video_sink_new_segment_on_resolution_change(tmp_path, frame):
+    sink = VideoSink(tmp_path, prefix="clip", fps=10, block=True)
+    sink.write(frame)
+    sink.write(np.zeros((60, 80, 3), dtype=np.uint8))
+
+    segments = sink.close()
+
+    assert [path.name for path in segments] == ["clip.mp4", "clip_001.mp4"]
+
+
+def test_video_sink_drops_when_queue_full(tmp_path, frame):
+    sink = VideoSink(tmp_path, prefix="clip", queue_size=1)
+    # Keep the encoder from starting so the queued frame is never consumed
+    sink.start = lambda: sink
+    sink._queue.put(frame)
+
+    assert not sink.write(frame)
+    assert sink.dropped_frames == 1
+
+
+def test_video_sink_rejects_writes_after_close(tmp_path, frame):
+    sink = VideoSink(tmp_path, prefix="clip").start()
+    sink.close()
+
+    assert not sink.write(frame)
+    assert sink.dropped_frames == 1
+
+
+def test_video_sink_reports_writer_failure(tmp_path, frame):
+    # A directory where the output file should go
+    (tmp_path / "clip.mp4").mkdir()
+    sink = VideoSink(tmp_path, prefix="clip", block=True)
+
+    sink.start()
+    sink.write(frame)
+    sink.close()
+
+    assert sink.error is not None
+    assert sink.written_frames == 0
+
+
+def test_paced_sink_follows_write_times(tmp_path, frame, monkeypatch):
+    times = iter([100.0, 100.25, 100.3, 100.31, 101.0])
+    monkeypatch.setattr("src.video_sink.time.monotonic", lambda: next(times))
+    sink = VideoSink(tmp_path, prefix="clip", fps=10, block=True, paced=True)
+    for _ in range(5):
+        sink.write(frame)
+
+    segments = sink.close()
+
+    # Gaps repeat the last frame, the burst within one frame period is thinned
+    assert sink.written_frames == 11
+    assert count_frames(segments[0]) == 11
+
+
+def test_unpaced_sink_writes_every_frame(tmp_path, frame, monkeypatch):
+    monkeypatch.setattr("src.video_sink.time.monotonic", lambda: 0.0)
+    sink = VideoSink(tmp_path, prefix="clip", fps=10, block=True)
+    for _ in range(3):
+        sink.write(frame)
+
+    sink.close()
+
+    assert sink.written_frames == 3
+
+
+def test_paced_sink_rotates_within_repeats(tmp_path, frame, monkeypatch):
+    times = iter([100.0, 101.2])
+    monkeypatch.setattr("src.video_sink.time.monotonic", lambda: next(times))
+    sink = VideoSink(
+        tmp_path, prefix="clip", fps=10, segment_seconds=0.5, block=True, paced=True
+    )
+    sink.write(frame)
+    # 1.2s late: 12 repeats of one input still split into half-second files
+    sink.write(frame)
+
+    segments = sink.close()
+
+    assert [count_frames(path) for path in segments] == [5, 5, 3]